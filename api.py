@@ -1,23 +1,336 @@
+import asyncio
 import base64
+import hashlib
 import json
 import os
 import tempfile
+import time
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Optional
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, \
+    Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 
-from helpers import email_helper, meeting_helper, storage_helper
-from models import Calendar, Email, Event, Folder, Item,  NewCalendar,\
-    NewEvent, NewItem, SharedFolder
+# The service helpers pull in the Google clients, email.mime and numpy.
+# They are imported by the routes using them, on first use, so importing
+# the application stays fast. The startup warm-up imports them early.
+from helpers import archive, recurrence
+from models import ArchiveReport, Calendar, CalendarId, CopiedFolder, \
+    CreatedEvents, Email, EmailSent, Event, EventId, EventSearch, Exists, \
+    FileId, Folder, FolderId, FoundEvents, FreeSlots, Item, MailMerge, \
+    MergeReport, NewCalendar, NewEvent, NewEvents, NewFolder, NewItem, \
+    Readiness, SharedFolder, SlotSearch, TreeReport, UnsharedFolder
 from consts.auth import Auth
+from consts.backend import Backend
+from consts.drive import Drive
+from consts.idempotency import Idempotency
+from consts.mail import Mail
+from consts.meeting import Meeting
+from consts.warmup import Warmup
+from helpers.sender_pool import sender_pool
+from helpers.service_pool import service_pool
+from helpers.warmup import warmup
+from utils.idempotency import idempotency_store, request_id
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.tracing import tracer
 
-app = FastAPI()
 
+class Instrumentation:
+    """
+    ASGI middleware recording the metrics and the root span of every HTTP
+    request. The root span continues the caller's trace when a W3C
+    traceparent header is received.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        traceparent = dict(scope['headers']).get(b'traceparent', b'')
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        start = time.perf_counter()
+        with tracer.span(method, traceparent=traceparent.decode('latin-1'),
+                         **{'http.method': method,
+                            'http.target': scope['path']}) as span:
+
+            async def send_wrapper(message):
+                nonlocal status_code
+                if message['type'] == 'http.response.start':
+                    status_code = message['status']
+                    message['headers'] = list(message.get('headers', [])) +\
+                        [(b'traceparent', span.traceparent().encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get('route')
+                route = route.path if route else 'unmatched'
+                span.name = "{} {}".format(method, route)
+                span.set_attribute('http.status_code', status_code)
+                metrics.http_latency.observe(time.perf_counter() - start,
+                                             method=method, route=route)
+                metrics.http_requests.inc(method=method, route=route,
+                                          status=str(status_code))
+
+
+# POST routes that change nothing, their retries are always safe.
+READ_ONLY_ROUTES = {'/meeting/search_events', '/meeting/find_slots',
+                    '/meeting/get_calendar_id', '/storage/item/exists',
+                    '/storage/folder/exists'}
+# Line breaks and spaces b64decode skips in a base64 content.
+WHITESPACE = ' \t\r\n'
+
+
+class IdempotentRequests:
+    """
+    ASGI middleware honouring the Idempotency-Key header of the mutating
+    routes. The response of a key is kept once its request completes, and
+    a retry with the same key, account and route is answered with it
+    instead of running the request again. A retry while the request still
+    runs gets a 409, the same key with a different body a 422. Server
+    errors are not kept, so they can be retried.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    async def _respond(send, status_code, headers, body):
+        await send({'type': 'http.response.start', 'status': status_code,
+                    'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _error(self, send, status_code, detail):
+        await self._respond(send, status_code,
+                            [(b'content-type', b'application/json')],
+                            json.dumps({'detail': detail}).encode())
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope['headers']) if scope['type'] == 'http' else {}
+        key = headers.get(Idempotency.HEADER.encode())
+        if key is None or scope['method'] != 'POST' or \
+                scope['path'] in READ_ONLY_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > Idempotency.MAX_KEY_LENGTH:
+            await self._error(send, status.HTTP_400_BAD_REQUEST,
+                              "Idempotency-Key must have 1 to {} characters"
+                              .format(Idempotency.MAX_KEY_LENGTH))
+            return
+
+        key = (headers.get(b'x-google-account', b''), scope['path'], key)
+        body_hash = hashlib.sha256()
+        done = False
+
+        async def hashing_receive():
+            nonlocal done
+            message = await receive()
+            if message['type'] == 'http.request':
+                body_hash.update(message.get('body', b''))
+                done = not message.get('more_body', False)
+            else:
+                done = True
+            return message
+
+        async def drain():
+            while not done:
+                await hashing_receive()
+            return body_hash.hexdigest()
+
+        claimed, entry = idempotency_store.claim(key)
+        if not claimed:
+            if entry is None:
+                await self._error(send, status.HTTP_409_CONFLICT,
+                                  "A request with this Idempotency-Key is "
+                                  "still running")
+            elif await drain() != entry[0]:
+                await self._error(
+                    send, 422,
+                    "Idempotency-Key already used for a different request")
+            else:
+                status_code, response_headers, body = entry[1]
+                await self._respond(
+                    send, status_code,
+                    response_headers + [(b'idempotent-replayed', b'true')],
+                    body)
+            return
+
+        response = {'status': None, 'headers': [], 'body': []}
+        size = 0
+
+        async def recording_send(message):
+            nonlocal size
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = list(message.get('headers', []))
+            elif message['type'] == 'http.response.body' and \
+                    response['body'] is not None:
+                size += len(message.get('body', b''))
+                if size > Idempotency.MAX_BODY:
+                    response['body'] = None
+                else:
+                    response['body'].append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, hashing_receive, recording_send)
+            fingerprint = await drain()
+        except BaseException:
+            idempotency_store.release(key)
+            raise
+        if response['status'] is None or response['status'] >= 500 or \
+                response['body'] is None:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, fingerprint, (
+                response['status'], response['headers'],
+                b''.join(response['body'])))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Warm the worker up in the background once it starts, /ready answers
+    503 until it is done.
+    """
+    task = None
+    if Warmup.ENABLED:
+        task = asyncio.ensure_future(run_in_threadpool(warmup.run))
+    else:
+        warmup.ready = True
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(IdempotentRequests)
+app.add_middleware(Instrumentation)
+
+
+def _handler(handler_class, account):
+    """
+    Get the pooled handler of the account selected by the request.
+
+    Args:
+        - handler_class(class): handler to get.
+        - account(str): X-Google-Account header value, if any.
+
+    Returns(GoogleServiceHandler):
+    """
+    try:
+        path = Auth.credentials_file(account)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+    if account and Backend.MODE != Backend.FAKE and\
+            Auth.MODE == Auth.OAUTH and not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Unknown account {}".format(account))
+    return service_pool.get(handler_class, account)
+
+
+def _identify(kind, name, resource_id):
+    """
+    Reject requests naming a resource neither by name nor by ID.
+
+    Args:
+        - kind(str): kind of the resource, e.g. 'folder'.
+        - name(str): name of the resource, if any.
+        - resource_id(str): ID of the resource, if any.
+
+    Returns(None):
+    """
+    if not name and not resource_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either the {0} name or the {0} ID is required"
+            .format(kind))
+
+
+async def meeting_handler(x_google_account: Optional[str] = Header(None)):
+    from helpers.meeting_helper import MeetingHandler
+    return _handler(MeetingHandler, x_google_account)
+
+
+async def storage_handler(x_google_account: Optional[str] = Header(None)):
+    from helpers.storage_helper import StorageHandler
+    return _handler(StorageHandler, x_google_account)
+
+
+def _senders(sender, count, account):
+    """
+    Get the handlers sending the messages of a sender: the account selected
+    by the request, otherwise the accounts of the sender pool.
+
+    Args:
+        - sender(str): sender's email address.
+        - count(int): number of messages.
+        - account(str): X-Google-Account header value, if any.
+
+    Returns(list):
+        (handler, messages) of every account sending messages.
 
-@app.post("/email/send_email")
-async def send_email(email: Email):
     """
-    Send an email with the specified information.
+    from helpers.email_helper import EmailHandler
+
+    if account or not sender_pool:
+        return [(_handler(EmailHandler, account), count)]
+    shards = sender_pool.shard(sender, count)
+    if not shards:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Not enough daily send quota left for {} messages"
+            .format(count))
+    try:
+        return [(_handler(EmailHandler, pooled), messages)
+                for pooled, messages in shards]
+    except HTTPException:
+        for pooled, messages in shards:
+            sender_pool.release(pooled, messages)
+        raise
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Expose the service metrics in the Prometheus text format.
+
+    Request: GET
+    """
+    return metrics.render()
+
+
+@app.get("/ready", response_model=Readiness)
+async def ready(response: Response):
+    """
+    Readiness probe of the load balancer, 503 until the startup warm-up is
+    done. Failed warm-up steps are reported, not waited for.
+
+    Returns {'ready': bool, 'failed': {step: err_msg}}
+    """
+    if not warmup.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {'ready': warmup.ready, 'failed': dict(warmup.failed)}
+
+
+@app.post("/email/send_email", response_model=EmailSent)
+async def send_email(email: Email,
+                     x_google_account: Optional[str] = Header(None)):
+    """
+    Send an email with the specified information. Without an
+    X-Google-Account header the email is sent from an account of the
+    sender pool, if configured.
 
     Request: POST
     Body: {'recipient': str ,
@@ -28,77 +341,357 @@ async def send_email(email: Email):
            'extension': optional[str]
     }
     """
-    logger.log_info("New email request received: {}".format(email))
+    logger.log_info("New email request received from {} to {}"
+                    .format(email.sender, email.recipient))
+    [(handler, _)] = _senders(email.sender, 1, x_google_account)
+    pooled = not x_google_account and bool(sender_pool)
 
     if email.attachement:
         f = tempfile.NamedTemporaryFile(suffix=email.extension)
         data = base64.b64decode(email.attachement)
         f.write(data)
-        result, err = \
-            email_helper.EmailHandler(Auth.CREDENTIALS_FILE)\
-            .send_email_attachement(email.recipient, email.sender, email.body,
-                                    email.subject, f.name)
+        f.flush()
+        result, err = await run_in_threadpool(
+            handler.send_email_attachement, email.recipient, email.sender,
+            email.body, email.subject, f.name)
         if not result:
             logger.log_error("Error sending message")
+            if pooled:
+                sender_pool.release(handler.account, 1)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=err)
-        return json.dumps({
-            'statusCode': 200,
-            'error': ''})
+        return EmailSent()
 
-    result, err = email_helper.EmailHandler(Auth.CREDENTIALS_FILE).send_email(
+    result, err = await run_in_threadpool(
+        handler.send_email,
         email.recipient,
         email.sender,
         email.body,
         email.subject)
     if not result:
         logger.log_error("Error sending message")
+        if pooled:
+            sender_pool.release(handler.account, 1)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=err)
+    return EmailSent()
+
+
+@app.post("/email/send_merge", response_model=MergeReport,
+          response_model_exclude_none=True)
+async def send_merge(merge: MailMerge,
+                     x_google_account: Optional[str] = Header(None)):
+    """
+    Send a personalised copy of a message to every recipient. '{name}'
+    placeholders of the subject and body are replaced by the variables of
+    each recipient, '{recipient}' by their address. Without an
+    X-Google-Account header the recipients are sharded over the accounts
+    of the sender pool, if configured, and sent concurrently.
 
+    Request: POST
+    Body: {'sender': str,
+           'subject': str,
+           'body': str,
+           'html': optional[bool],
+           'recipients': [{'recipient': str,
+                           'variables': optional[dict]}]
+    }
+    Returns {'sent':, 'failed':, 'invalid':,
+             'results': [{'recipient':, 'status':,
+                          'message_id' or 'error':}]}
+    """
+    from helpers import mail_merge
+
+    logger.log_info("New mail merge request received from {} to {} "
+                    "recipients".format(merge.sender, len(merge.recipients)))
+    try:
+        if not merge.recipients:
+            raise ValueError("At least one recipient is required")
+        if len(merge.recipients) > Mail.MAX_RECIPIENTS:
+            raise ValueError("At most {} recipients are allowed"
+                             .format(Mail.MAX_RECIPIENTS))
+        subject = mail_merge.Template(merge.subject)
+        body = mail_merge.Template(merge.body)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+
+    recipients = [(row.recipient, row.variables or {})
+                  for row in merge.recipients]
+    senders = _senders(merge.sender, len(recipients), x_google_account)
+    pooled = not x_google_account and bool(sender_pool)
+    shards = []
+    start = 0
+    for handler, count in senders:
+        shards.append(recipients[start:start + count])
+        start += count
+    outcomes = await asyncio.gather(*(
+        run_in_threadpool(handler.send_merge, merge.sender, subject, body,
+                          shard, 'html' if merge.html else 'plain')
+        for (handler, _), shard in zip(senders, shards)))
 
-@app.post("/meeting/create_event")
-async def create_event(event: NewEvent):
+    report = {'sent': 0, 'failed': 0, 'invalid': 0, 'results': []}
+    for (handler, _), shard, (result, sent) in \
+            zip(senders, shards, outcomes):
+        if not result:
+            # The other accounts may have sent their shards already.
+            logger.log_error("Error sending the mail merge from {}: {}"
+                             .format(handler.account, sent))
+            sent = {'sent': 0, 'failed': len(shard), 'invalid': 0,
+                    'results': [{'recipient': recipient,
+                                 'status': 'failed', 'error': sent}
+                                for recipient, _ in shard]}
+        if pooled:
+            sender_pool.release(handler.account,
+                                sent['failed'] + sent['invalid'])
+        for key in ('sent', 'failed', 'invalid', 'results'):
+            report[key] += sent[key]
+
+    if not report['sent'] and not all(result for result, _ in outcomes):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report['results'][0]['error'])
+    return report
+
+
+@app.post("/meeting/create_event", response_model=EventId)
+async def create_event(event: NewEvent,
+                       handler=Depends(meeting_handler),
+                       idempotency_key: Optional[str] = Header(None)):
     """
-    Create a Google Meet event.
+    Create a Google Meet event. With an Idempotency-Key the Meet
+    conference is requested with an ID derived from it.
 
     Request: POST
     Body: {'summary': str ,
            'attendees': list,
-           'start': str,
-           'end': str,
+           'start': datetime,
+           'end': datetime,
            'timezone': str,
            'calendar_id': optional[str],
-           'location': optional[str]
+           'location': optional[str],
+           'recurrence': optional[list]
     }
+    'start' and 'end' without a UTC offset are read in 'timezone'.
+    'recurrence' holds RRULE, EXRULE, RDATE and EXDATE lines.
+    Returns {'event_id':}
     """
     logger.log_info("New event creation request received: {}".format(event))
-    result, err = meeting_helper.MeetingHandler(Auth.CREDENTIALS_FILE)\
-        .create_event(event.calendar_id, event.summary, event.attendees,
-                      event.start, event.end, event.timezone, event.location)
+    try:
+        recurrence.validate(event.recurrence or [])
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+    result, event_id = await run_in_threadpool(
+        handler.create_event,
+        event.calendar_id, event.summary, event.attendees,
+        event.start.isoformat(), event.end.isoformat(), event.timezone,
+        event.location, event.recurrence,
+        request_id(handler.account or '', idempotency_key)
+        if idempotency_key else None)
 
     if not result:
         logger.log_error("Error creating event")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=err)
+            detail=event_id)
+    return {'event_id': event_id}
+
+
+@app.post("/meeting/create_events", response_model=CreatedEvents)
+async def create_events(events: NewEvents,
+                        handler=Depends(meeting_handler),
+                        idempotency_key: Optional[str] = Header(None)):
+    """
+    Create many Google Meet events from a template, one per row. Rows
+    repeating the same event a fixed number of days apart are created as a
+    single recurring event.
+
+    Request: POST
+    Body: {'summary': str,
+           'attendees': optional[list],
+           'timezone': str,
+           'calendar_id': optional[str],
+           'location': optional[str],
+           'send_updates': optional[str],
+           'rows': [{'start': datetime,
+                     'end': datetime,
+                     'summary': optional[str],
+                     'attendees': optional[list],
+                     'location': optional[str]}]
+    }
+    Row fields override the template ones, row times need a UTC offset.
+    Returns {'events': [{'event_id':, 'rows':, 'recurrence':}],
+             'failed': {row: err_msg}}
+    """
+    logger.log_info("New bulk event creation request received: {} rows"
+                    .format(len(events.rows)))
+    if not events.rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="At least one row is required")
+    if events.send_updates not in Meeting.SEND_UPDATES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="send_updates must be one of {}".format(
+                ', '.join(Meeting.SEND_UPDATES)))
+    try:
+        recurrence.zone(events.timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+    rows = []
+    for row in events.rows:
+        rows.append({
+            'summary': row.summary or events.summary,
+            'attendees': events.attendees if row.attendees is None
+            else row.attendees,
+            'location': row.location or events.location,
+            'start': row.start.isoformat(),
+            'end': row.end.isoformat()})
+
+    result, report = await run_in_threadpool(
+        handler.create_events, events.calendar_id, rows, events.timezone,
+        events.send_updates,
+        request_id(handler.account or '', idempotency_key)
+        if idempotency_key else None)
+
+    if not result:
+        logger.log_error("Error creating events")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report)
+    return report
+
+
+@app.post("/meeting/search_events", response_model=FoundEvents)
+async def search_events(search: EventSearch,
+                        handler=Depends(meeting_handler)):
+    """
+    Search the events of a calendar by time window, attendee and text.
+
+    Request: POST
+    Body: {'calendar_id': optional[str],
+           'time_min': optional[datetime],
+           'time_max': optional[datetime],
+           'attendee': optional[str],
+           'text': optional[str],
+           'limit': optional[int]
+    }
+    Returns {'events': [{'event_id':, 'summary':, 'start':, 'end':,
+                         'location':, 'attendees':}],
+             'source': 'index' or 'api'}
+    Times are RFC3339 with a UTC offset.
+    """
+    logger.log_info("New event search request received: {}".format(search))
+    try:
+        time_min = int(search.time_min.timestamp()) if search.time_min\
+            else None
+        time_max = int(search.time_max.timestamp()) if search.time_max\
+            else None
+        if time_min is not None and time_max is not None and\
+                time_max <= time_min:
+            raise ValueError("time_max must be after time_min")
+        if search.limit <= 0:
+            raise ValueError("limit must be positive")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+
+    result, found = await run_in_threadpool(
+        handler.search_events, search.calendar_id, time_min, time_max,
+        search.attendee, search.text, search.limit)
+
+    if not result:
+        logger.log_error("Error searching events")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=found)
+    return found
+
+
+@app.post("/meeting/find_slots", response_model=FreeSlots)
+async def find_slots(search: SlotSearch,
+                     handler=Depends(meeting_handler)):
+    """
+    Find the first free slots shared by every attendee and calendar, within
+    working hours.
+
+    Request: POST
+    Body: {'attendees': optional[list],
+           'calendar_ids': optional[list],
+           'time_min': datetime,
+           'time_max': datetime,
+           'duration': int,
+           'count': optional[int],
+           'work_start': optional[str],
+           'work_end': optional[str],
+           'utc_offset': optional[str],
+           'weekdays': optional[list]
+    }
+    'duration' is in minutes, 'work_start' and 'work_end' are 'HH:MM' in
+    'utc_offset', null allows any time, and 'weekdays' counts Monday as 0.
+    Times are RFC3339 with a UTC offset.
+    Returns {'slots': [{'start':, 'end':}], 'errors': {id: reason}}
+    """
+    from helpers import slots
+
+    logger.log_info("New slot search request received: {}".format(search))
+    calendars = list(search.attendees) + list(search.calendar_ids)
+    try:
+        if not calendars:
+            raise ValueError("At least one attendee or calendar ID is "
+                             "required")
+        time_min = int(search.time_min.timestamp())
+        time_max = int(search.time_max.timestamp())
+        offset = slots.parse_offset(search.utc_offset)
+        if time_max <= time_min:
+            raise ValueError("time_max must be after time_min")
+        if search.duration <= 0 or search.count <= 0:
+            raise ValueError("duration and count must be positive")
+        work_start = work_end = None
+        if search.work_start is not None or search.work_end is not None:
+            work_start = slots.parse_clock(search.work_start or '00:00')
+            work_end = slots.parse_clock(search.work_end or '24:00')
+            if work_end <= work_start:
+                raise ValueError("work_end must be after work_start")
+        if any(day not in range(7) for day in search.weekdays):
+            raise ValueError("weekdays must be between 0 and 6")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=str(e))
+
+    result, found = await run_in_threadpool(
+        handler.find_slots, calendars, time_min, time_max,
+        search.duration * 60, search.count, work_start, work_end, offset,
+        search.weekdays)
+
+    if not result:
+        logger.log_error("Error finding slots")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=found)
+    return found
 
 
 @app.post("/meeting/delete_event")
-async def delete_event(event: Event):
+async def delete_event(event: Event,
+                       handler=Depends(meeting_handler)):
     """
-    Create a Google Meet event.
+    Delete a Google Meet event, by ID or by summary.
 
     Request: POST
-    Body: {'summary': str ,
+    Body: {'summary': optional[str],
+           'event_id': optional[str],
            'calendar_id': optional[str],
     }
     """
     logger.log_info("New event deletion request received: {}".format(event))
-    result, err = meeting_helper.MeetingHandler(Auth.CREDENTIALS_FILE)\
-        .delete_event(event.calendar_id, event.summary)
+    _identify('event', event.summary, event.event_id)
+    result, err = await run_in_threadpool(
+        handler.delete_event, event.calendar_id, event.summary,
+        event.event_id)
 
     if not result:
         logger.log_error("Error deleting event")
@@ -107,8 +700,9 @@ async def delete_event(event: Event):
             detail=err)
 
 
-@app.post("/meeting/create_calendar")
-async def create_calendar(calendar: NewCalendar):
+@app.post("/meeting/create_calendar", response_model=CalendarId)
+async def create_calendar(calendar: NewCalendar,
+                          handler=Depends(meeting_handler)):
     """
     Create Google Calendar calendar.
 
@@ -116,32 +710,37 @@ async def create_calendar(calendar: NewCalendar):
     Body: {'summary': str,
            'time_zone': str
     }
+    Returns {'calendar_id':}
     """
     logger.log_info("New calendar creation request received: {}"
                     .format(calendar))
-    result, err = meeting_helper.MeetingHandler(Auth.CREDENTIALS_FILE)\
-        .create_calendar(calendar.summary, calendar.time_zone)
+    result, calendar_id = await run_in_threadpool(
+        handler.create_calendar, calendar.summary, calendar.time_zone)
 
     if not result:
         logger.log_error("Error creating calendar")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=err)
+            detail=calendar_id)
+    return {'calendar_id': calendar_id}
 
 
 @app.post("/meeting/delete_calendar")
-async def delete_calendar(calendar: Calendar):
+async def delete_calendar(calendar: Calendar,
+                          handler=Depends(meeting_handler)):
     """
-    Delete Google Calendar calendar.
+    Delete Google Calendar calendar, by ID or by summary.
 
     Request: POST
-    Body: {'summary': str,
+    Body: {'summary': optional[str],
+           'calendar_id': optional[str],
     }
     """
     logger.log_info("New calendar deletion request received: {}"
                     .format(calendar))
-    result, err = meeting_helper.MeetingHandler(Auth.CREDENTIALS_FILE)\
-        .delete_calendar(calendar.summary)
+    _identify('calendar', calendar.summary, calendar.calendar_id)
+    result, err = await run_in_threadpool(
+        handler.delete_calendar, calendar.summary, calendar.calendar_id)
 
     if not result:
         logger.log_error("Error deleting calendar")
@@ -150,8 +749,9 @@ async def delete_calendar(calendar: Calendar):
             detail=err)
 
 
-@app.post("/meeting/get_calendar_id")
-async def get_calendar_id(calendar: Calendar):
+@app.post("/meeting/get_calendar_id", response_model=CalendarId)
+async def get_calendar_id(calendar: Calendar,
+                          handler=Depends(meeting_handler)):
     """
     Get calendar ID by syntax.
 
@@ -161,20 +761,57 @@ async def get_calendar_id(calendar: Calendar):
     Returns {'calendar_id':}
     """
     logger.log_info("Get Calendar ID request received: {}".format(calendar))
-    result, calendar_id = meeting_helper.MeetingHandler(Auth.CREDENTIALS_FILE)\
-        .get_calendar_id(calendar.summary)
+    _identify('calendar', calendar.summary, None)
+    result, calendar_id = await run_in_threadpool(
+        handler.get_calendar_id, calendar.summary)
 
     if not result:
         logger.log_error("Error fetching calendar ID")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=calendar_id)
-    return json.dumps({
-        'calendar_id': calendar_id})
+    return {'calendar_id': calendar_id}
+
+
+def _create_item(handler, item):
+    """
+    Write the content of an item to a temporary file and upload it. Both
+    block, so it runs in the threadpool.
+
+    Args:
+        - handler(StorageHandler): handler of the request.
+        - item(NewItem): item to create.
+
+    Returns(tupple):
+        (True, file_id) or (False, err_msg)
+
+    """
+    suffix = ".{}".format(item.file_name.split('.', 1)[-1])
+    f = tempfile.NamedTemporaryFile(suffix=suffix)
+    content = item.content
+    if any(space in content for space in WHITESPACE):
+        # Line broken base64, chunks must hold whole groups of 4 characters.
+        content = ''.join(content.split())
+    md5 = hashlib.md5() if item.dedup else None
+    # Every chunk is decoded, written and hashed in a single pass.
+    for start in range(0, len(content), Drive.DECODE_CHUNK_SIZE):
+        data = base64.b64decode(
+            content[start:start + Drive.DECODE_CHUNK_SIZE])
+        f.write(data)
+        if md5:
+            md5.update(data)
+    f.flush()
+    md5 = md5.hexdigest() if md5 else None
+    os.link(f.name, item.file_name)
+    result, file_id = handler.create_file(item.file_name, item.parent_name,
+                                          item.parent_id, item.dedup, md5)
+    os.remove(item.file_name)
+    return result, file_id
 
 
-@app.post("/storage/create_item")
-async def create_item(item: NewItem):
+@app.post("/storage/create_item", response_model=FileId)
+async def create_item(item: NewItem,
+                      handler=Depends(storage_handler)):
     """
     Create Item on Google Drive.
 
@@ -182,38 +819,47 @@ async def create_item(item: NewItem):
     Body: {
         'file_name': str,
         'content' bytes,
-        'parent_name': optinal[str]
+        'parent_name': optinal[str],
+        'parent_id': optional[str],
+        'dedup': optional[str], 'name' or 'any'
     }
+    Returns {'file_id':}
     """
-    logger.log_info("Create file request received: {}".format(item))
-    suffix = ".{}".format(item.file_name.split('.', 1)[-1])
-    f = tempfile.NamedTemporaryFile(suffix=suffix)
-    data = base64.b64decode(item.content)
-    f.write(data)
-    os.link(f.name, item.file_name)
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .create_file(item.file_name, item.parent_name)
-    os.remove(item.file_name)
+    logger.log_info("Create file request received: {} in {}"
+                    .format(item.file_name,
+                            item.parent_id or item.parent_name))
+    if item.dedup and item.dedup not in Drive.DEDUP_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="dedup must be one of {}".format(
+                ', '.join(Drive.DEDUP_MODES)))
+    result, file_id = await run_in_threadpool(_create_item, handler, item)
     if not result:
-        logger.log_error("Error creating file: {}".format(err))
+        logger.log_error("Error creating file: {}".format(file_id))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=err)
+            detail=file_id)
+    return {'file_id': file_id}
 
 
 @app.post("/storage/delete_item")
-async def delete_item(item: Item):
+async def delete_item(item: Item,
+                      handler=Depends(storage_handler)):
     """
-    Delete Item on Google Drive using its name.
+    Delete Item on Google Drive using its ID or its name.
 
     Request: POST
     Body: {
-        'file_name': str,
-        'parent_name': optional[str]
+        'file_name': optional[str],
+        'file_id': optional[str],
+        'parent_name': optional[str],
+        'parent_id': optional[str]
     """
     logger.log_info("Delete file request received: {}".format(item))
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .delete_file(item.file_name, item.parent_name)
+    _identify('file', item.file_name, item.file_id)
+    result, err = await run_in_threadpool(
+        handler.delete_file, item.file_name, item.parent_name, item.file_id,
+        item.parent_id)
     if not result:
         logger.log_error("Error deleting file: {}".format(err))
         raise HTTPException(
@@ -221,41 +867,51 @@ async def delete_item(item: Item):
             detail=err)
 
 
-@app.post("/storage/create_folder")
-async def create_folder(folder: Folder):
+@app.post("/storage/create_folder", response_model=FolderId)
+async def create_folder(folder: NewFolder,
+                        handler=Depends(storage_handler)):
     """
     Create Folder on Google Drive.
 
     Request: POST
     Body: {
         'folder_name': str,
-        'parent_name': optinal[str]
+        'parent_name': optinal[str],
+        'parent_id': optional[str]
     }
+    Returns {'folder_id':}
     """
     logger.log_info("Create folder request received: {}".format(folder))
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .create_folder(folder.folder_name, folder.parent_name)
+    result, folder_id = await run_in_threadpool(
+        handler.create_folder, folder.folder_name, folder.parent_name,
+        folder.parent_id)
     if not result:
-        logger.log_error("Error creating folder: {}".format(err))
+        logger.log_error("Error creating folder: {}".format(folder_id))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=err)
+            detail=folder_id)
+    return {'folder_id': folder_id}
 
 
 @app.post("/storage/delete_folder")
-async def delete_folder(folder: Folder):
+async def delete_folder(folder: Folder,
+                        handler=Depends(storage_handler)):
     """
-    Delete Folder on Google Drive.
+    Delete Folder on Google Drive, by ID or by name.
 
     Request: POST
     Body: {
-        'folder_name': str,
-        'parent_name': optinal[str]
+        'folder_name': optional[str],
+        'folder_id': optional[str],
+        'parent_name': optinal[str],
+        'parent_id': optional[str]
     }
     """
     logger.log_info("Delete folder request received: {}".format(folder))
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .delete_folder(folder.folder_name, folder.parent_name)
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, err = await run_in_threadpool(
+        handler.delete_folder, folder.folder_name, folder.parent_name,
+        folder.folder_id, folder.parent_id)
     if not result:
         logger.log_error("Error deleting folder: {}".format(err))
         raise HTTPException(
@@ -263,76 +919,266 @@ async def delete_folder(folder: Folder):
             detail=err)
 
 
-@app.post("/storage/item/exists")
-async def exists_item(item: Item):
+@app.post("/storage/item/exists", response_model=Exists)
+async def exists_item(item: Item,
+                      handler=Depends(storage_handler)):
     """
     Check whether an item exists.
 
     Request: POST
     Body: {
-        'item_name': str,
-        'parent_name': optinal[str]
+        'file_name': optional[str],
+        'file_id': optional[str],
+        'parent_name': optinal[str],
+        'parent_id': optional[str]
     }
 
     Returns {'result': 'True/False'}
     """
     logger.log_info("Check item existance request received: {}"
                     .format(item))
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .exist(item.file_name, item.parent_name)
+    _identify('file', item.file_name, item.file_id)
+    result, err = await run_in_threadpool(
+        handler.exist, item.file_name, item.parent_name, item.file_id,
+        item.parent_id)
     if err:
         logger.log_error("Error fetching item: {}".format(err))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=err)
-    return json.dumps({'result': result})
+    return {'result': result}
 
 
-@app.post("/storage/folder/exists")
-async def exists_folder(folder: Folder):
+@app.post("/storage/folder/exists", response_model=Exists)
+async def exists_folder(folder: Folder,
+                        handler=Depends(storage_handler)):
     """
     Check whether an folder exists.
 
     Request: POST
     Body: {
-        'folder_name': str,
-        'parent_name': optinal[str]
+        'folder_name': optional[str],
+        'folder_id': optional[str],
+        'parent_name': optinal[str],
+        'parent_id': optional[str]
     }
 
     Returns {'result': 'True/False'}
     """
     logger.log_info("Check folder existance request received: {}"
                     .format(folder))
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .exist(folder.folder_name, folder.parent_name)
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, err = await run_in_threadpool(
+        handler.exist, folder.folder_name, folder.parent_name,
+        folder.folder_id, folder.parent_id)
     if err:
         logger.log_error("Error fetching folder: {}".format(err))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=err)
-    return json.dumps({'result': result})
+    return {'result': result}
 
 
 @app.post("/storage/share_folder")
-async def share_folder(folder: SharedFolder):
+async def share_folder(folder: SharedFolder,
+                       handler=Depends(storage_handler)):
     """
     Share a folder with other user.
 
     Request: POST
     Body: {
-        'folder_name': str,
+        'folder_name': optional[str],
+        'folder_id': optional[str],
         'parent_name': optional[str],
+        'parent_id': optional[str],
         'email': str,
         'role': optional[str],
         'notify' bool
     }
     """
     logger.log_info("Share folder request received: {}".format(folder))
-    result, err = storage_helper.StorageHandler(Auth.CREDENTIALS_FILE)\
-        .share_folder(folder.folder_name, folder.email, folder.parent_name,
-                      folder.role, folder.notify)
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, err = await run_in_threadpool(
+        handler.share_folder, folder.folder_name, folder.email,
+        folder.parent_name, folder.role, folder.notify, folder.folder_id,
+        folder.parent_id)
     if err:
         logger.log_error("Error sharing folder: {}".format(err))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=err)
+
+
+@app.post("/storage/tree/copy", response_model=TreeReport)
+async def copy_tree(folder: CopiedFolder,
+                    handler=Depends(storage_handler)):
+    """
+    Copy a folder and everything below it.
+
+    Request: POST
+    Body: {
+        'folder_name': optional[str],
+        'folder_id': optional[str],
+        'parent_name': optional[str],
+        'parent_id': optional[str],
+        'destination_id': optional[str],
+        'name': optional[str]
+    }
+
+    Returns {'folder_id': str, 'done': int, 'failed': {id: error}}
+    """
+    logger.log_info("Copy folder tree request received: {}".format(folder))
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, report = await run_in_threadpool(
+        handler.copy_tree, folder.folder_name, folder.parent_name,
+        folder.folder_id, folder.parent_id, folder.destination_id,
+        folder.name)
+    if not result:
+        logger.log_error("Error copying folder tree: {}".format(report))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report)
+    return report
+
+
+@app.post("/storage/tree/delete", response_model=TreeReport)
+async def delete_tree(folder: Folder,
+                      handler=Depends(storage_handler)):
+    """
+    Delete a folder and everything below it.
+
+    Request: POST
+    Body: {
+        'folder_name': optional[str],
+        'folder_id': optional[str],
+        'parent_name': optional[str],
+        'parent_id': optional[str]
+    }
+
+    Returns {'folder_id': str, 'done': int, 'failed': {id: error}}
+    """
+    logger.log_info("Delete folder tree request received: {}".format(folder))
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, report = await run_in_threadpool(
+        handler.delete_tree, folder.folder_name, folder.parent_name,
+        folder.folder_id, folder.parent_id)
+    if not result:
+        logger.log_error("Error deleting folder tree: {}".format(report))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report)
+    return report
+
+
+@app.post("/storage/tree/share", response_model=TreeReport)
+async def share_tree(folder: SharedFolder,
+                     handler=Depends(storage_handler)):
+    """
+    Share a folder and every item below it with other user.
+
+    Request: POST
+    Body: {
+        'folder_name': optional[str],
+        'folder_id': optional[str],
+        'parent_name': optional[str],
+        'parent_id': optional[str],
+        'email': str,
+        'role': optional[str],
+        'notify' bool
+    }
+
+    Returns {'folder_id': str, 'done': int, 'failed': {id: error}}
+    """
+    logger.log_info("Share folder tree request received: {}".format(folder))
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, report = await run_in_threadpool(
+        handler.share_tree, folder.folder_name, folder.email,
+        folder.parent_name, folder.role, folder.notify, folder.folder_id,
+        folder.parent_id)
+    if not result:
+        logger.log_error("Error sharing folder tree: {}".format(report))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report)
+    return report
+
+
+@app.post("/storage/tree/unshare", response_model=TreeReport)
+async def unshare_tree(folder: UnsharedFolder,
+                       handler=Depends(storage_handler)):
+    """
+    Stop sharing a folder and every item below it with other user.
+
+    Request: POST
+    Body: {
+        'folder_name': optional[str],
+        'folder_id': optional[str],
+        'parent_name': optional[str],
+        'parent_id': optional[str],
+        'email': str
+    }
+
+    Returns {'folder_id': str, 'done': int, 'failed': {id: error}}
+    """
+    logger.log_info("Unshare folder tree request received: {}"
+                    .format(folder))
+    _identify('folder', folder.folder_name, folder.folder_id)
+    result, report = await run_in_threadpool(
+        handler.unshare_tree, folder.folder_name, folder.email,
+        folder.parent_name, folder.folder_id, folder.parent_id)
+    if not result:
+        logger.log_error("Error unsharing folder tree: {}".format(report))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report)
+    return report
+
+
+@app.post("/storage/upload_archive", response_model=ArchiveReport)
+async def upload_archive(request: Request,
+                         parent_name: Optional[str] = None,
+                         parent_id: Optional[str] = None,
+                         handler=Depends(storage_handler)):
+    """
+    Upload the content of an archive to Google Drive, recreating its
+    folders. The archive is streamed as the raw request body.
+
+    Request: POST
+    Query: ?parent_name=optional[str]&parent_id=optional[str]
+    Body: zip or tar archive, tar may be gzip, bz2 or xz compressed.
+    Archives over Drive.ARCHIVE_MAX_SIZE, or whose content is over the
+    Drive.ARCHIVE_MAX_MEMBER_SIZE or Drive.ARCHIVE_MAX_TOTAL_SIZE limits
+    once uncompressed, are rejected with a 413.
+
+    Returns {'folder_id': str, 'done': int, 'ids': {path: id},
+             'failed': {path: error}}
+    """
+    logger.log_info("Upload archive request received into {}"
+                    .format(parent_id or parent_name or 'root'))
+    try:
+        if int(request.headers.get('content-length', 0)) > \
+                Drive.ARCHIVE_MAX_SIZE:
+            raise archive.ArchiveTooLarge(
+                "Archive is over the {} bytes limit"
+                .format(Drive.ARCHIVE_MAX_SIZE))
+        f = await archive.spool(request.stream(), Drive.ARCHIVE_SPOOL_SIZE,
+                                Drive.ARCHIVE_MAX_SIZE)
+        with f:
+            if not await run_in_threadpool(archive.detect, f):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Unsupported archive, expected a zip or tar file")
+            result, report = await run_in_threadpool(
+                handler.upload_archive, f, parent_name, parent_id)
+    except archive.ArchiveTooLarge as e:
+        logger.log_error("Error uploading archive: {}".format(e))
+        raise HTTPException(
+            # Renamed CONTENT_TOO_LARGE in newer starlette releases.
+            status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e))
+    if not result:
+        logger.log_error("Error uploading archive: {}".format(report))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=report)
+    return report
@@ -0,0 +1,281 @@
+"""
+Benchmark every route of api.py against the in-process fake Google backend.
+
+Usage:
+    python -m benchmarks.api_bench                 # run and compare
+    python -m benchmarks.api_bench --save          # store a new baseline
+    python -m benchmarks.api_bench --only storage  # run a subset
+
+The run exits with status 1 when any case regresses past both the relative
+threshold and the absolute floor compared to the stored baseline. The
+floor keeps sub-millisecond cases, whose timing noise is larger than the
+threshold, from failing the run on noise alone. Every case runs a discarded
+warm-up pass first, and the best of a few measured runs, taken in separate
+passes over the suite, is kept.
+Baselines are only comparable on the machine that recorded them, so
+re-record with --save after changing hosts.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+
+from consts.backend import Backend
+from helpers import email_helper, fake_google
+from benchmarks.harness import AsgiClient, best, compare, load_baseline, \
+    report, run_load, save_results
+from utils.rate_limit import RateLimits
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'api.json')
+EMAIL = 'bench@example.com'
+# IDs of the resources created by the last setup, in creation order.
+IDS = []
+
+
+def _content(size):
+    return base64.b64encode(os.urandom(size)).decode()
+
+
+def _event(summary):
+    return {'summary': summary,
+            'attendees': [EMAIL],
+            'start': '2030-01-01T10:00:00-03:00',
+            'end': '2030-01-01T11:00:00-03:00',
+            'timezone': 'America/Argentina/Buenos_Aires',
+            'calendar_id': 'primary'}
+
+
+def _setup_events(count):
+    service = fake_google.backend.build('calendar', 'v3')
+    IDS.clear()
+    for i in range(count):
+        IDS.append(service.events().insert(calendarId='primary', body={
+            'summary': 'bench-{}'.format(i),
+            'start': {'dateTime': '2030-01-01T10:00:00-03:00'},
+            'end': {'dateTime': '2030-01-01T11:00:00-03:00'}}
+        ).execute()['id'])
+
+
+def _setup_calendars(count):
+    service = fake_google.backend.build('calendar', 'v3')
+    IDS.clear()
+    for i in range(count):
+        IDS.append(service.calendars().insert(
+            body={'summary': 'bench-{}'.format(i)}).execute()['id'])
+
+
+def _setup_folders(count):
+    service = fake_google.backend.build('drive', 'v3')
+    IDS.clear()
+    for i in range(count):
+        IDS.append(service.files().create(body={
+            'name': 'bench-{}'.format(i),
+            'mimeType': fake_google.FOLDER_MIME_TYPE}).execute()['id'])
+
+
+def _setup_files(count):
+    service = fake_google.backend.build('drive', 'v3')
+    IDS.clear()
+    for i in range(count):
+        IDS.append(service.files().create(body={
+            'name': 'bench-{}.txt'.format(i),
+            'mimeType': 'text/plain'}).execute()['id'])
+
+
+# name, path, body(index, size), setup(count), sized
+SCENARIOS = [
+    ('email.send', '/email/send_email',
+     lambda i, size: {'recipient': EMAIL, 'sender': EMAIL,
+                      'body': 'Benchmark', 'subject': 'Benchmark'},
+     None, False),
+    ('email.send_attachment', '/email/send_email',
+     lambda i, size: {'recipient': EMAIL, 'sender': EMAIL,
+                      'body': 'Benchmark', 'subject': 'Benchmark',
+                      'attachement': _content(size), 'extension': '.bin'},
+     None, True),
+    ('meeting.create_event', '/meeting/create_event',
+     lambda i, size: _event('bench-{}'.format(i)), None, False),
+    ('meeting.delete_event', '/meeting/delete_event',
+     lambda i, size: {'summary': 'bench-{}'.format(i),
+                      'calendar_id': 'primary'},
+     _setup_events, False),
+    ('meeting.delete_event_by_id', '/meeting/delete_event',
+     lambda i, size: {'event_id': IDS[i], 'calendar_id': 'primary'},
+     _setup_events, False),
+    ('meeting.create_calendar', '/meeting/create_calendar',
+     lambda i, size: {'summary': 'bench-{}'.format(i),
+                      'time_zone': 'UTC'},
+     None, False),
+    ('meeting.get_calendar_id', '/meeting/get_calendar_id',
+     lambda i, size: {'summary': 'bench-0'},
+     lambda count: _setup_calendars(1), False),
+    ('meeting.delete_calendar', '/meeting/delete_calendar',
+     lambda i, size: {'summary': 'bench-{}'.format(i)},
+     _setup_calendars, False),
+    ('meeting.delete_calendar_by_id', '/meeting/delete_calendar',
+     lambda i, size: {'calendar_id': IDS[i]},
+     _setup_calendars, False),
+    ('storage.create_item', '/storage/create_item',
+     lambda i, size: {'file_name': 'bench-{}.bin'.format(i),
+                      'content': _content(size)},
+     None, True),
+    ('storage.delete_item', '/storage/delete_item',
+     lambda i, size: {'file_name': 'bench-{}.txt'.format(i)},
+     _setup_files, False),
+    ('storage.delete_item_by_id', '/storage/delete_item',
+     lambda i, size: {'file_id': IDS[i]},
+     _setup_files, False),
+    ('storage.create_folder', '/storage/create_folder',
+     lambda i, size: {'folder_name': 'bench-{}'.format(i)}, None, False),
+    ('storage.delete_folder', '/storage/delete_folder',
+     lambda i, size: {'folder_name': 'bench-{}'.format(i)},
+     _setup_folders, False),
+    ('storage.delete_folder_by_id', '/storage/delete_folder',
+     lambda i, size: {'folder_id': IDS[i]},
+     _setup_folders, False),
+    ('storage.exists_item', '/storage/item/exists',
+     lambda i, size: {'file_name': 'bench-0.txt'},
+     lambda count: _setup_files(1), False),
+    ('storage.exists_folder', '/storage/folder/exists',
+     lambda i, size: {'folder_name': 'bench-0'},
+     lambda count: _setup_folders(1), False),
+    ('storage.share_folder', '/storage/share_folder',
+     lambda i, size: {'folder_name': 'bench-0', 'email': EMAIL},
+     lambda count: _setup_folders(1), False),
+    ('storage.share_folder_by_id', '/storage/share_folder',
+     lambda i, size: {'folder_id': IDS[0], 'email': EMAIL},
+     lambda count: _setup_folders(1), False),
+]
+
+
+async def _case(client, path, body, setup, size, requests, concurrency):
+    """
+    Run a case against a freshly reset backend.
+
+    Returns(dict):
+        Summary of the run, see harness.summarize().
+
+    """
+    fake_google.backend.reset()
+    if setup:
+        setup(requests)
+    # Bodies are built up front so payload generation is not part of the
+    # measured latency.
+    bodies = [body(i, size) for i in range(requests)]
+
+    async def send_request(index):
+        status, _, _ = await client.request('POST', path, bodies[index])
+        return status
+
+    return await run_load(send_request, requests, concurrency)
+
+
+async def _measure(client, args):
+    runs = {}
+    # Host noise comes in phases of several seconds, the repeated runs of a
+    # case are spread over separate passes of the whole suite so they do not
+    # all land in the same one.
+    for _ in range(args.repeat):
+        for name, path, body, setup, sized in SCENARIOS:
+            if args.only and args.only not in name:
+                continue
+            for size in (args.sizes if sized else [None]):
+                requests = args.payload_requests if size else args.requests
+                for concurrency in args.concurrency:
+                    # The first pass warms the caches and the threadpool up,
+                    # its results are discarded.
+                    await _case(client, path, body, setup, size,
+                                min(args.warmup, requests), concurrency)
+                    case = '{}[c={}{}]'.format(
+                        name, concurrency,
+                        ',size={}'.format(size) if size else '')
+                    run = await _case(client, path, body, setup, size,
+                                      requests, concurrency)
+                    runs.setdefault(case, []).append(dict(
+                        run, route=path, concurrency=concurrency,
+                        payload=size))
+    return {case: best(case_runs) for case, case_runs in runs.items()}
+
+
+async def run(app, args):
+    from helpers.render_pool import render_pool
+    from helpers.warmup import warmup
+
+    # Measure a warm worker, as /ready only lets traffic reach those: the
+    # startup warm-up ran and the render processes are started.
+    async with app.router.lifespan_context(app):
+        while not warmup.ready:
+            await asyncio.sleep(0.01)
+        render_pool.get().submit(int).result()
+        try:
+            return await _measure(AsgiClient(app), args)
+        finally:
+            render_pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per case')
+    parser.add_argument('--payload-requests', type=int, default=100,
+                        help='requests per case with a payload size')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='measured runs per case, the best is kept')
+    parser.add_argument('--warmup', type=int, default=50,
+                        help='requests of the discarded pass run before '
+                        'every case')
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help='comma separated concurrency levels')
+    parser.add_argument('--sizes', default='1024,65536,1048576',
+                        help='comma separated payload sizes in bytes')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds of latency injected per Google call')
+    parser.add_argument('--only', default='',
+                        help='only run cases whose name contains this')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative regression (0.25 = 25%%)')
+    parser.add_argument('--floor', type=float, default=1.0,
+                        help='allowed absolute regression of the time per '
+                        'request in ms, times the concurrency for the p95')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(',')]
+    args.sizes = [int(s) for s in args.sizes.split(',')]
+
+    Backend.MODE = Backend.FAKE
+    fake_google.backend.configure(latency=args.latency, jitter=0,
+                                  error_rate=0)
+    # Routes are measured without the per account Gmail send quota, its
+    # throughput over many accounts is measured by sender_bench.
+    email_helper.send_quota = RateLimits('gmail_send', 1e9)
+    from api import app
+
+    results = asyncio.run(run(app, args))
+    report(results)
+
+    if args.output:
+        save_results(args.output, results)
+    if args.save:
+        save_results(args.baseline, results)
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print('No baseline found at {}'.format(args.baseline))
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.floor)
+    for regression in regressions:
+        print('REGRESSION {}'.format(regression))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Compare uploading a directory file by file through /storage/create_item
+with a single /storage/upload_archive call, against the fake Google backend
+with injected latency.
+
+Usage:
+    python -m benchmarks.archive_bench [--files 200] [--folders 10]
+                                       [--size 4096] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import sys
+import time
+import zipfile
+
+from consts.backend import Backend
+from helpers import fake_google
+from benchmarks.harness import AsgiClient, save_results
+
+
+def _files(count, folders, size):
+    return {'dir-{}/file-{}.bin'.format(i % folders, i): os.urandom(size)
+            for i in range(count)}
+
+
+async def _per_file(client, files):
+    for folder in sorted({path.split('/')[0] for path in files}):
+        await client.request('POST', '/storage/create_folder',
+                             {'folder_name': folder})
+    for path, data in files.items():
+        folder, name = path.split('/')
+        status, _, _ = await client.request(
+            'POST', '/storage/create_item',
+            {'file_name': name, 'parent_name': folder,
+             'content': base64.b64encode(data).decode()})
+        assert status == 200, status
+
+
+async def _archive(client, files):
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, 'w') as z:
+        for path, data in files.items():
+            z.writestr(path, data)
+    status, _, content = await client.request(
+        'POST', '/storage/upload_archive', f.getvalue())
+    assert status == 200, content
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--folders', type=int, default=10)
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds of latency injected per Google call')
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    Backend.MODE = Backend.FAKE
+    fake_google.backend.configure(latency=args.latency, jitter=0,
+                                  error_rate=0)
+    from api import app
+
+    client = AsgiClient(app)
+    files = _files(args.files, args.folders, args.size)
+    results = {}
+    for name, upload in (('create_item', _per_file),
+                         ('upload_archive', _archive)):
+        fake_google.backend.reset()
+        start = time.perf_counter()
+        asyncio.run(upload(client, files))
+        elapsed = time.perf_counter() - start
+        results[name] = {'seconds': round(elapsed, 3),
+                         'files_per_s': round(args.files / elapsed, 1),
+                         'google_calls': fake_google.backend.call_count}
+        print('{:<16}{:>10.2f} s{:>10.1f} files/s{:>8} Google calls'.format(
+            name, elapsed, args.files / elapsed,
+            fake_google.backend.call_count))
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Measure event searches over years of calendar history, against the fake
+Google backend with injected latency:
+
+    api       cold cache, bounded events.list calls
+    sync      the full sync building the local event index, once
+    index     warm cache, answered from the local interval index
+
+Every search asks for a random week, half of them for a random attendee.
+
+Usage:
+    python -m benchmarks.event_search_bench [--years 5] [--per-week 50]
+                                            [--searches 200] [--latency 0.05]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from consts.auth import Auth
+from consts.backend import Backend
+from helpers import fake_google
+from helpers.event_index import event_index
+from benchmarks.harness import report, save_results, summarize
+
+
+ATTENDEES = ['user-{}@example.com'.format(i) for i in range(200)]
+
+
+def _populate(years, per_week):
+    rng = random.Random(0)
+    first = datetime(2020, 1, 6, tzinfo=timezone.utc)
+    weeks = years * 52
+    for i in range(weeks * per_week):
+        start = first + timedelta(minutes=30 * rng.randrange(weeks * 7 * 48))
+        fake_google.backend.events_insert('primary', {
+            'summary': 'Meeting {}'.format(i),
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=1)).isoformat()},
+            'attendees': [{'email': email}
+                          for email in rng.sample(ATTENDEES, 3)]})
+    return first, weeks
+
+
+def _searches(handler, first, weeks, count):
+    rng = random.Random(1)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        week = first + timedelta(weeks=rng.randrange(weeks))
+        attendee = rng.choice(ATTENDEES) if i % 2 else None
+        began = time.perf_counter()
+        result, _ = handler.search_events(
+            'primary', int(week.timestamp()),
+            int((week + timedelta(weeks=1)).timestamp()), attendee)
+        latencies.append(time.perf_counter() - began)
+        assert result
+    return summarize(latencies, 0, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--per-week', type=int, default=50)
+    parser.add_argument('--searches', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds of latency injected per Google call')
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    Backend.MODE = Backend.FAKE
+    fake_google.backend.reset()
+    fake_google.backend.configure(latency=args.latency, jitter=0,
+                                  error_rate=0)
+    from helpers.meeting_helper import MeetingHandler
+    handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+    first, weeks = _populate(args.years, args.per_week)
+
+    # Keep the background warm-up from turning the cold runs warm.
+    event_index.warm = lambda calendar, sync: False
+    results = {'api': _searches(handler, first, weeks,
+                                min(args.searches, 20))}
+    del event_index.warm
+
+    start = time.perf_counter()
+    _, count = handler.sync_events('primary')
+    results['sync'] = summarize([time.perf_counter() - start], 0,
+                                time.perf_counter() - start)
+    results['index'] = _searches(handler, first, weeks, args.searches)
+    report(results)
+    print('{} events indexed'.format(count))
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import platform
+import time
+
+
+class AsgiClient:
+    """
+    Minimal in-process HTTP client for an ASGI application. Requests never
+    leave the process, so the measured latency is the application's own.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, body=None, headers=None,
+                      query_string=b''):
+        """
+        Send a request to the application.
+
+        Args:
+            - method(str): HTTP method.
+            - path(str): request path.
+            - body(dict | bytes): JSON serializable body or raw bytes.
+            - headers(dict): extra request headers.
+            - query_string(bytes): raw query string.
+
+        Returns(tupple):
+            (status_code, headers, body)
+
+        """
+        if isinstance(body, (bytes, bytearray)):
+            data = bytes(body)
+            content_type = b'application/octet-stream'
+        else:
+            data = json.dumps(body).encode() if body is not None else b''
+            content_type = b'application/json'
+        raw_headers = [(b'content-type', content_type),
+                       (b'content-length', str(len(data)).encode())]
+        for key, value in (headers or {}).items():
+            raw_headers.append((key.lower().encode(), value.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': method, 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': query_string, 'headers': raw_headers,
+            'server': ('bench', 80), 'client': ('bench', 1),
+        }
+        sent = False
+        messages = []
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {'type': 'http.disconnect'}
+            sent = True
+            return {'type': 'http.request', 'body': data,
+                    'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.app(scope, receive, send)
+        start = messages[0]
+        content = b''.join(message.get('body', b'')
+                           for message in messages[1:])
+        return start['status'], dict(start.get('headers', [])), content
+
+
+def percentile(values, ratio):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(ratio * len(values))) - 1))
+    return values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Summarize the latencies of a run.
+
+    Args:
+        - latencies(list): seconds taken by every request.
+        - errors(int): requests that did not return a 2xx status.
+        - elapsed(float): wall clock seconds of the run.
+
+    Returns(dict):
+    """
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def best(runs):
+    """
+    Merge repeated runs of a case. Host noise only ever slows a run down,
+    so the highest throughput and the lowest latencies of any run are kept.
+
+    Args:
+        - runs(list): summaries of the runs, see summarize().
+
+    Returns(dict):
+    """
+    merged = dict(runs[0])
+    merged['throughput'] = max(run['throughput'] for run in runs)
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        merged[key] = min(run[key] for run in runs)
+    merged['errors'] = max(run['errors'] for run in runs)
+    return merged
+
+
+async def run_load(send_request, requests, concurrency):
+    """
+    Issue requests from concurrent workers and measure them.
+
+    Args:
+        - send_request(coroutine function): called with the request index,
+                                            returns the status code.
+        - requests(int): total number of requests.
+        - concurrency(int): number of concurrent workers.
+
+    Returns(dict):
+        Summary of the run, see summarize().
+
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            start = time.perf_counter()
+            status = await send_request(index)
+            latencies.append(time.perf_counter() - start)
+            if not 200 <= status < 300:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f,
+                  indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def _slower(previous, current, threshold, floor):
+    return current > previous * (1 + threshold) and \
+        current - previous > floor
+
+
+def compare(results, baseline, threshold, floor=0.0):
+    """
+    Compare results against a baseline. A case regresses when it is slower
+    by more than both the relative threshold and the absolute floor.
+
+    Args:
+        - results(dict): case name -> summary.
+        - baseline(dict): saved baseline document.
+        - threshold(float): allowed relative regression, e.g. 0.25.
+        - floor(float): allowed absolute regression in ms of the time per
+            request derived from the throughput. Latencies queue behind
+            the other concurrent requests, so the p95 is allowed the floor
+            times the concurrency of the case.
+
+    Returns(list):
+        Human readable description of every regression found.
+
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline['results'].get(name)
+        if not previous:
+            continue
+        if previous['throughput'] and current['throughput'] and _slower(
+                1000 / previous['throughput'],
+                1000 / current['throughput'], threshold, floor):
+            regressions.append('{}: throughput {:.1f} -> {:.1f} req/s'.format(
+                name, previous['throughput'], current['throughput']))
+        if _slower(previous['p95_ms'], current['p95_ms'], threshold,
+                   floor * current.get('concurrency', 1)):
+            regressions.append('{}: p95 {:.2f} -> {:.2f} ms'.format(
+                name, previous['p95_ms'], current['p95_ms']))
+        if current['errors'] > previous['errors']:
+            regressions.append('{}: errors {} -> {}'.format(
+                name, previous['errors'], current['errors']))
+    return regressions
+
+
+def report(results):
+    print('{:<44} {:>10} {:>9} {:>9} {:>9} {:>7}'.format(
+        'case', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for name, result in sorted(results.items()):
+        print('{:<44} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>7}'.format(
+            name, result['throughput'], result['p50_ms'], result['p95_ms'],
+            result['p99_ms'], result['errors']))
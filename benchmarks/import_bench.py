@@ -0,0 +1,124 @@
+"""
+Measure the startup of fresh interpreters importing the application, as a
+worker or a test run does, and profile what the imports spend their time
+on with python -X importtime.
+
+    api       the application, as loaded by every worker
+    models    the request and response models, as loaded by tooling
+    helpers   the three service helpers, paid by the first requests
+
+Every import runs in a fresh interpreter in an empty directory, so a
+module writing files when imported is reported as an error.
+
+Usage:
+    python -m benchmarks.import_bench [--runs 10] [--top 15]
+                                      [--modules api,models,helpers]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import report, save_results, summarize
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = {
+    'api': 'import api',
+    'models': 'import models',
+    'helpers': 'import helpers.email_helper, helpers.meeting_helper, '
+               'helpers.storage_helper',
+}
+
+
+def _import(statement):
+    """
+    Run an import statement in a fresh interpreter.
+
+    Args:
+        - statement(str): import statement.
+
+    Returns(tupple):
+        (seconds, ok, importtime_output)
+
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='1')
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', statement], cwd=cwd,
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        elapsed = time.perf_counter() - start
+        ok = process.returncode == 0 and not os.listdir(cwd)
+    return elapsed, ok, process.stderr
+
+
+def _profile(output, top):
+    """
+    Parse python -X importtime output.
+
+    Args:
+        - output(str): stderr of the interpreter.
+        - top(int): number of modules returned.
+
+    Returns(list):
+        (self_ms, cumulative_ms, module) of the slowest modules by their
+        own import time.
+
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(own) / 1000, int(cumulative) / 1000,
+                        name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', default=','.join(MODULES),
+                        help='comma separated cases among {}'
+                        .format(', '.join(MODULES)))
+    parser.add_argument('--runs', type=int, default=10,
+                        help='fresh interpreters started per case')
+    parser.add_argument('--top', type=int, default=15,
+                        help='slowest modules profiled per case')
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    results = {}
+    profiles = {}
+    for name in args.modules.split(','):
+        # The first run fills the OS file cache, it is not measured.
+        _import(MODULES[name])
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            elapsed, ok, output = _import(MODULES[name])
+            latencies.append(elapsed)
+            errors += not ok
+        results['import[{}]'.format(name)] = summarize(
+            latencies, errors, time.perf_counter() - start)
+        profiles[name] = _profile(output, args.top)
+
+    report(results)
+    for name, modules in sorted(profiles.items()):
+        print('\n{:<44} {:>10} {:>9}'.format(
+            'slowest imports of ' + name, 'self ms', 'cum ms'))
+        for own, cumulative, module in modules:
+            print('{:<44} {:>10.2f} {:>9.2f}'.format(module, own,
+                                                     cumulative))
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
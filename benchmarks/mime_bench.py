@@ -0,0 +1,105 @@
+"""
+Measure how building emails with large attachements affects the latency of
+the other requests of the same worker, against the in-process fake Google
+backend:
+
+    inline    attachements encoded in the request threads
+    process   attachements encoded in the render processes
+
+Background workers keep sending emails with an attachement while plain
+emails are sent and measured.
+
+Usage:
+    python -m benchmarks.mime_bench [--size 8388608] [--senders 4]
+                                    [--requests 200] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+
+from consts.backend import Backend
+from consts.mail import Mail
+from helpers import fake_google
+from helpers.render_pool import render_pool
+from benchmarks.harness import AsgiClient, report, run_load, save_results
+
+
+EMAIL = 'bench@example.com'
+
+
+async def _case(client, attachement, args):
+    plain = {'recipient': EMAIL, 'sender': EMAIL, 'body': 'Benchmark',
+             'subject': 'Benchmark'}
+    large = dict(plain, attachement=attachement, extension='.bin')
+    done = False
+    sent = []
+
+    async def sender():
+        while not done:
+            status, _, _ = await client.request('POST', '/email/send_email',
+                                                large)
+            sent.append(status)
+
+    async def send_request(index):
+        status, _, _ = await client.request('POST', '/email/send_email',
+                                            plain)
+        return status
+
+    senders = [asyncio.ensure_future(sender()) for _ in range(args.senders)]
+    # Let the senders get going before measuring.
+    await asyncio.sleep(0.5)
+    result = await run_load(send_request, args.requests, args.concurrency)
+    done = True
+    await asyncio.gather(*senders)
+    result['attachements'] = len(sent)
+    return result
+
+
+async def run(app, args):
+    client = AsgiClient(app)
+    attachement = base64.b64encode(os.urandom(args.size)).decode()
+    results = {}
+    for name, threshold in (('inline', args.size + 1),
+                            ('process', args.size)):
+        Mail.MIME_PROCESS_THRESHOLD = threshold
+        fake_google.backend.reset()
+        if name == 'process':
+            # Start the processes before measuring.
+            render_pool.get().submit(int).result()
+        results['email.send[{},size={}]'.format(name, args.size)] = \
+            await _case(client, attachement, args)
+    render_pool.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=8 * 1024 * 1024,
+                        help='attachement size in bytes')
+    parser.add_argument('--senders', type=int, default=4,
+                        help='concurrent attachement senders')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='plain emails measured per case')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    Backend.MODE = Backend.FAKE
+    fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+    from api import app
+
+    results = asyncio.run(run(app, args))
+    report(results)
+    for name, result in sorted(results.items()):
+        print('{}: {} attachements sent'.format(name, result['attachements']))
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
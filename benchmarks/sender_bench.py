@@ -0,0 +1,69 @@
+"""
+Measure mail merge throughput over a growing sender pool, against the
+in-process fake Google backend. Every account is held to the per second
+Gmail quota, so throughput should grow linearly with the accounts.
+
+Usage:
+    python -m benchmarks.sender_bench [--accounts 1,2,4] [--messages 200]
+                                      [--rate 2500]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from consts.backend import Backend
+from helpers import email_helper, fake_google
+from helpers.sender_pool import SenderPool
+from utils.rate_limit import RateLimits
+from benchmarks.harness import AsgiClient, report, save_results, summarize
+
+
+async def _merge(client, messages):
+    body = {'sender': 'noreply@example.com', 'subject': 'Hello {name}',
+            'body': 'Dear {name}',
+            'recipients': [{'recipient': 'user-{}@example.com'.format(i),
+                            'variables': {'name': 'User {}'.format(i)}}
+                           for i in range(messages)]}
+    start = time.perf_counter()
+    status, _, _ = await client.request('POST', '/email/send_merge', body)
+    elapsed = time.perf_counter() - start
+    return summarize([elapsed] * messages, 0 if status == 200 else messages,
+                     elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', default='1,2,4',
+                        help='comma separated sender pool sizes')
+    parser.add_argument('--messages', type=int, default=200,
+                        help='recipients of every mail merge')
+    parser.add_argument('--rate', type=float, default=2500,
+                        help='Gmail quota units per second of every account')
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    Backend.MODE = Backend.FAKE
+    fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+    import api
+
+    results = {}
+    for count in [int(c) for c in args.accounts.split(',')]:
+        fake_google.backend.reset()
+        api.sender_pool = SenderPool(
+            ['sender-{}@example.com'.format(i) for i in range(count)],
+            daily_limit=args.messages)
+        # Start every account with an empty bucket, as under sustained load.
+        email_helper.send_quota = RateLimits('gmail_send', args.rate, 0)
+        results['email.send_merge[accounts={}]'.format(count)] = \
+            asyncio.run(_merge(AsgiClient(api.app), args.messages))
+    report(results)
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Measure the free slot search over large attendee sets: parsing the
+freebusy.query responses, merging the busy intervals of every attendee and
+expanding the first free slots within working hours, with:
+
+    python    datetime parsing, sort and a merge loop, one interval at a time
+    numpy     helpers.slots, the vectorized sweep used by the API
+
+Both must find the same slots.
+
+Usage:
+    python -m benchmarks.slots_bench [--attendees 100 500 1000]
+                                     [--weeks 4] [--busy 30] [--repeat 5]
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.harness import save_results
+from helpers import slots
+
+
+# Monday 2024-05-06 00:00:00 UTC.
+MONDAY = 1714953600
+HOUR = 3600
+
+
+def _responses(attendees, weeks, busy):
+    """
+    Build freebusy.query 'calendars' of random half hour aligned meetings.
+    """
+    rng = random.Random(attendees)
+    # Keep a few working half hours of every week free for everyone.
+    free = {week * 7 * 48 + day * 48 + half
+            for week in range(weeks)
+            for day, half in ((1, 20), (3, 29), (4, 33))}
+    calendars = {}
+    for i in range(attendees):
+        intervals = []
+        while len(intervals) < busy * weeks:
+            first = rng.randrange(weeks * 7 * 48)
+            halves = rng.choice((1, 2, 3, 4))
+            if free.intersection(range(first, first + halves)):
+                continue
+            start = MONDAY + first * 1800
+            end = start + halves * 1800
+            intervals.append({
+                'start': time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                       time.gmtime(start)),
+                'end': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(end))})
+        calendars['user-{}@example.com'.format(i)] = {'busy': intervals}
+    return calendars
+
+
+def _python(calendars, time_min, time_max, duration, count):
+    def _epoch(value):
+        return int(datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+                   .replace(tzinfo=timezone.utc).timestamp())
+
+    busy = [(_epoch(interval['start']), _epoch(interval['end']))
+            for calendar in calendars.values()
+            for interval in calendar['busy']]
+    day = time_min - time_min % slots.DAY
+    while day < time_max:
+        if (day // slots.DAY + 3) % 7 < 5:
+            busy.append((day, day + 9 * HOUR))
+            busy.append((day + 18 * HOUR, day + slots.DAY))
+        else:
+            busy.append((day, day + slots.DAY))
+        day += slots.DAY
+    busy.sort()
+    found = []
+    cursor = time_min
+    for start, end in busy + [(time_max, time_max)]:
+        while start - cursor >= duration and len(found) < count:
+            found.append(cursor)
+            cursor += duration
+        if len(found) == count:
+            break
+        cursor = max(cursor, end)
+    return found
+
+
+def _numpy(calendars, time_min, time_max, duration, count):
+    starts = slots.to_epoch([interval['start']
+                             for calendar in calendars.values()
+                             for interval in calendar['busy']])
+    ends = slots.to_epoch([interval['end']
+                           for calendar in calendars.values()
+                           for interval in calendar['busy']])
+    work = slots.working_hours(time_min, time_max, 9 * HOUR, 18 * HOUR, 0,
+                               [0, 1, 2, 3, 4])
+    found, _ = slots.free_slots(starts, ends, time_min, time_max, duration,
+                                count, work)
+    return [int(start) for start in found]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--attendees', type=int, nargs='+',
+                        default=[100, 500, 1000])
+    parser.add_argument('--weeks', type=int, default=4)
+    parser.add_argument('--busy', type=int, default=30,
+                        help='meetings per attendee and week')
+    parser.add_argument('--count', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    time_min = MONDAY
+    time_max = MONDAY + args.weeks * 7 * slots.DAY
+    results = {}
+    for attendees in args.attendees:
+        calendars = _responses(attendees, args.weeks, args.busy)
+        # Free half hours are rare with many attendees, look for those.
+        expected = _python(calendars, time_min, time_max, 1800, args.count)
+        assert len(expected) == args.count
+        assert _numpy(calendars, time_min, time_max, 1800,
+                      args.count) == expected
+        for name, search in (('python', _python), ('numpy', _numpy)):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                search(calendars, time_min, time_max, 1800, args.count)
+                timings.append(time.perf_counter() - start)
+            best = min(timings) * 1000
+            key = '{}[{}]'.format(name, attendees)
+            results[key] = {'ms': round(best, 2),
+                            'intervals': attendees * args.weeks * args.busy}
+            print('{:<16}{:>10.2f} ms{:>10} intervals'.format(
+                key, best, results[key]['intervals']))
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Measure the connection setup cost saved by the pooled transport.
+
+A local HTTPS stand-in (self-signed certificate, keep-alive) answers every
+request, and the same JSON call is sent through:
+
+    httplib2.new      a new httplib2.Http per request, i.e. a new TCP and
+                      TLS connection per call
+    httplib2.reused   one httplib2.Http reused from a single thread
+    pooled            helpers.transport.PooledHttp from a single thread
+    pooled.threads    one PooledHttp shared by --threads threads
+
+Usage:
+    python -m benchmarks.transport_bench [--requests 500] [--threads 8]
+"""
+import argparse
+import datetime
+import ipaddress
+import json
+import os
+import shutil
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from benchmarks.harness import report, save_results, summarize
+from helpers.transport import PooledHttp
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid delayed ACK stalls.
+    disable_nagle_algorithm = True
+    body = json.dumps({'files': [{'id': '1'}]}).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _certificate(directory):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+    now = datetime.datetime.utcnow()
+    certificate = x509.CertificateBuilder()\
+        .subject_name(name).issuer_name(name)\
+        .public_key(key.public_key())\
+        .serial_number(x509.random_serial_number())\
+        .not_valid_before(now - datetime.timedelta(days=1))\
+        .not_valid_after(now + datetime.timedelta(days=1))\
+        .add_extension(x509.SubjectAlternativeName(
+            [x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]),
+            critical=False)\
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None),
+                       critical=True)\
+        .sign(key, hashes.SHA256())
+    cert_path = os.path.join(directory, 'cert.pem')
+    key_path = os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+                                  serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def _measure(send, requests, threads=1):
+    latencies = []
+    errors = 0
+
+    def _one(_):
+        start = time.perf_counter()
+        resp, _ = send()
+        return time.perf_counter() - start, resp.status
+
+    start = time.perf_counter()
+    if threads == 1:
+        results = [_one(i) for i in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(_one, range(requests)))
+    elapsed = time.perf_counter() - start
+    for latency, status in results:
+        latencies.append(latency)
+        if status != 200:
+            errors += 1
+    return summarize(latencies, errors, elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--output', help='also write the results here')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    cert_path, key_path = _certificate(directory)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'https://127.0.0.1:{}/drive/v3/files'.format(
+        server.server_address[1])
+
+    try:
+        reused = httplib2.Http(ca_certs=cert_path)
+        pooled = PooledHttp(None, pool_size=args.threads)
+        # Ignore CA bundles from the environment, trust the local server.
+        pooled.session.trust_env = False
+        pooled.session.verify = cert_path
+        results = {
+            'httplib2.new': _measure(
+                lambda: httplib2.Http(ca_certs=cert_path).request(url),
+                args.requests),
+            'httplib2.reused': _measure(lambda: reused.request(url),
+                                        args.requests),
+            'pooled': _measure(lambda: pooled.request(url), args.requests),
+            'pooled.threads[{}]'.format(args.threads): _measure(
+                lambda: pooled.request(url), args.requests, args.threads),
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory)
+
+    report(results)
+    saved = results['httplib2.new']['p50_ms'] - results['pooled']['p50_ms']
+    print('Connection setup cost saved per request (p50): {:.2f} ms'
+          .format(saved))
+    if args.output:
+        save_results(args.output, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
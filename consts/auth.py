@@ -1,6 +1,52 @@
+import os
+import re
+import sys
+
+
 class Auth:
+    OAUTH = 'oauth'
+    SERVICE_ACCOUNT = 'service_account'
+    # 'oauth' uses the authorized user files below, 'service_account'
+    # impersonates the requested account through domain-wide delegation.
+    MODE = os.environ.get('GOOGLE_AUTH_MODE', OAUTH)
+    SERVICE_ACCOUNT_FILE = os.environ.get(
+        'GOOGLE_SERVICE_ACCOUNT_FILE', "utils/files/service_account.json")
+    # Account impersonated when a request does not select one.
+    DELEGATED_SUBJECT = os.environ.get('GOOGLE_DELEGATED_SUBJECT')
+    # Seconds before expiry at which a cached access token is renewed.
+    TOKEN_EXPIRY_MARGIN = int(os.environ.get('GOOGLE_TOKEN_EXPIRY_MARGIN',
+                                             '300'))
     CLIENT_SECRET_FILE = "utils/files/client_secret.json"
     CREDENTIALS_FILE = "utils/files/credentials.json"
+    # Credentials of additional accounts, stored as <account>.json
+    ACCOUNTS_DIR = os.environ.get('GOOGLE_ACCOUNTS_DIR',
+                                  "utils/files/accounts")
+    ACCOUNT_PATTERN = re.compile(r'^[A-Za-z0-9_+-][A-Za-z0-9._@+-]{0,254}$')
+    # Maximum number of built service handlers kept in memory.
+    POOL_SIZE = int(os.environ.get('GOOGLE_SERVICE_POOL_SIZE', '64'))
     SCOPES = ['https://www.googleapis.com/auth/gmail.send',
               'https://www.googleapis.com/auth/drive',
               'https://www.googleapis.com/auth/calendar']
+    # The browser based authorization flow can only run with a user at the
+    # terminal, a headless worker must fail instead of hanging on it.
+    INTERACTIVE = os.environ.get(
+        'GOOGLE_AUTH_INTERACTIVE',
+        '1' if sys.stdin is not None and sys.stdin.isatty() else '0') == '1'
+
+    @classmethod
+    def credentials_file(cls, account=None):
+        """
+        Get the credentials file of an account.
+
+        Args:
+            - account(str): account identifier, None for the default one.
+
+        Returns(str):
+            Relative path of the credentials file.
+
+        """
+        if not account:
+            return cls.CREDENTIALS_FILE
+        if not cls.ACCOUNT_PATTERN.match(account):
+            raise ValueError("Invalid account {}".format(account))
+        return os.path.join(cls.ACCOUNTS_DIR, "{}.json".format(account))
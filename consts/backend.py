@@ -0,0 +1,17 @@
+import os
+
+
+class Backend:
+    GOOGLE = 'google'
+    FAKE = 'fake'
+    # 'google' talks to the real Google APIs, 'fake' to the in-process fake
+    # in helpers/fake_google.py (no credentials or network needed).
+    MODE = os.environ.get('GOOGLE_BACKEND', GOOGLE)
+    # Seconds added to every fake call, plus up to FAKE_JITTER extra seconds.
+    FAKE_LATENCY = float(os.environ.get('FAKE_GOOGLE_LATENCY', '0'))
+    FAKE_JITTER = float(os.environ.get('FAKE_GOOGLE_JITTER', '0'))
+    # Ratio of fake calls that fail with a 503 backendError.
+    FAKE_ERROR_RATE = float(os.environ.get('FAKE_GOOGLE_ERROR_RATE', '0'))
+    FAKE_USER = os.environ.get('FAKE_GOOGLE_USER', 'fake.user@example.com')
+    # Instances the fake expands an endless recurring event into.
+    FAKE_MAX_INSTANCES = 730
@@ -0,0 +1,46 @@
+import os
+
+
+class Drive:
+    FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+    # Longest 'q' sent in a single files.list call. Lookups of many names
+    # are OR'ed together and split in chunks below this length.
+    MAX_QUERY_LENGTH = int(os.environ.get('DRIVE_MAX_QUERY_LENGTH', '4000'))
+    # Largest page files.list returns.
+    PAGE_SIZE = 1000
+    # Largest page permissions.list returns.
+    PERMISSION_PAGE_SIZE = 100
+    # Calls sent in a single batch request, at most 100 for Drive.
+    BATCH_SIZE = int(os.environ.get('DRIVE_BATCH_SIZE', '100'))
+    # Listings and batches of a tree operation run in parallel.
+    TREE_WORKERS = int(os.environ.get('DRIVE_TREE_WORKERS', '8'))
+    # Archives uploaded to /storage/upload_archive are kept in memory up to
+    # this size, and spooled to a temporary file above it.
+    ARCHIVE_SPOOL_SIZE = int(os.environ.get('DRIVE_ARCHIVE_SPOOL_SIZE',
+                                            str(32 * 1024 * 1024)))
+    # Largest archive accepted by /storage/upload_archive, and largest
+    # uncompressed size of one of its members and of all of them.
+    ARCHIVE_MAX_SIZE = int(os.environ.get('DRIVE_ARCHIVE_MAX_SIZE',
+                                          str(1024 * 1024 * 1024)))
+    ARCHIVE_MAX_MEMBER_SIZE = int(os.environ.get(
+        'DRIVE_ARCHIVE_MAX_MEMBER_SIZE', str(1024 * 1024 * 1024)))
+    ARCHIVE_MAX_TOTAL_SIZE = int(os.environ.get(
+        'DRIVE_ARCHIVE_MAX_TOTAL_SIZE', str(4 * 1024 * 1024 * 1024)))
+    # Files uploaded in parallel from an archive.
+    UPLOAD_WORKERS = int(os.environ.get('DRIVE_UPLOAD_WORKERS', '8'))
+    # Files larger than this are sent with a resumable upload.
+    RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+    # Chunk of a resumable upload, a multiple of 256 KiB.
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    # Base64 characters of a /storage/create_item content decoded at a
+    # time, a multiple of 4.
+    DECODE_CHUNK_SIZE = 4 * 256 * 1024
+    # Deduplication modes of uploads: skip files with the same name and
+    # content, or reuse any file with the same content in the folder.
+    DEDUP_NAME = 'name'
+    DEDUP_ANY = 'any'
+    DEDUP_MODES = (DEDUP_NAME, DEDUP_ANY)
+    # Folders whose checksums are kept in the local dedup index, and for
+    # how many seconds.
+    DEDUP_INDEX_SIZE = int(os.environ.get('DRIVE_DEDUP_INDEX_SIZE', '1024'))
+    DEDUP_INDEX_TTL = float(os.environ.get('DRIVE_DEDUP_INDEX_TTL', '300'))
@@ -0,0 +1,28 @@
+class Fields:
+    """
+    Partial response field masks of every upstream call, so Google only
+    serializes, and we only parse, the fields the helpers read.
+    """
+    # Calendar API
+    CALENDAR_INSERT = 'id'
+    CALENDAR_LIST = 'nextPageToken,items(id,summary)'
+    EVENT_INSERT = 'id'
+    EVENT_LOOKUP = 'nextPageToken,items(id,summary)'
+    EVENT_SEARCH = 'nextPageToken,items(id,status,summary,description,'\
+        'location,start,end,attendees(email))'
+    EVENT_SYNC = 'nextPageToken,nextSyncToken,items(id,status,summary,'\
+        'description,location,start,end,attendees(email))'
+    FREEBUSY = 'calendars'
+    # Drive API
+    DEDUP_CHECK = 'trashed,md5Checksum,parents'
+    DEDUP_LIST = 'nextPageToken,files(id,name,md5Checksum)'
+    FILE_CREATE = 'id'
+    FILE_EXISTS = 'id,trashed'
+    FILE_LOOKUP = 'files(id)'
+    FILE_RESOLVE = 'nextPageToken,files(id,name,parents)'
+    PERMISSION_CREATE = 'id'
+    PERMISSION_LIST = 'nextPageToken,permissions(id,emailAddress)'
+    TREE_LIST = 'nextPageToken,files(id,name,mimeType,parents)'
+    TREE_ROOT = 'name,parents'
+    # Gmail API
+    MESSAGE_SEND = 'id'
@@ -0,0 +1,14 @@
+import os
+import uuid
+
+
+class Idempotency:
+    HEADER = 'idempotency-key'
+    MAX_KEY_LENGTH = 255
+    # Completed responses kept for replay, and the seconds they are kept.
+    MAX_SIZE = int(os.environ.get('IDEMPOTENCY_MAX_SIZE', '10000'))
+    TTL = float(os.environ.get('IDEMPOTENCY_TTL', str(24 * 60 * 60)))
+    # Larger responses are not kept, their retries run again.
+    MAX_BODY = int(os.environ.get('IDEMPOTENCY_MAX_BODY', str(1024 * 1024)))
+    # Namespace of the Google request IDs derived from idempotency keys.
+    NAMESPACE = uuid.UUID('6c1a4a51-3f9e-4e0b-9d0e-5b2f3f0c8e21')
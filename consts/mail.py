@@ -0,0 +1,58 @@
+import os
+
+
+class Mail:
+    API = 'api'
+    SMTP = 'smtp'
+    # 'api' sends through the Gmail messages.send endpoint, 'smtp' over the
+    # pooled SMTP connections of helpers/smtp_pool.py.
+    DELIVERY = os.environ.get('MAIL_DELIVERY', API)
+    # Messages sent in a single batch request, Gmail recommends at most 50.
+    BATCH_SIZE = int(os.environ.get('GMAIL_BATCH_SIZE', '50'))
+    # Gmail quota units granted per user and second, and the units a
+    # messages.send call costs.
+    QUOTA_RATE = float(os.environ.get('GMAIL_QUOTA_RATE', '250'))
+    SEND_UNITS = 100
+    # Accounts outbound mail is spread over, comma separated, and the
+    # messages each of them sends in a rolling DAILY_WINDOW of seconds.
+    # Without accounts mail is sent from the account of the request.
+    SENDER_ACCOUNTS = [account.strip() for account in os.environ.get(
+        'GMAIL_SENDER_ACCOUNTS', '').split(',') if account.strip()]
+    DAILY_LIMIT = int(os.environ.get('GMAIL_DAILY_LIMIT', '2000'))
+    DAILY_WINDOW = 24 * 60 * 60
+    # Sends failing with a rate limit or backend error are retried this many
+    # times, waiting RETRY_DELAY seconds, doubled on every attempt.
+    SEND_RETRIES = int(os.environ.get('GMAIL_SEND_RETRIES', '3'))
+    RETRY_DELAY = float(os.environ.get('GMAIL_RETRY_DELAY', '1'))
+    RETRY_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded',
+                     'backendError', '429', '500', '503')
+    # Mail merges of at least this many recipients are rendered in the
+    # process pool, in chunks of RENDER_CHUNK messages.
+    RENDER_PROCESS_THRESHOLD = int(os.environ.get(
+        'MAIL_RENDER_PROCESS_THRESHOLD', '200'))
+    RENDER_CHUNK = 100
+    MAX_RECIPIENTS = int(os.environ.get('MAIL_MAX_RECIPIENTS', '10000'))
+    # Emails with attachements of at least this many bytes are built and
+    # encoded in the process pool, smaller ones are not worth the round trip.
+    MIME_PROCESS_THRESHOLD = int(os.environ.get(
+        'MAIL_MIME_PROCESS_THRESHOLD', str(1024 * 1024)))
+    # Processes rendering and encoding messages.
+    RENDER_WORKERS = int(os.environ.get('MAIL_RENDER_WORKERS',
+                                        str(os.cpu_count() or 1)))
+    # SMTP relay used by the 'smtp' delivery. 'xoauth2' authenticates with
+    # the OAuth token of the sending account, which needs the
+    # https://mail.google.com/ scope for smtp.gmail.com, 'login' with
+    # SMTP_USER and SMTP_PASSWORD and 'none' not at all.
+    XOAUTH2 = 'xoauth2'
+    LOGIN = 'login'
+    SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
+    SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+    SMTP_AUTH = os.environ.get('SMTP_AUTH', XOAUTH2)
+    # Login of the default account, the others log in as themselves.
+    SMTP_USER = os.environ.get('SMTP_USER')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    # Connections open at most, and seconds an idle one is kept open.
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '8'))
+    SMTP_IDLE_TIMEOUT = float(os.environ.get('SMTP_IDLE_TIMEOUT', '60'))
+    SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', '30'))
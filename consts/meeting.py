@@ -0,0 +1,28 @@
+import os
+
+
+class Meeting:
+    # Calendars and attendees sent in a single freebusy.query, at most 50.
+    FREEBUSY_ITEMS = int(os.environ.get('CALENDAR_FREEBUSY_ITEMS', '50'))
+    # Longest window of a single freebusy.query, longer searches are split.
+    FREEBUSY_MAX_DAYS = int(os.environ.get('CALENDAR_FREEBUSY_MAX_DAYS',
+                                           '60'))
+    # Calls sent in a single batch request, at most 50 for Calendar.
+    BATCH_SIZE = int(os.environ.get('CALENDAR_BATCH_SIZE', '50'))
+    # Defaults of the slot search: working hours, as 'HH:MM' in the
+    # requested UTC offset, and working days, Monday being 0.
+    WORK_START = '09:00'
+    WORK_END = '18:00'
+    WORK_DAYS = [0, 1, 2, 3, 4]
+    SLOT_COUNT = 5
+    # Who is notified of the events created in bulk.
+    SEND_UPDATES = ('all', 'externalOnly', 'none')
+    # Calendars whose events are kept in the local event index, and the
+    # seconds an index is trusted before it is synced again.
+    EVENT_INDEX_SIZE = int(os.environ.get('CALENDAR_EVENT_INDEX_SIZE',
+                                          '256'))
+    EVENT_SYNC_INTERVAL = float(os.environ.get('CALENDAR_EVENT_SYNC_INTERVAL',
+                                               '30'))
+    # Largest page events.list returns.
+    EVENT_PAGE_SIZE = 2500
+    SEARCH_LIMIT = 100
@@ -0,0 +1,16 @@
+import os
+
+
+class Tracing:
+    SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'assistant-google-api')
+    # Ratio of root traces that are recorded: 0 disables tracing, 1 records
+    # every request. Incoming sampled traceparent headers are always honored.
+    SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+    # 'json' appends one span per line to JSON_FILE, 'collector' posts OTLP
+    # JSON batches to COLLECTOR_URL.
+    EXPORTER = os.environ.get('TRACE_EXPORTER', 'json')
+    JSON_FILE = os.environ.get('TRACE_JSON_FILE', 'traces.json')
+    COLLECTOR_URL = os.environ.get('TRACE_COLLECTOR_URL',
+                                   'http://localhost:4318/v1/traces')
+    BATCH_SIZE = 128
+    FLUSH_INTERVAL = 5
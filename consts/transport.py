@@ -0,0 +1,18 @@
+import os
+
+
+class Transport:
+    # Use the pooled, thread-safe transport of helpers/transport.py instead
+    # of the default httplib2 one.
+    POOLED = os.environ.get('GOOGLE_HTTP_POOLED', '1') == '1'
+    # Keep-alive connections kept per host and handler.
+    POOL_SIZE = int(os.environ.get('GOOGLE_HTTP_POOL_SIZE', '10'))
+    CONNECT_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_CONNECT_TIMEOUT',
+                                           '10'))
+    READ_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_READ_TIMEOUT', '60'))
+    # Seconds a request waits for a pooled connection once all of them are
+    # busy, before failing with a retryable PoolTimeout.
+    POOL_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_POOL_TIMEOUT', '30'))
+    # Retries of a failed Google API call, by googleapiclient: dropped
+    # connections, pool timeouts, 5xx and rate limit responses.
+    RETRIES = int(os.environ.get('GOOGLE_HTTP_RETRIES', '3'))
@@ -0,0 +1,18 @@
+import os
+
+
+class Warmup:
+    # Warm the worker up at startup, /ready answers 503 until it is done.
+    ENABLED = os.environ.get('WARMUP_ENABLED', '1') == '1'
+    # Accounts whose credentials and service handlers are built at startup,
+    # '' being the default account. The sender pool accounts are added.
+    ACCOUNTS = [account.strip() for account in os.environ.get(
+        'WARMUP_ACCOUNTS', '').split(',')]
+    # Calendar IDs whose event index is synced, and folder names whose
+    # dedup index is loaded, for every account above.
+    CALENDARS = [calendar.strip() for calendar in os.environ.get(
+        'WARMUP_CALENDARS', '').split(',') if calendar.strip()]
+    FOLDERS = [folder.strip() for folder in os.environ.get(
+        'WARMUP_FOLDERS', '').split(',') if folder.strip()]
+    # Accounts warmed up in parallel.
+    WORKERS = int(os.environ.get('WARMUP_WORKERS', '8'))
@@ -0,0 +1,154 @@
+import functools
+import io
+import tarfile
+import tempfile
+import zipfile
+
+from fastapi.concurrency import run_in_threadpool
+
+
+ZIP = 'zip'
+TAR = 'tar'
+
+
+class ArchiveTooLarge(ValueError):
+    """
+    An archive, or the content of its members, is over the size limits.
+    """
+
+
+async def spool(chunks, max_size, limit=None):
+    """
+    Write an async stream of chunks, such as a request body, to a file kept
+    in memory until it grows past max_size, then moved to a temporary file
+    on disk. Disk writes run in the threadpool, off the event loop.
+
+    Args:
+        - chunks(async iterable): bytes chunks.
+        - max_size(int): largest size kept in memory.
+        - limit(int): largest size accepted, ArchiveTooLarge is raised
+            past it. None for no limit.
+
+    Returns(file):
+        Seekable binary file, at position 0.
+
+    """
+    f = io.BytesIO()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise ArchiveTooLarge(
+                    "Archive is over the {} bytes limit".format(limit))
+            if isinstance(f, io.BytesIO) and size <= max_size:
+                f.write(chunk)
+            else:
+                f = await run_in_threadpool(_write, f, chunk)
+    except BaseException:
+        f.close()
+        raise
+    f.seek(0)
+    return f
+
+
+def _write(f, chunk):
+    if isinstance(f, io.BytesIO):
+        rolled = tempfile.TemporaryFile()
+        rolled.write(f.getbuffer())
+        f = rolled
+    f.write(chunk)
+    return f
+
+
+def detect(f):
+    """
+    Detect the format of an archive.
+
+    Args:
+        - f(file): seekable binary file.
+
+    Returns(str):
+        ZIP, TAR (plain or gzip, bz2 and xz compressed) or None.
+
+    """
+    f.seek(0)
+    try:
+        if zipfile.is_zipfile(f):
+            return ZIP
+        f.seek(0)
+        try:
+            with tarfile.open(fileobj=f, mode='r:*'):
+                return TAR
+        except tarfile.TarError:
+            return None
+    finally:
+        f.seek(0)
+
+
+def members(f, max_member_size=None, max_total_size=None):
+    """
+    Iterate the members of an archive in archive order, without extracting
+    them. Tar archives are read as a stream, so a member must be read
+    before moving to the next one.
+
+    The uncompressed sizes are checked before any content is read: those
+    of a zip archive all up front, those of a tar archive as the stream
+    reaches them. ArchiveTooLarge is raised past a limit.
+
+    Args:
+        - f(file): seekable binary file holding a zip or tar archive.
+        - max_member_size(int): largest uncompressed size of a member.
+        - max_total_size(int): largest uncompressed size of all members.
+
+    Returns(generator):
+        (path, is_dir, open) of every member, open() returns a binary file
+        streaming its content. Paths are relative, with '/' separators and
+        no '..' component.
+
+    """
+    kind = detect(f)
+    if kind == ZIP:
+        archive = zipfile.ZipFile(f)
+        entries = list(_checked(
+            ((info.filename, info.is_dir(), info.file_size,
+              functools.partial(archive.open, info))
+             for info in archive.infolist()),
+            max_member_size, max_total_size))
+    elif kind == TAR:
+        archive = tarfile.open(fileobj=f, mode='r|*')
+        entries = _checked(
+            ((member.name, member.isdir(), member.size,
+              functools.partial(archive.extractfile, member))
+             for member in archive if member.isdir() or member.isfile()),
+            max_member_size, max_total_size)
+    else:
+        raise ValueError("Unsupported archive, expected a zip or tar file")
+
+    with archive:
+        for name, is_dir, open_member in entries:
+            path = _safe_path(name)
+            if path:
+                yield path, is_dir, open_member
+
+
+def _checked(entries, max_member_size, max_total_size):
+    total = 0
+    for name, is_dir, size, open_member in entries:
+        if max_member_size is not None and size > max_member_size:
+            raise ArchiveTooLarge("Member {} is over the {} bytes limit"
+                                  .format(name, max_member_size))
+        total += size
+        if max_total_size is not None and total > max_total_size:
+            raise ArchiveTooLarge(
+                "Archive content is over the {} bytes limit"
+                .format(max_total_size))
+        yield name, is_dir, open_member
+
+
+def _safe_path(name):
+    parts = [part for part in name.replace('\\', '/').split('/')
+             if part not in ('', '.')]
+    if '..' in parts:
+        return None
+    return '/'.join(parts)
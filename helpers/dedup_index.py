@@ -0,0 +1,91 @@
+import threading
+
+from consts.drive import Drive
+from utils.cache import LRUCache
+
+
+class DedupIndex:
+    """
+    Local index of the MD5 checksums of the files in Drive folders, so a
+    deduplicated upload does not list its folder every time. Entries are
+    hints: a hit must still be checked against Drive before it is used.
+    """
+
+    def __init__(self, max_size=Drive.DEDUP_INDEX_SIZE,
+                 ttl=Drive.DEDUP_INDEX_TTL):
+        """
+        Args:
+            - max_size(int): maximum number of folders indexed.
+            - ttl(float): seconds a folder listing is trusted.
+
+        """
+        self._folders = LRUCache('dedup_index', max_size, ttl)
+        self._lock = threading.Lock()
+
+    def load(self, folder, files):
+        """
+        Index the complete listing of a folder.
+
+        Args:
+            - folder(tuple): (account, folder_id).
+            - files(list): files of the folder, with id, name and
+                md5Checksum.
+
+        """
+        checksums = {}
+        for file in files:
+            if file.get('md5Checksum'):
+                checksums.setdefault(file['md5Checksum'], {})[file['name']] =\
+                    file['id']
+        self._folders.set(folder, {'complete': True, 'checksums': checksums})
+
+    def add(self, folder, md5, name, file_id):
+        """
+        Index a single file of a folder.
+
+        Args:
+            - folder(tuple): (account, folder_id).
+            - md5(str): MD5 checksum of the file content.
+            - name(str): file name.
+            - file_id(str): file ID.
+
+        """
+        with self._lock:
+            entry = self._folders.get(folder) or {'complete': False,
+                                                  'checksums': {}}
+            entry['checksums'].setdefault(md5, {})[name] = file_id
+            self._folders.set(folder, entry)
+
+    def discard(self, folder, md5, name):
+        with self._lock:
+            entry = self._folders.get(folder)
+            if entry:
+                entry['checksums'].get(md5, {}).pop(name, None)
+
+    def lookup(self, folder, md5):
+        """
+        Look up the files of a folder with the given content.
+
+        Args:
+            - folder(tuple): (account, folder_id).
+            - md5(str): MD5 checksum of the content.
+
+        Returns(tupple):
+            (complete, {name: file_id}). complete tells whether the whole
+            folder is indexed, so a miss means there is no such file.
+
+        """
+        with self._lock:
+            entry = self._folders.get(folder)
+            if not entry:
+                return False, {}
+            return entry['complete'], dict(entry['checksums'].get(md5, {}))
+
+    def forget(self, folder):
+        self._folders.pop(folder)
+
+    def clear(self):
+        self._folders.clear()
+
+
+dedup_index = DedupIndex()
@@ -0,0 +1,93 @@
+from consts.drive import Drive
+
+
+def quote(value):
+    """
+    Quote a string literal of a Drive query, escaping quotes and
+    backslashes.
+
+    Args:
+        - value(str): literal to quote.
+
+    Returns(str):
+        "'value'"
+
+    """
+    return "'{}'".format(str(value).replace('\\', '\\\\')
+                         .replace("'", "\\'"))
+
+
+def clause(name=None, parent_id=None, folder=None, trashed=False):
+    """
+    Build the 'q' clause matching a file.
+
+    Args:
+        - name(str): exact name of the file, None matches any name.
+        - parent_id(str): ID of the parent folder, None matches any parent.
+        - folder(bool): True matches only folders, False only non folders
+            and None both.
+        - trashed(bool): trashed state to match, None matches both.
+
+    Returns(str):
+    """
+    terms = []
+    if name is not None:
+        terms.append("name = {}".format(quote(name)))
+    if folder is not None:
+        terms.append("mimeType {} {}".format('=' if folder else '!=',
+                                             quote(Drive.FOLDER_MIME_TYPE)))
+    if parent_id:
+        terms.append("{} in parents".format(quote(parent_id)))
+    if trashed is not None:
+        terms.append("trashed = {}".format('true' if trashed else 'false'))
+    return ' and '.join(terms)
+
+
+def any_of(clauses):
+    """
+    OR the given clauses together.
+
+    Args:
+        - clauses(list): 'q' clauses.
+
+    Returns(str):
+    """
+    if len(clauses) == 1:
+        return clauses[0]
+    return ' or '.join('({})'.format(c) for c in clauses)
+
+
+def chunks(clauses, suffix='', max_length=Drive.MAX_QUERY_LENGTH):
+    """
+    OR the given clauses together in as few queries as possible, none of
+    them longer than max_length.
+
+    Args:
+        - clauses(list): 'q' clauses.
+        - suffix(str): clause AND'ed to every query, e.g. 'trashed = false'.
+        - max_length(int): longest query to build.
+
+    Returns(generator):
+        'q' strings.
+
+    """
+    # Room taken by the parentheses and the suffix.
+    overhead = len(' and ()') + len(suffix) if suffix else 0
+    chunk = []
+    length = overhead
+    for c in clauses:
+        added = len(c) + len('() or ')
+        if chunk and length + added > max_length:
+            yield _join(chunk, suffix)
+            chunk, length = [], overhead
+        chunk.append(c)
+        length += added
+    if chunk:
+        yield _join(chunk, suffix)
+
+
+def _join(chunk, suffix):
+    query = any_of(chunk)
+    if not suffix:
+        return query
+    return '({}) and {}'.format(query, suffix)
@@ -1,16 +1,47 @@
-import mimetypes
 import os
-from base64 import urlsafe_b64encode
+import smtplib
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
 
-from email import encoders
-from email.mime.audio import MIMEAudio
-from email.mime.image import MIMEImage
-from email.mime.multipart import MIMEMultipart, MIMEBase
 from email.mime.text import MIMEText
+from email.utils import getaddresses, make_msgid, parseaddr
 from googleapiclient import errors
 
-from helpers.service_helper import GoogleServiceHandler, get_auth
+from consts.fields import Fields
+from consts.mail import Mail
+from helpers import mail_merge, mime_builder
+from helpers.render_pool import render_pool
+from helpers.service_helper import GoogleServiceHandler, _error_reason, \
+    get_auth
+from helpers.smtp_pool import smtp_pool
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.rate_limit import RateLimits
+
+
+# Gmail send quota of every account.
+send_quota = RateLimits('gmail_send', Mail.QUOTA_RATE)
+
+
+def _retryable(error):
+    """
+    Check whether a failed send may succeed later: a Gmail rate limit or
+    backend error, a temporary (4xx) SMTP reply or a dropped connection.
+
+    Args:
+        - error(Exception): error of the send.
+
+    Returns(bool):
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500
+                   for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError)):
+        return True
+    return _error_reason(error) in Mail.RETRY_REASONS
 
 
 class EmailHandler(GoogleServiceHandler):
@@ -20,16 +51,19 @@ class EmailHandler(GoogleServiceHandler):
 
     credentials = service = None
 
-    def __init__(self, credential_file_path):
+    def __init__(self, credential_file_path, account=None):
         """
         Instanciate the Email Handler using the provided credential file.
 
         Args:
             - credential_file_path(str): relative path of the credential file.
+            - account(str): account impersonated in service account mode.
 
         Returns(None)
 
         """
+        self.credential_file_path = credential_file_path
+        self.account = account
         self.credentials, self.service =\
             super().__init__("gmail", "v1", credential_file_path)
 
@@ -52,8 +86,7 @@ class EmailHandler(GoogleServiceHandler):
 
         """
         logger.log_info("Building a new message:\nFrom: {}\nTo: {}\n"
-                        "Body: {}\nSubject: {}"
-                        "\n".format(sender, recipient, body, subject))
+                        "Subject: {}\n".format(sender, recipient, subject))
 
         message = MIMEText(body)
         message['to'] = recipient
@@ -61,21 +94,16 @@ class EmailHandler(GoogleServiceHandler):
         message['subject'] = subject
 
         logger.log_info("Sending message")
-        message = {'raw': urlsafe_b64encode(message.as_bytes()).decode()}
-        try:
-            message = self.service.users().messages().send(
-                userId='me',
-                body=message).execute()
-            return True, None
-        except errors.HttpError as e:
-            logger.log_error("Error sending message: {}".format(e))
-            return False, str(e)
+        return self._send_message(
+            sender, recipient, urlsafe_b64encode(message.as_bytes()).decode())
 
     @get_auth
     def send_email_attachement(self, recipient, sender, body, subject,
                                attachement):
         """
-        Build and send an email with attachement.
+        Build and send an email with attachement. Attachements of
+        Mail.MIME_PROCESS_THRESHOLD bytes or more are encoded in the render
+        processes.
 
         Args:
             - recepient(str): Recipient's email address.
@@ -94,50 +122,198 @@ class EmailHandler(GoogleServiceHandler):
             return False, "The attachement file does not exist"
 
         logger.log_info("Building a new message:\nFrom: {}\nTo: {}\n"
-                        "Body: {}\nSubject: {}\nFile:{}"
-                        .format(sender, recipient, body, subject, attachement))
-        message = MIMEMultipart()
-        message['to'] = recipient
-        message['from'] = sender
-        message['subject'] = subject
-
-        msg = MIMEText(body)
-        message.attach(msg)
-
-        content_type, encoding = mimetypes.guess_type(attachement)
-        if not content_type or not encoding:
-            content_type = 'application/octet-stream'
-        main_type, sub_type = content_type.split('/', 1)
-
-        if main_type == 'text':
-            fp = open(attachement, 'rb')
-            msg = MIMEText(fp.read(), _subtype=sub_type)
-            fp.close()
-        elif main_type == 'image':
-            fp = open(attachement, 'rb')
-            msg = MIMEImage(fp.read(), _subtype=sub_type)
-            fp.close()
-        elif main_type == 'audio':
-            fp = open(attachement, 'rb')
-            msg = MIMEAudio(fp.read(), _subtype=sub_type)
-            fp.close()
+                        "Subject: {}\nFile:{}"
+                        .format(sender, recipient, subject, attachement))
+        build = partial(mime_builder.build_attachement, recipient, sender,
+                        body, subject, attachement)
+        if os.path.getsize(attachement) >= Mail.MIME_PROCESS_THRESHOLD:
+            raw = render_pool.run(build)
         else:
-            fp = open(attachement, 'rb')
-            msg = MIMEBase(main_type, sub_type)
-            msg.set_payload(fp.read())
-            encoders.encode_base64(msg)
-            fp.close()
-        filename = os.path.basename(attachement)
-        msg.add_header('Content-Disposition', 'attachement', filename=filename)
-        message.attach(msg)
+            raw = build()
 
         logger.log_info("Sending message")
-        message = {'raw': urlsafe_b64encode(message.as_bytes()).decode()}
+        return self._send_message(sender, recipient, raw)
+
+    def _send_message(self, sender, recipient, raw):
+        """
+        Send an encoded message with the delivery of the deployment, see
+        Mail.DELIVERY. Sends through the Gmail API wait for the per second
+        send quota of the account, as the mail merge batches do.
+
+        Args:
+            - sender(str): Sender's email address.
+            - recipient(str): Recipient's email address.
+            - raw(str): base64url encoded RFC822 message.
+
+        Returns(Tupple):
+            (True, None) or (False, err_msg)
+
+        """
+        if Mail.DELIVERY == Mail.SMTP:
+            [(_, exception)] = self._send_smtp([(sender, recipient, raw)])
+            if exception is None:
+                return True, None
+            logger.log_error("Error sending message: {}".format(exception))
+            return False, str(exception)
+        send_quota.get(self.account).acquire(Mail.SEND_UNITS)
         try:
-            message = self.service.users().messages().send(
+            self._execute(self.service.users().messages().send(
                 userId='me',
-                body=message).execute()
+                body={'raw': raw}))
             return True, None
         except errors.HttpError as e:
             logger.log_error("Error sending message: {}".format(e))
             return False, str(e)
+
+    def _send_smtp(self, messages):
+        """
+        Send encoded messages over a pooled SMTP connection of the account,
+        each with a new Message-ID.
+
+        Args:
+            - messages(list): (sender, recipient, raw) of every message.
+
+        Returns(list):
+            (response, exception) of every message, in the same order and
+            as _execute_batch returns them, the response holding the
+            Message-ID as 'id'.
+
+        """
+        user = self.account or Mail.SMTP_USER
+        if user is None and Mail.SMTP_AUTH in (Mail.XOAUTH2, Mail.LOGIN):
+            error = ValueError("No SMTP login for the default account, "
+                               "set SMTP_USER")
+            return [(None, error)] * len(messages)
+        secret = self.credentials.token if Mail.SMTP_AUTH == Mail.XOAUTH2 \
+            else Mail.SMTP_PASSWORD
+
+        message_ids = []
+        envelopes = []
+        for sender, recipient, raw in messages:
+            address = parseaddr(sender)[1]
+            message_id = make_msgid(
+                domain=address.rpartition('@')[2] or 'localhost')
+            message_ids.append(message_id)
+            envelopes.append((
+                address,
+                [to for _, to in getaddresses([recipient])],
+                b'Message-ID: ' + message_id.encode() + b'\r\n' +
+                urlsafe_b64decode(raw.encode())))
+
+        outcomes = []
+        for message_id, exception in zip(
+                message_ids, smtp_pool.send(user, secret, envelopes)):
+            metrics.smtp_messages.inc(
+                status='ok' if exception is None else 'error')
+            outcomes.append(({'id': message_id}, None) if exception is None
+                            else (None, exception))
+        return outcomes
+
+    @get_auth
+    def send_merge(self, sender, subject, body, recipients, subtype='plain'):
+        """
+        Send a personalised copy of a message to every recipient.
+        Messages are rendered in the render processes for large merges, and
+        sent in rate limited batch requests as they are rendered.
+
+        Args:
+            - sender(str): Sender's email address.
+            - subject(mail_merge.Template): Subject template.
+            - body(mail_merge.Template): Body template.
+            - recipients(list): (recipient, variables) of every message.
+            - subtype(str): 'plain' or 'html' body.
+
+        Returns(tupple):
+            (True, {'sent':, 'failed':, 'invalid':, 'results': [{
+                'recipient':, 'status':, 'message_id' or 'error':}]})
+
+        """
+        logger.log_info("Sending a mail merge from {} to {} recipients"
+                        .format(sender, len(recipients)))
+        size = Mail.RENDER_CHUNK
+        chunks = [recipients[i:i + size]
+                  for i in range(0, len(recipients), size)]
+        render = partial(mail_merge.render, sender, subject, body,
+                         subtype=subtype)
+        if len(recipients) >= Mail.RENDER_PROCESS_THRESHOLD:
+            rendered = render_pool.map(render, chunks)
+        else:
+            rendered = map(render, chunks)
+        # A batch must not spend more than the per second quota, or Gmail
+        # rejects the excess.
+        batch_size = Mail.BATCH_SIZE if Mail.DELIVERY == Mail.SMTP else \
+            max(1, min(Mail.BATCH_SIZE, int(
+                send_quota.get(self.account).capacity // Mail.SEND_UNITS)))
+
+        results = [None] * len(recipients)
+        pending = []
+        index = 0
+        for chunk in rendered:
+            for raw, err in chunk:
+                if raw is None:
+                    results[index] = {'recipient': recipients[index][0],
+                                      'status': 'invalid', 'error': err}
+                else:
+                    pending.append((index, raw))
+                index += 1
+            while len(pending) >= batch_size:
+                self._send_raw(sender, recipients, pending[:batch_size],
+                               results)
+                pending = pending[batch_size:]
+        if pending:
+            self._send_raw(sender, recipients, pending, results)
+
+        report = {'sent': 0, 'failed': 0, 'invalid': 0, 'results': results}
+        for result in results:
+            report[result['status']] += 1
+            metrics.merge_messages.inc(status=result['status'])
+        logger.log_info("Mail merge done: {} sent, {} failed, {} invalid"
+                        .format(report['sent'], report['failed'],
+                                report['invalid']))
+        return True, report
+
+    def _send_raw(self, sender, recipients, messages, results):
+        """
+        Send encoded messages in a single batch request, or SMTP connection,
+        retrying the ones failing with a rate limit or temporary error.
+
+        Args:
+            - sender(str): Sender's email address.
+            - recipients(list): (recipient, variables) of every message.
+            - messages(list): (index, raw) of the messages to send.
+            - results(list): result of every message, updated in place.
+
+        """
+        bucket = send_quota.get(self.account)
+        for attempt in range(Mail.SEND_RETRIES + 1):
+            if Mail.DELIVERY == Mail.SMTP:
+                outcomes = self._send_smtp([
+                    (sender, recipients[index][0], raw)
+                    for index, raw in messages])
+            else:
+                bucket.acquire(len(messages) * Mail.SEND_UNITS)
+                outcomes = self._execute_batch([
+                    self.service.users().messages().send(
+                        userId='me', body={'raw': raw},
+                        fields=Fields.MESSAGE_SEND)
+                    for _, raw in messages])
+            retry = []
+            for (index, raw), (response, exception) in \
+                    zip(messages, outcomes):
+                recipient = recipients[index][0]
+                if exception is None:
+                    results[index] = {'recipient': recipient,
+                                      'status': 'sent',
+                                      'message_id': response['id']}
+                elif _retryable(exception) and attempt < Mail.SEND_RETRIES:
+                    retry.append((index, raw))
+                else:
+                    results[index] = {'recipient': recipient,
+                                      'status': 'failed',
+                                      'error': str(exception)}
+            if not retry:
+                return
+            logger.log_info("Retrying {} rate limited messages"
+                            .format(len(retry)))
+            time.sleep(Mail.RETRY_DELAY * 2 ** attempt)
+            messages = retry
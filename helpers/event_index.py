@@ -0,0 +1,229 @@
+import threading
+import time
+
+import numpy as np
+
+from consts.meeting import Meeting
+from helpers import slots
+from utils.cache import LRUCache
+
+
+def _timestamp(when):
+    """
+    Timestamp of an event start or end, all-day events start at midnight
+    UTC.
+    """
+    if 'dateTime' in when:
+        return slots.parse_time(when['dateTime'])
+    return slots.parse_time(when['date'] + 'T00:00:00Z')
+
+
+def entry(event):
+    """
+    Build the search result of an event.
+
+    Args:
+        - event(dict): event resource, as listed by events.list.
+
+    Returns(dict):
+    """
+    return {
+        'event_id': event['id'],
+        'summary': event.get('summary', ''),
+        'start': event['start'].get('dateTime') or event['start']['date'],
+        'end': event['end'].get('dateTime') or event['end']['date'],
+        'location': event.get('location', ''),
+        'attendees': [attendee['email']
+                      for attendee in event.get('attendees', [])
+                      if 'email' in attendee],
+    }
+
+
+class CalendarIndex:
+    """
+    Interval index of the events of a calendar.
+
+    Events are kept sorted by start in NumPy arrays, so a time window is
+    two binary searches: events overlapping [time_min, time_max) start
+    before time_max and no earlier than time_min minus the longest event.
+    Attendees map to the sorted positions of their events. The arrays are
+    rebuilt on the first search after a change.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sync_token = None
+        self.synced_at = None
+        self._events = {}
+        self._arrays = None
+
+    @property
+    def ready(self):
+        return self.sync_token is not None
+
+    def stale(self, max_age=Meeting.EVENT_SYNC_INTERVAL):
+        return self.synced_at is None or \
+            time.monotonic() - self.synced_at > max_age
+
+    def apply(self, events, sync_token, full=False):
+        """
+        Apply a full or incremental listing of the calendar.
+
+        Args:
+            - events(list): event resources, cancelled ones are removed.
+            - sync_token(str): nextSyncToken of the listing.
+            - full(bool): True drops every event not in the listing.
+
+        """
+        if full:
+            self._events = {}
+        for event in events:
+            if event.get('status') == 'cancelled':
+                self._events.pop(event['id'], None)
+            elif 'start' in event and 'end' in event:
+                result = entry(event)
+                result['text'] = ' '.join((
+                    result['summary'], event.get('description', ''),
+                    result['location'])).lower()
+                self._events[event['id']] = (
+                    _timestamp(event['start']), _timestamp(event['end']),
+                    result)
+        self._arrays = None
+        self.sync_token = sync_token
+        self.synced_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._events)
+
+    def _build(self):
+        values = sorted(self._events.values(), key=lambda value: value[0])
+        starts = np.array([value[0] for value in values], dtype=np.int64)
+        ends = np.array([value[1] for value in values], dtype=np.int64)
+        attendees = {}
+        for position, value in enumerate(values):
+            for email in value[2]['attendees']:
+                attendees.setdefault(email.lower(), []).append(position)
+        longest = int((ends - starts).max()) if len(values) else 0
+        self._arrays = (starts, ends, [value[2] for value in values],
+                        {email: np.array(positions, dtype=np.int64)
+                         for email, positions in attendees.items()},
+                        longest)
+        return self._arrays
+
+    def search(self, time_min=None, time_max=None, attendee=None, text=None,
+               limit=Meeting.SEARCH_LIMIT):
+        """
+        Search the events of a time window.
+
+        Args:
+            - time_min(int): events ending after this timestamp, None
+                matches any.
+            - time_max(int): events starting before this timestamp, None
+                matches any.
+            - attendee(str): email of an attendee of the events.
+            - text(str): words found in the summary, description or
+                location.
+            - limit(int): events returned at most.
+
+        Returns(list):
+            Search results, sorted by start.
+
+        """
+        starts, ends, results, attendees, longest = \
+            self._arrays or self._build()
+        low = 0 if time_min is None else \
+            int(np.searchsorted(starts, time_min - longest, 'right'))
+        high = len(starts) if time_max is None else \
+            int(np.searchsorted(starts, time_max, 'left'))
+        if attendee is not None:
+            positions = attendees.get(attendee.lower(),
+                                      np.empty(0, dtype=np.int64))
+            positions = positions[np.searchsorted(positions, low):
+                                  np.searchsorted(positions, high)]
+        else:
+            positions = np.arange(low, high, dtype=np.int64)
+        if time_min is not None:
+            positions = positions[ends[positions] > time_min]
+
+        words = text.lower().split() if text else []
+        found = []
+        for position in positions:
+            result = results[position]
+            if all(word in result['text'] for word in words):
+                found.append({key: value for key, value in result.items()
+                              if key != 'text'})
+                if len(found) >= limit:
+                    break
+        return found
+
+
+class EventIndex:
+    """
+    Local interval indexes of the events of Calendar calendars, one per
+    account and calendar, kept up to date with incremental syncs.
+    """
+
+    def __init__(self, max_size=Meeting.EVENT_INDEX_SIZE):
+        """
+        Args:
+            - max_size(int): maximum number of calendars indexed.
+
+        """
+        self._calendars = LRUCache('event_index', max_size)
+        self._lock = threading.Lock()
+        self._warming = set()
+
+    def get(self, calendar, create=False):
+        """
+        Get the index of a calendar.
+
+        Args:
+            - calendar(tuple): (account, calendar_id).
+            - create(bool): create an empty index when there is none.
+
+        Returns(CalendarIndex):
+            None when the calendar is not indexed and create is False.
+
+        """
+        with self._lock:
+            index = self._calendars.get(calendar)
+            if index is None and create:
+                index = CalendarIndex()
+                self._calendars.set(calendar, index)
+            return index
+
+    def warm(self, calendar, sync):
+        """
+        Build the index of a calendar in the background, once at a time.
+
+        Args:
+            - calendar(tuple): (account, calendar_id).
+            - sync(function): syncs the index of the calendar.
+
+        Returns(bool):
+            False when the calendar is already being warmed.
+
+        """
+        with self._lock:
+            if calendar in self._warming:
+                return False
+            self._warming.add(calendar)
+
+        def _warm():
+            try:
+                sync()
+            finally:
+                with self._lock:
+                    self._warming.discard(calendar)
+
+        threading.Thread(target=_warm, daemon=True).start()
+        return True
+
+    def forget(self, calendar):
+        self._calendars.pop(calendar)
+
+    def clear(self):
+        self._calendars.clear()
+
+
+event_index = EventIndex()
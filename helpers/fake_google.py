@@ -0,0 +1,913 @@
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import httplib2
+from googleapiclient import errors
+
+from consts.backend import Backend
+from consts.drive import Drive
+from helpers import recurrence
+
+
+FOLDER_MIME_TYPE = Drive.FOLDER_MIME_TYPE
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _timestamp(value):
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc)\
+        .strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _when(value):
+    """
+    Timestamp of an event start or end, all-day events start at midnight
+    UTC.
+    """
+    return value.get('dateTime') or value['date'] + 'T00:00:00Z'
+
+
+def _text(event):
+    return ' '.join([event.get('summary', ''), event.get('description', ''),
+                     event.get('location', '')] +
+                    [attendee.get('email', '')
+                     for attendee in event.get('attendees', [])]).lower()
+
+
+def _instances(event, limit=Backend.FAKE_MAX_INSTANCES):
+    """
+    Expand a recurring event into its instances, as singleEvents does, in
+    the wall-clock time of the event time zone. Only DAILY and WEEKLY rules
+    with INTERVAL, COUNT and UNTIL are supported, other rules yield the
+    first instance only.
+
+    Returns(list):
+    """
+    rules = [line[len('RRULE:'):] for line in event.get('recurrence', [])
+             if line.startswith('RRULE:')]
+    if not rules:
+        return [event]
+    parts = dict(part.split('=', 1) for part in rules[0].split(';'))
+    days = {'DAILY': 1, 'WEEKLY': 7}.get(parts.get('FREQ'))
+    count = int(parts.get('COUNT', limit)) if days else 1
+    until = None
+    if 'UNTIL' in parts:
+        until = datetime.strptime(
+            parts['UNTIL'],
+            '%Y%m%dT%H%M%SZ' if 'T' in parts['UNTIL'] else '%Y%m%d')\
+            .replace(tzinfo=timezone.utc).timestamp()
+    step = timedelta(days=(days or 1) * int(parts.get('INTERVAL', 1)))
+    start = datetime.fromisoformat(_when(event['start']).replace('Z',
+                                                                 '+00:00'))
+    duration = datetime.fromisoformat(
+        _when(event['end']).replace('Z', '+00:00')) - start
+    tz = recurrence.zone(event['start']['timeZone'])\
+        if event['start'].get('timeZone') else start.tzinfo
+    local = start.astimezone(tz).replace(tzinfo=None)
+    instances = []
+    for i in range(min(count, limit)):
+        begin = (local + step * i).replace(tzinfo=tz)
+        if until is not None and begin.timestamp() > until:
+            break
+        instance = {key: value for key, value in event.items()
+                    if key != 'recurrence'}
+        instance.update({
+            'id': '{}_{}'.format(event['id'], begin.astimezone(
+                timezone.utc).strftime('%Y%m%dT%H%M%SZ')),
+            'recurringEventId': event['id'],
+            'start': dict(event['start'], dateTime=begin.isoformat()),
+            'end': dict(event['end'],
+                        dateTime=(begin + duration).isoformat())})
+        instances.append(instance)
+    return instances
+
+
+def _new_id(length=28):
+    return uuid.uuid4().hex[:length]
+
+
+def http_error(status, reason, message):
+    """
+    Build the same HttpError googleapiclient raises for a failed call.
+
+    Args:
+        - status(int): HTTP status code.
+        - reason(str): Google error reason, e.g. 'notFound'.
+        - message(str): human readable message.
+
+    Returns(HttpError):
+    """
+    content = json.dumps({'error': {
+        'code': status,
+        'message': message,
+        'errors': [{'domain': 'global', 'reason': reason,
+                    'message': message}]}}).encode()
+    return errors.HttpError(httplib2.Response({'status': status}), content)
+
+
+def _page(items, page_token, max_results):
+    """
+    Slice a list of resources the same way the Google list calls do.
+
+    Returns(tupple):
+        (page_items, next_page_token or None)
+
+    """
+    start = int(page_token or 0)
+    end = start + int(max_results)
+    next_token = str(end) if end < len(items) else None
+    return items[start:end], next_token
+
+
+class _QueryParser:
+    """
+    Recursive descent parser of the Drive files.list 'q' syntax.
+    Supports and/or/not, parentheses, =, !=, <, <=, >, >=, contains and
+    "'value' in parents".
+    """
+
+    OPERATORS = ('<=', '>=', '!=', '=', '<', '>')
+
+    def __init__(self, query):
+        self.tokens = self._tokenize(query)
+        self.position = 0
+
+    @classmethod
+    def _tokenize(cls, query):
+        tokens = []
+        i = 0
+        while i < len(query):
+            char = query[i]
+            if char.isspace():
+                i += 1
+            elif char == "'":
+                value = []
+                i += 1
+                while i < len(query) and query[i] != "'":
+                    if query[i] == '\\' and i + 1 < len(query):
+                        i += 1
+                    value.append(query[i])
+                    i += 1
+                if i >= len(query):
+                    raise ValueError("Unterminated string")
+                tokens.append(('str', ''.join(value)))
+                i += 1
+            elif char in '()':
+                tokens.append((char, char))
+                i += 1
+            elif query.startswith(cls.OPERATORS, i):
+                operator = next(op for op in cls.OPERATORS
+                                if query.startswith(op, i))
+                tokens.append(('op', operator))
+                i += len(operator)
+            elif char.isalnum() or char == '_':
+                start = i
+                while i < len(query) and (query[i].isalnum() or
+                                          query[i] in '_.'):
+                    i += 1
+                tokens.append(('word', query[start:i]))
+            else:
+                raise ValueError("Unexpected character {}".format(char))
+        return tokens
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise ValueError("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def _keyword(self, word):
+        kind, value = self._peek()
+        if kind == 'word' and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        predicate = self._or()
+        if self._peek()[0] is not None:
+            raise ValueError("Unexpected token {}".format(self._peek()[1]))
+        return predicate
+
+    def _or(self):
+        terms = [self._and()]
+        while self._keyword('or'):
+            terms.append(self._and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda f: any(term(f) for term in terms)
+
+    def _and(self):
+        terms = [self._not()]
+        while self._keyword('and'):
+            terms.append(self._not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda f: all(term(f) for term in terms)
+
+    def _not(self):
+        if self._keyword('not'):
+            term = self._not()
+            return lambda f: not term(f)
+        if self._peek()[0] == '(':
+            self._next()
+            term = self._or()
+            if self._next()[0] != ')':
+                raise ValueError("Missing closing parenthesis")
+            return term
+        return self._comparison()
+
+    def _value(self):
+        kind, value = self._next()
+        if kind == 'str':
+            return value
+        if kind == 'word' and value in ('true', 'false'):
+            return value == 'true'
+        if kind == 'word':
+            try:
+                return float(value)
+            except ValueError:
+                pass
+        raise ValueError("Invalid value {}".format(value))
+
+    def _comparison(self):
+        kind, value = self._peek()
+        if kind == 'str':
+            self._next()
+            if not self._keyword('in'):
+                raise ValueError("Expected 'in'")
+            field = self._next()[1]
+            return lambda f: value in f.get(field, [])
+
+        field = self._next()[1]
+        kind, operator = self._next()
+        if kind == 'word' and operator == 'contains':
+            expected = self._value()
+            return lambda f: str(expected).lower() in \
+                str(f.get(field, '')).lower()
+        if kind != 'op':
+            raise ValueError("Expected an operator after {}".format(field))
+        expected = self._value()
+        compare = {
+            '=': lambda a, b: a == b,
+            '!=': lambda a, b: a != b,
+            '<': lambda a, b: a < b,
+            '<=': lambda a, b: a <= b,
+            '>': lambda a, b: a > b,
+            '>=': lambda a, b: a >= b,
+        }[operator]
+        return lambda f: compare(f.get(field), expected)
+
+
+@lru_cache(maxsize=1024)
+def compile_query(query):
+    """
+    Compile a Drive query into a predicate over file resources.
+
+    Args:
+        - query(str): Drive 'q' parameter.
+
+    Returns(function):
+        predicate(file) -> bool
+
+    """
+    return _QueryParser(query).parse()
+
+
+@lru_cache(maxsize=256)
+def _parse_fields(fields):
+    """
+    Parse a partial response field mask, e.g. 'nextPageToken,files(id)'.
+
+    Returns(dict):
+        Nested dict of the selected fields, None selects the whole value.
+
+    """
+    tree = {}
+    stack = [tree]
+    name = ''
+    for char in fields + ',':
+        if char == '(':
+            node = stack[-1]
+            for part in name.strip().split('/'):
+                if node.get(part) is None:
+                    node[part] = {}
+                node = node[part]
+            stack.append(node)
+            name = ''
+        elif char in ',)':
+            if name.strip():
+                node = stack[-1]
+                parts = name.strip().split('/')
+                for part in parts[:-1]:
+                    node = node.setdefault(part, {})
+                node[parts[-1]] = None
+            name = ''
+            if char == ')':
+                stack.pop()
+        else:
+            name += char
+    return tree
+
+
+def _project(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _project(value[key], subtree)
+                for key, subtree in tree.items() if key in value}
+    return value
+
+
+class FakeRequest:
+    """
+    Stand-in of googleapiclient.http.HttpRequest.
+    """
+
+    def __init__(self, backend, method_id, method, handler, kwargs):
+        self.backend = backend
+        self.methodId = method_id
+        self.method = method
+        self._handler = handler
+        self._kwargs = kwargs
+
+    def execute(self, http=None, num_retries=0):
+        self.backend.inject()
+        return self.run()
+
+    def run(self):
+        """
+        Run the call, without the injected latency and errors.
+        """
+        response = self._handler(**self._kwargs)
+        fields = self._kwargs.get('fields')
+        if fields and isinstance(response, dict):
+            # Partial response, as requested by the field mask.
+            response = _project(response, _parse_fields(fields))
+        return response
+
+
+class FakeBatch:
+    """
+    Stand-in of googleapiclient.http.BatchHttpRequest. The whole batch is a
+    single round trip, so latency and errors are injected once.
+    """
+
+    MAX_SIZE = 1000
+
+    def __init__(self, backend, callback=None):
+        self.backend = backend
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._requests) >= self.MAX_SIZE:
+            raise errors.BatchError(
+                "Exceeded the maximum calls({}) in a single batch request."
+                .format(self.MAX_SIZE))
+        if request_id is None:
+            request_id = str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback))
+
+    def execute(self, http=None):
+        self.backend.inject()
+        for request_id, request, callback in self._requests:
+            response = exception = None
+            try:
+                response = request.run()
+            except errors.HttpError as e:
+                exception = e
+            callback = callback or self._callback
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeResource:
+    """
+    Stand-in of a googleapiclient discovery resource.
+    """
+
+    def __init__(self, backend, method_prefix, spec):
+        self._backend = backend
+        self._method_prefix = method_prefix
+        self._spec = spec
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self._backend, callback)
+
+    def __getattr__(self, name):
+        try:
+            entry = self._spec[name]
+        except KeyError:
+            raise AttributeError(name)
+        method_id = '{}.{}'.format(self._method_prefix, name)
+        if isinstance(entry, dict):
+            return lambda: FakeResource(self._backend, method_id, entry)
+        verb, handler = entry
+        return lambda **kwargs: FakeRequest(self._backend, method_id, verb,
+                                            handler, kwargs)
+
+
+class FakeCredentials:
+    """
+    Stand-in of google.oauth2.credentials.Credentials.
+    """
+
+    token = 'fake-token'
+    refresh_token = 'fake-refresh-token'
+    valid = True
+    expired = False
+    expiry = None
+
+    def refresh(self, request):
+        pass
+
+    def to_json(self):
+        return json.dumps({'token': self.token,
+                           'refresh_token': self.refresh_token})
+
+
+class FakeGoogleBackend:
+    """
+    In-memory fake of the Gmail, Calendar and Drive endpoints used by the
+    helpers. State is shared by every service built from the same backend,
+    the same way every handler shares the same Google account.
+    """
+
+    def __init__(self, latency=Backend.FAKE_LATENCY,
+                 jitter=Backend.FAKE_JITTER,
+                 error_rate=Backend.FAKE_ERROR_RATE,
+                 user=Backend.FAKE_USER):
+        """
+        Args:
+            - latency(float): seconds added to every call.
+            - jitter(float): up to this many extra random seconds per call.
+            - error_rate(float): ratio of calls failing with a 503.
+            - user(str): email address of the fake authenticated user.
+
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.user = user
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drop every message, calendar, event and file.
+        """
+        with self._lock:
+            self.messages = deque(maxlen=10000)
+            self.sent_count = 0
+            self.call_count = 0
+            self.notified_count = 0
+            self.calendars = {
+                'primary': {'id': 'primary', 'summary': self.user,
+                            'timeZone': 'UTC', 'primary': True}}
+            self.events = {'primary': {}}
+            # Sequence number of the last change of every event, the sync
+            # tokens of events.list are the sequence at the time of a list.
+            self.sequence = 0
+            self.changes = {}
+            self.files = {
+                'root': {'id': 'root', 'name': 'My Drive',
+                         'mimeType': FOLDER_MIME_TYPE, 'parents': [],
+                         'trashed': False, 'permissions': []}}
+
+    def configure(self, latency=None, jitter=None, error_rate=None):
+        if latency is not None:
+            self.latency = latency
+        if jitter is not None:
+            self.jitter = jitter
+        if error_rate is not None:
+            self.error_rate = error_rate
+
+    def inject(self):
+        """
+        Apply the configured latency and error rate to a call.
+        """
+        with self._lock:
+            self.call_count += 1
+        delay = self.latency
+        if self.jitter:
+            delay += random.random() * self.jitter
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise http_error(503, 'backendError', 'Backend Error')
+
+    def build(self, service, version):
+        """
+        Build a fake service resource.
+
+        Args:
+            - service(str): 'gmail', 'calendar' or 'drive'.
+            - version(str): service version, kept for parity with build().
+
+        Returns(FakeResource):
+        """
+        specs = {
+            'gmail': {
+                'users': {
+                    'messages': {'send': ('POST', self.gmail_send)},
+                },
+            },
+            'calendar': {
+                'calendarList': {'list': ('GET', self.calendar_list)},
+                'calendars': {
+                    'insert': ('POST', self.calendars_insert),
+                    'delete': ('DELETE', self.calendars_delete),
+                },
+                'events': {
+                    'insert': ('POST', self.events_insert),
+                    'delete': ('DELETE', self.events_delete),
+                    'list': ('GET', self.events_list),
+                },
+                'freebusy': {'query': ('POST', self.freebusy_query)},
+            },
+            'drive': {
+                'files': {
+                    'copy': ('POST', self.files_copy),
+                    'create': ('POST', self.files_create),
+                    'delete': ('DELETE', self.files_delete),
+                    'get': ('GET', self.files_get),
+                    'list': ('GET', self.files_list),
+                },
+                'permissions': {
+                    'create': ('POST', self.permissions_create),
+                    'delete': ('DELETE', self.permissions_delete),
+                    'list': ('GET', self.permissions_list),
+                },
+            },
+        }
+        if service not in specs:
+            raise ValueError("Unknown fake service {}".format(service))
+        return FakeResource(self, service, specs[service])
+
+    # Gmail
+
+    def gmail_send(self, userId, body, **kwargs):
+        raw = (body or {}).get('raw')
+        if not raw:
+            raise http_error(400, 'invalidArgument',
+                             "'raw' RFC822 payload message string or "
+                             "uploading message via /upload/* URL required")
+        try:
+            base64.urlsafe_b64decode(raw.encode())
+        except (ValueError, TypeError):
+            raise http_error(400, 'invalidArgument', 'Invalid value for raw')
+        message = {'id': _new_id(16), 'threadId': _new_id(16),
+                   'labelIds': ['SENT']}
+        with self._lock:
+            self.messages.append(dict(message, raw=raw))
+            self.sent_count += 1
+        return message
+
+    # Calendar
+
+    def _calendar(self, calendar_id):
+        if calendar_id not in self.calendars:
+            raise http_error(404, 'notFound', 'Not Found')
+        return self.calendars[calendar_id]
+
+    def calendar_list(self, pageToken=None, maxResults=100, **kwargs):
+        with self._lock:
+            items = [dict(calendar, kind='calendar#calendarListEntry')
+                     for calendar in self.calendars.values()]
+        items, next_token = _page(items, pageToken, maxResults)
+        response = {'kind': 'calendar#calendarList', 'items': items}
+        if next_token:
+            response['nextPageToken'] = next_token
+        return response
+
+    def calendars_insert(self, body, **kwargs):
+        if not (body or {}).get('summary'):
+            raise http_error(400, 'required', 'Missing summary.')
+        calendar = {'id': '{}@group.calendar.google.com'.format(_new_id()),
+                    'summary': body['summary'],
+                    'timeZone': body.get('timeZone', 'UTC')}
+        with self._lock:
+            self.calendars[calendar['id']] = calendar
+            self.events[calendar['id']] = {}
+        return dict(calendar, kind='calendar#calendar')
+
+    def calendars_delete(self, calendarId, **kwargs):
+        with self._lock:
+            self._calendar(calendarId)
+            if calendarId == 'primary':
+                raise http_error(400, 'cannotDeletePrimaryCalendar',
+                                 'Cannot delete primary calendar.')
+            del self.calendars[calendarId]
+            del self.events[calendarId]
+        return ''
+
+    def events_insert(self, calendarId, body, sendUpdates=None,
+                      conferenceDataVersion=0, **kwargs):
+        for key in ('start', 'end'):
+            if not (body or {}).get(key):
+                raise http_error(400, 'required', 'Missing {} time.'
+                                 .format(key))
+        for line in body.get('recurrence', []):
+            if not line.startswith(('RRULE:', 'EXRULE:', 'RDATE:',
+                                    'EXDATE:')):
+                raise http_error(400, 'invalid', 'Invalid recurrence rule.')
+        now = _now()
+        event = dict(body)
+        event.update({
+            'kind': 'calendar#event',
+            'id': _new_id(26),
+            'status': 'confirmed',
+            'created': now,
+            'updated': now,
+            'sequence': 0,
+            'iCalUID': '{}@google.com'.format(_new_id(26)),
+            'organizer': {'email': self.user, 'self': True},
+            'creator': {'email': self.user, 'self': True},
+            'attendees': [dict(attendee, responseStatus='needsAction')
+                          for attendee in body.get('attendees', [])],
+        })
+        create_request = (body.get('conferenceData') or {})\
+            .get('createRequest')
+        if create_request and conferenceDataVersion:
+            code = '{}-{}-{}'.format(_new_id(3), _new_id(4), _new_id(3))
+            event['hangoutLink'] = 'https://meet.google.com/{}'.format(code)
+            event['conferenceData'] = {
+                'createRequest': dict(create_request,
+                                      status={'statusCode': 'success'}),
+                'conferenceId': code,
+                'entryPoints': [{'entryPointType': 'video',
+                                 'uri': event['hangoutLink']}]}
+        event['htmlLink'] = 'https://www.google.com/calendar/event?eid={}'\
+            .format(event['id'])
+        with self._lock:
+            self._calendar(calendarId)
+            self.events[calendarId][event['id']] = event
+            self._changed(calendarId, event['id'])
+            if sendUpdates in ('all', 'externalOnly'):
+                self.notified_count += len(event['attendees'])
+        return event
+
+    def events_delete(self, calendarId, eventId, sendUpdates=None,
+                      **kwargs):
+        with self._lock:
+            self._calendar(calendarId)
+            event = self.events[calendarId].get(eventId)
+            if not event:
+                raise http_error(404, 'notFound', 'Not Found')
+            if event['status'] == 'cancelled':
+                raise http_error(410, 'deleted',
+                                 'Resource has been deleted')
+            event['status'] = 'cancelled'
+            event['updated'] = _now()
+            self._changed(calendarId, eventId)
+        return ''
+
+    def _changed(self, calendar_id, event_id):
+        self.sequence += 1
+        self.changes[(calendar_id, event_id)] = self.sequence
+
+    def events_list(self, calendarId, orderBy=None, pageToken=None,
+                    maxResults=250, singleEvents=False, showDeleted=False,
+                    timeMin=None, timeMax=None, q=None, syncToken=None,
+                    **kwargs):
+        if orderBy == 'startTime' and not singleEvents:
+            raise http_error(400, 'badRequest',
+                             'The requested ordering is not available for '
+                             'the particular query.')
+        if syncToken and (orderBy or timeMin or timeMax or q):
+            raise http_error(400, 'invalid',
+                             'Sync token cannot be used with other '
+                             'filtering parameters.')
+        with self._lock:
+            self._calendar(calendarId)
+            events = list(self.events[calendarId].values())
+            if syncToken:
+                if not syncToken.isdigit() or \
+                        int(syncToken) > self.sequence:
+                    raise http_error(410, 'fullSyncRequired',
+                                     'Sync token is no longer valid, a '
+                                     'full sync is required.')
+                # Incremental syncs always return deleted events.
+                showDeleted = True
+                events = [event for event in events
+                          if self.changes[(calendarId, event['id'])] >
+                          int(syncToken)]
+            sync_token = str(self.sequence)
+        if singleEvents:
+            events = [instance for event in events
+                      for instance in _instances(event)]
+        items = [event for event in events
+                 if showDeleted or event['status'] != 'cancelled']
+        if timeMin or timeMax:
+            time_min = _timestamp(timeMin) if timeMin else float('-inf')
+            time_max = _timestamp(timeMax) if timeMax else float('inf')
+            items = [event for event in items
+                     if _timestamp(_when(event['end'])) > time_min and
+                     _timestamp(_when(event['start'])) < time_max]
+        if q:
+            words = q.lower().split()
+            items = [event for event in items
+                     if all(word in _text(event) for word in words)]
+        if orderBy == 'updated':
+            items.sort(key=lambda event: event['updated'])
+        elif orderBy == 'startTime':
+            items.sort(key=lambda event: _timestamp(_when(event['start'])))
+        items, next_token = _page(items, pageToken, maxResults)
+        response = {'kind': 'calendar#events', 'items': items}
+        if next_token:
+            response['nextPageToken'] = next_token
+        else:
+            response['nextSyncToken'] = sync_token
+        return response
+
+    def freebusy_query(self, body, **kwargs):
+        items = (body or {}).get('items', [])
+        if len(items) > 50:
+            raise http_error(400, 'tooManyCalendarsRequested',
+                             'Too many calendars requested.')
+        time_min = _timestamp(body['timeMin'])
+        time_max = _timestamp(body['timeMax'])
+        if time_max <= time_min:
+            raise http_error(400, 'timeRangeEmpty',
+                             'The specified time range is empty.')
+        calendars = {}
+        with self._lock:
+            for item in items:
+                calendar_id = item['id']
+                if calendar_id in self.calendars:
+                    events = self.events[calendar_id].values()
+                else:
+                    # Attendees are busy during the events inviting them.
+                    events = [event for events in self.events.values()
+                              for event in events.values()
+                              if any(attendee.get('email') == calendar_id
+                                     for attendee in event['attendees'])]
+                busy = []
+                for event in (instance for event in events
+                              for instance in _instances(event)):
+                    if event['status'] == 'cancelled' or \
+                            'dateTime' not in event['start']:
+                        continue
+                    start = max(_timestamp(event['start']['dateTime']),
+                                time_min)
+                    end = min(_timestamp(event['end']['dateTime']), time_max)
+                    if start < end:
+                        busy.append((start, end))
+                calendars[calendar_id] = {'busy': [
+                    {'start': _utc(start), 'end': _utc(end)}
+                    for start, end in sorted(busy)]}
+        return {'kind': 'calendar#freeBusy', 'timeMin': _utc(time_min),
+                'timeMax': _utc(time_max), 'calendars': calendars}
+
+    # Drive
+
+    def _file(self, file_id):
+        file = self.files.get(file_id)
+        if not file or file_id == 'root':
+            raise http_error(404, 'notFound',
+                             'File not found: {}.'.format(file_id))
+        return file
+
+    def files_create(self, body=None, media_body=None, **kwargs):
+        body = body or {}
+        file = {
+            'kind': 'drive#file',
+            'id': _new_id(33),
+            'name': body.get('name', 'Untitled'),
+            'mimeType': body.get('mimeType') or
+            (media_body.mimetype() if media_body else None) or
+            'application/octet-stream',
+            'parents': list(body.get('parents') or ['root']),
+            'trashed': False,
+            'createdTime': _now(),
+            'permissions': [],
+        }
+        if media_body is not None:
+            data = media_body.getbytes(0, media_body.size())
+            file['size'] = str(len(data))
+            file['md5Checksum'] = hashlib.md5(data).hexdigest()
+        with self._lock:
+            for parent_id in file['parents']:
+                parent = self.files.get(parent_id)
+                if not parent or parent['mimeType'] != FOLDER_MIME_TYPE:
+                    raise http_error(404, 'notFound',
+                                     'File not found: {}.'.format(parent_id))
+            self.files[file['id']] = file
+        return {key: file[key] for key in ('kind', 'id', 'name', 'mimeType')}
+
+    def files_copy(self, fileId, body=None, **kwargs):
+        body = body or {}
+        with self._lock:
+            source = self._file(fileId)
+            if source['mimeType'] == FOLDER_MIME_TYPE:
+                raise http_error(403, 'cannotCopyFile',
+                                 'This file cannot be copied by the user.')
+            file = dict(source, id=_new_id(33), createdTime=_now(),
+                        permissions=[],
+                        name=body.get('name',
+                                      'Copy of {}'.format(source['name'])),
+                        parents=list(body.get('parents') or
+                                     source['parents']))
+            for parent_id in file['parents']:
+                parent = self.files.get(parent_id)
+                if not parent or parent['mimeType'] != FOLDER_MIME_TYPE:
+                    raise http_error(404, 'notFound',
+                                     'File not found: {}.'.format(parent_id))
+            self.files[file['id']] = file
+        return {key: file[key] for key in ('kind', 'id', 'name', 'mimeType')}
+
+    def files_delete(self, fileId, **kwargs):
+        with self._lock:
+            self._file(fileId)
+            pending = [fileId]
+            while pending:
+                current = pending.pop()
+                self.files.pop(current, None)
+                pending.extend(file['id'] for file in self.files.values()
+                               if current in file['parents'])
+        return ''
+
+    def files_get(self, fileId, **kwargs):
+        with self._lock:
+            file = dict(self._file(fileId))
+        file.pop('permissions')
+        return file
+
+    def files_list(self, q=None, pageToken=None, pageSize=100,
+                   spaces='drive', **kwargs):
+        try:
+            predicate = compile_query(q) if q else None
+        except ValueError as e:
+            raise http_error(400, 'invalid', 'Invalid Value: {}'.format(e))
+        with self._lock:
+            items = [file for file in self.files.values()
+                     if file['id'] != 'root' and
+                     (predicate is None or predicate(file))]
+        items, next_token = _page(items, pageToken, pageSize)
+        response = {'kind': 'drive#fileList', 'files': [
+            {key: value for key, value in file.items()
+             if key != 'permissions'} for file in items]}
+        if next_token:
+            response['nextPageToken'] = next_token
+        return response
+
+    def permissions_create(self, fileId, body, transferOwnership=False,
+                           **kwargs):
+        if body.get('role') == 'owner' and not transferOwnership:
+            raise http_error(403, 'consentRequiredForOwnershipTransfer',
+                             'The transferOwnership parameter must be '
+                             'enabled when the permission role is owner.')
+        permission = {'kind': 'drive#permission', 'id': _new_id(20),
+                      'type': body.get('type'), 'role': body.get('role'),
+                      'emailAddress': body.get('emailAddress')}
+        with self._lock:
+            self._file(fileId)['permissions'].append(permission)
+        return {'id': permission['id']}
+
+    def permissions_delete(self, fileId, permissionId, **kwargs):
+        with self._lock:
+            permissions = self._file(fileId)['permissions']
+            for permission in permissions:
+                if permission['id'] == permissionId:
+                    permissions.remove(permission)
+                    return ''
+        raise http_error(404, 'notFound',
+                         'Permission not found: {}.'.format(permissionId))
+
+    def permissions_list(self, fileId, pageToken=None, pageSize=100,
+                         **kwargs):
+        with self._lock:
+            permissions = list(self._file(fileId)['permissions'])
+        items, next_token = _page(permissions, pageToken, pageSize)
+        response = {'kind': 'drive#permissionList', 'permissions': items}
+        if next_token:
+            response['nextPageToken'] = next_token
+        return response
+
+
+backend = FakeGoogleBackend()
@@ -0,0 +1,130 @@
+import base64
+import socketserver
+import threading
+
+
+class _Session(socketserver.StreamRequestHandler):
+    """
+    Single SMTP session of the fake server. Replies are written as soon as
+    every command is read, so pipelined commands are answered in order.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server.fake
+        with server.lock:
+            server.connections += 1
+        self.reply('220 fake ESMTP ready')
+        sender = None
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode().rstrip('\r\n')\
+                .partition(' ')
+            command = command.upper()
+            if command in ('EHLO', 'HELO'):
+                self.wfile.write(b'250-fake\r\n')
+                if server.pipelining:
+                    self.wfile.write(b'250-PIPELINING\r\n')
+                self.reply('250 AUTH XOAUTH2 PLAIN LOGIN')
+            elif command == 'AUTH':
+                mechanism, _, response = argument.partition(' ')
+                if mechanism.upper() != 'XOAUTH2' or not response:
+                    self.reply('504 Unsupported authentication')
+                    continue
+                auth = base64.b64decode(response).decode()
+                fields = dict(field.split('=', 1)
+                              for field in auth.split('\x01') if field)
+                token = fields.get('auth', '')[len('Bearer '):]
+                if server.tokens is not None and token not in server.tokens:
+                    self.reply('334 eyJzdGF0dXMiOiI0MDEifQ==')
+                    self.rfile.readline()
+                    self.reply('535 Invalid credentials')
+                    continue
+                with server.lock:
+                    server.logins.append(fields.get('user'))
+                self.reply('235 Accepted')
+            elif command == 'MAIL':
+                sender = argument[len('FROM:'):].strip().strip('<>')
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipient = argument[len('TO:'):].strip().strip('<>')
+                if recipient in server.rejected:
+                    self.reply('550 No such user {}'.format(recipient))
+                elif recipient in server.deferred:
+                    self.reply('451 Try again later')
+                else:
+                    recipients.append(recipient)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                if sender is None or not recipients:
+                    self.reply('503 Bad sequence of commands')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b'.\r\n':
+                        break
+                    lines.append(line[1:] if line.startswith(b'..')
+                                 else line)
+                with server.lock:
+                    server.messages.append((sender, recipients,
+                                            b''.join(lines)))
+                sender, recipients = None, []
+                self.reply('250 OK queued')
+            elif command == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSmtpServer:
+    """
+    Local stand-in of an SMTP relay, listening on a free port of localhost.
+    Accepts XOAUTH2 logins and records every message it receives.
+    """
+
+    def __init__(self, pipelining=True, tokens=None):
+        """
+        Args:
+            - pipelining(bool): advertise PIPELINING.
+            - tokens(set): access tokens accepted, None accepts any.
+
+        """
+        self.pipelining = pipelining
+        self.tokens = tokens
+        self.lock = threading.Lock()
+        self.rejected = set()
+        self.deferred = set()
+        self.messages = []
+        self.logins = []
+        self.connections = 0
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0),
+                                                       _Session)
+        self._server.daemon_threads = True
+        self._server.fake = self
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        return self.address
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
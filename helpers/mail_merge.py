@@ -0,0 +1,89 @@
+from base64 import urlsafe_b64encode
+from email.errors import MessageError
+from email.mime.text import MIMEText
+from string import Formatter
+
+
+class Template:
+    """
+    Mail merge template, '{name}' placeholders replaced by the variables of
+    every recipient and '{{' '}}' escaping braces. The template is parsed
+    once, rendering only joins its parts.
+    """
+
+    def __init__(self, text):
+        """
+        Args:
+            - text(str): template text.
+
+        """
+        self.text = text
+        self.parts = []
+        try:
+            parsed = list(Formatter().parse(text))
+        except ValueError as e:
+            raise ValueError("Invalid template: {}".format(e))
+        for literal, field, spec, conversion in parsed:
+            if field is not None and (not field.isidentifier() or spec or
+                                      conversion):
+                raise ValueError("Invalid placeholder {{{}}}, only plain "
+                                 "variable names are supported"
+                                 .format(field))
+            self.parts.append((literal, field))
+
+    @property
+    def fields(self):
+        return {field for _, field in self.parts if field is not None}
+
+    def render(self, variables):
+        """
+        Render the template.
+
+        Args:
+            - variables(dict): value of every placeholder.
+
+        Returns(str):
+        """
+        try:
+            return ''.join(literal if field is None
+                           else literal + str(variables[field])
+                           for literal, field in self.parts)
+        except KeyError as e:
+            raise KeyError("Missing variable {}".format(e.args[0]))
+
+
+def render(sender, subject, body, rows, subtype='plain'):
+    """
+    Render and encode the messages of a mail merge. Runs in the render
+    processes, so it only takes and returns picklable values.
+
+    Args:
+        - sender(str): sender's email address.
+        - subject(Template): subject template.
+        - body(Template): body template.
+        - rows(list): (recipient, variables) of every message.
+        - subtype(str): 'plain' or 'html' body.
+
+    Returns(list):
+        (raw, None) or (None, err_msg) of every message, raw being the
+        base64url encoded RFC822 message Gmail sends.
+
+    """
+    messages = []
+    for recipient, variables in rows:
+        variables = dict(variables, recipient=recipient)
+        try:
+            message = MIMEText(body.render(variables), subtype)
+            message['to'] = recipient
+            message['from'] = sender
+            message['subject'] = subject.render(variables)
+            raw = message.as_bytes()
+        except KeyError as e:
+            messages.append((None, e.args[0]))
+            continue
+        except (MessageError, ValueError) as e:
+            # e.g. a line break in a header.
+            messages.append((None, str(e)))
+            continue
+        messages.append((urlsafe_b64encode(raw).decode(), None))
+    return messages
@@ -1,10 +1,17 @@
 import time
+import uuid
 
 from googleapiclient import errors
 
+from consts.fields import Fields
+from consts.meeting import Meeting
 from consts.utils import MeetingUtils
+from helpers import recurrence, slots
+from helpers.event_index import entry, event_index
 from helpers.service_helper import GoogleServiceHandler, get_auth
+from utils import idempotency
 from utils.logger import logger
+from utils.tracing import traced
 
 
 class MeetingHandler(GoogleServiceHandler):
@@ -14,16 +21,19 @@ class MeetingHandler(GoogleServiceHandler):
 
     credentials = service = None
 
-    def __init__(self, credential_file_path):
+    def __init__(self, credential_file_path, account=None):
         """
         Instanciate the Meeting Handler using the provided credential file.
 
         Args:
             - credential_file_path(str): relative path of the credential file.
+            - account(str): account impersonated in service account mode.
 
         Returns(None)
 
         """
+        self.credential_file_path = credential_file_path
+        self.account = account
         self.credentials, self.service =\
             super().__init__("calendar", "v3", credential_file_path)
 
@@ -32,7 +42,7 @@ class MeetingHandler(GoogleServiceHandler):
 
     @get_auth
     def create_event(self, calendar_id, summary, attendees, start, end,
-                     timezone, location):
+                     timezone, location, recurrence=None, request_id=None):
         """
         Create a new event and invite the attendes.
         If location is 'online' a new Google Meet meeting will be created.
@@ -45,83 +55,262 @@ class MeetingHandler(GoogleServiceHandler):
             - end(string): Datetime end.
             - timezone(string): Timezone of the event.
             - location(string): Location of the meeting.
+            - recurrence(list): RRULE, EXRULE, RDATE and EXDATE lines of a
+                recurring event.
+            - request_id(str): ID of the Meet conference request, a new
+                one by default.
 
         Returns(tupple):
-            (True, None) or (False, err_msg)
+            (True, event_id) or (False, err_msg)
 
         """
         logger.log_info("Creating new meet on calendar {} from {} to {}"
                         .format(calendar_id, start, end))
-        attendees = [{'email': email} for email in attendees]
         logger.log_info("Attendees: {}".format(attendees))
-        event = {
-            "summary": summary,
-            "start": {
-                "dateTime": start,
-                "timeZone": timezone
-            },
-            "end": {
-                "dateTime": end,
-                "timeZone": timezone
-            },
-            "attendees": attendees,
-            "reminders": {
-                "useDefault": False,
-                "overrides": [
-                    {"method": "email", "minutes": 30}
-                ]
-            }
-        }
-
-        if location == MeetingUtils.ONLINE_EVENT:
-            logger.log_info("Attaching Google Meet link")
-            event['conferenceData'] = {}
-            event['conferenceData']['createRequest'] =\
-                {'requestId': 'SecureRandom.uuid'}
-        else:
-            event['location'] = location
+        event = self._event_body(summary, attendees, start, end, timezone,
+                                 location, recurrence, request_id)
 
         logger.log_info("Requesting event creation: {}".format(event))
         try:
-            self.service.events().insert(calendarId=calendar_id,
-                                         sendUpdates='all',
-                                         conferenceDataVersion=1,
-                                         body=event).execute()
+            r = self._execute(self._insert_request(calendar_id, event))
             logger.log_info("Event successfully created")
-            return True, None
+            return True, r['id']
         except errors.HttpError as e:
             logger.log_error("Error creating event: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def delete_event(self, calendar_id, summary):
+    def create_events(self, calendar_id, rows, timezone,
+                      send_updates='all', request_id=None):
+        """
+        Create many events at once. Rows repeating the same event a fixed
+        number of days apart become a single recurring event, the rest are
+        inserted in batch requests.
+
+        Args:
+            - calendar_id(string): ID of the calendar to add the events to.
+            - rows(list): dicts with the 'summary', 'attendees', 'start',
+                'end' and 'location' of every event.
+            - timezone(string): Timezone of the events.
+            - send_updates(string): 'all', 'externalOnly' or 'none'.
+            - request_id(str): Meet conference requests of the events are
+                derived from it, new ones by default.
+
+        Returns(tupple):
+            (True, {'events': [{'event_id':, 'rows':, 'recurrence':}],
+                    'failed': {row: err_msg}}) or (False, err_msg)
+
+        """
+        logger.log_info("Creating {} events on calendar {}"
+                        .format(len(rows), calendar_id))
+        events = recurrence.collapse([
+            ((row['summary'], tuple(row['attendees']), row['location']),
+             row['start'], row['end']) for row in rows], timezone)
+        requests = []
+        for indexes, rule in events:
+            row = rows[indexes[0]]
+            event = self._event_body(
+                row['summary'], row['attendees'], row['start'], row['end'],
+                timezone, row['location'], [rule] if rule else None,
+                idempotency.request_id(request_id, indexes[0])
+                if request_id else None)
+            requests.append(self._insert_request(calendar_id, event,
+                                                 send_updates))
+        logger.log_info("Inserting {} events for {} rows"
+                        .format(len(requests), len(rows)))
+
+        size = Meeting.BATCH_SIZE
+        results = []
+        for i in range(0, len(requests), size):
+            results.extend(self._execute_batch(requests[i:i + size]))
+
+        report = {'events': [], 'failed': {}}
+        for (indexes, rule), (response, exception) in zip(events, results):
+            if exception is None:
+                report['events'].append({'event_id': response['id'],
+                                         'rows': indexes,
+                                         'recurrence': rule})
+            else:
+                report['failed'].update((str(i), str(exception))
+                                        for i in indexes)
+        if results and not report['events']:
+            logger.log_error("Error creating events: {}"
+                             .format(results[0][1]))
+            return False, str(results[0][1])
+        logger.log_info("Created {} events, {} rows failed".format(
+            len(report['events']), len(report['failed'])))
+        return True, report
+
+    @get_auth
+    def delete_event(self, calendar_id, summary=None, event_id=None):
         """
         Delete event from a certain calendar using Google Calendar API.
 
         Args:
             - calendar_id(str): ID of the calendar which the event belongs to.
             - summary(str): Summary of the event.
+            - event_id(str): ID of the event, skips the summary lookup.
 
         Returns(tupple):
             (True, None) or (False, err_msg)
 
         """
         logger.log_info("Deleting event {} from calendar {}"
-                        .format(summary, calendar_id))
-        r, event_id = self._get_event_id_summary(calendar_id, summary)
-        if not r:
-            return False, event_id
+                        .format(event_id or summary, calendar_id))
+        if not event_id:
+            r, event_id = self._get_event_id_summary(calendar_id, summary)
+            if not r:
+                return False, event_id
 
         try:
-            r = self.service.events().delete(calendarId=calendar_id,
-                                             sendUpdates='all',
-                                             eventId=event_id).execute()
+            r = self._execute(self.service.events().delete(
+                calendarId=calendar_id,
+                sendUpdates='all',
+                eventId=event_id))
             logger.log_info("Event successfully deleted")
             return True, None
         except errors.HttpError as e:
             logger.log_error("Failed to delete event: {}".format(e))
             return False, str(e)
 
+    @get_auth
+    def find_slots(self, calendars, time_min, time_max, duration,
+                   count=Meeting.SLOT_COUNT, work_start=None, work_end=None,
+                   offset=0, weekdays=Meeting.WORK_DAYS):
+        """
+        Find the first free slots shared by every calendar and attendee,
+        within working hours.
+
+        Args:
+            - calendars(list): calendar IDs and attendee emails.
+            - time_min(int): start of the search, seconds since the epoch.
+            - time_max(int): end of the search, seconds since the epoch.
+            - duration(int): seconds of every slot.
+            - count(int): slots to return at most.
+            - work_start(int): seconds after local midnight work starts,
+                None allows any time.
+            - work_end(int): seconds after local midnight work ends.
+            - offset(int): seconds east of UTC of the working hours and the
+                returned slots.
+            - weekdays(list): working days, Monday being 0.
+
+        Returns(tupple):
+            (True, {'slots': [{'start':, 'end':}], 'errors': {id: reason}})
+            or (False, err_msg)
+
+        """
+        logger.log_info("Finding {} slots of {} s for {} calendars"
+                        .format(count, duration, len(calendars)))
+        r, busy = self._freebusy(list(dict.fromkeys(calendars)),
+                                 time_min, time_max)
+        if not r:
+            return False, busy
+        starts, ends, failed = busy
+
+        work = None
+        if work_start is not None:
+            work = slots.working_hours(time_min, time_max, work_start,
+                                       work_end, offset, weekdays)
+        slot_starts, slot_ends = slots.free_slots(
+            starts, ends, time_min, time_max, duration, count, work)
+        found = [{'start': slots.format_time(start, offset),
+                  'end': slots.format_time(end, offset)}
+                 for start, end in zip(slot_starts, slot_ends)]
+        logger.log_info("Found {} slots".format(len(found)))
+        return True, {'slots': found, 'errors': failed}
+
+    @get_auth
+    def search_events(self, calendar_id, time_min=None, time_max=None,
+                      attendee=None, text=None, limit=Meeting.SEARCH_LIMIT):
+        """
+        Search the events of a calendar by time window, attendee and text.
+        Searches are answered from the local event index of the calendar.
+        While the index is built, in the background, they are sent to the
+        Calendar API instead.
+
+        Args:
+            - calendar_id(str): ID of the calendar.
+            - time_min(int): events ending after this timestamp, None
+                matches any.
+            - time_max(int): events starting before this timestamp, None
+                matches any.
+            - attendee(str): email of an attendee of the events.
+            - text(str): words found in the summary, description or
+                location.
+            - limit(int): events returned at most.
+
+        Returns(tupple):
+            (True, {'events': [], 'source': 'index' or 'api'}) or
+            (False, err_msg)
+
+        """
+        logger.log_info("Searching events of calendar {}".format(calendar_id))
+        index = event_index.get((self.account, calendar_id))
+        if index is None or not index.ready:
+            event_index.warm((self.account, calendar_id),
+                             lambda: self.sync_events(calendar_id))
+            try:
+                events = self._search_api(calendar_id, time_min, time_max,
+                                          attendee, text, limit)
+            except errors.HttpError as e:
+                logger.log_error("Failed to search events: {}".format(e))
+                return False, str(e)
+            logger.log_info("Found {} events".format(len(events)))
+            return True, {'events': events, 'source': 'api'}
+
+        if index.stale():
+            r, err = self.sync_events(calendar_id)
+            if not r:
+                logger.log_error("Searching a stale event index: {}"
+                                 .format(err))
+        with index.lock:
+            events = index.search(time_min, time_max, attendee, text, limit)
+        logger.log_info("Found {} events".format(len(events)))
+        return True, {'events': events, 'source': 'index'}
+
+    @get_auth
+    def sync_events(self, calendar_id):
+        """
+        Sync the local event index of a calendar: a full listing the first
+        time, and only the changes since the last sync after that.
+
+        Args:
+            - calendar_id(str): ID of the calendar.
+
+        Returns(tupple):
+            (True, number_of_events) or (False, err_msg)
+
+        """
+        index = event_index.get((self.account, calendar_id), create=True)
+        sync_token = index.sync_token
+        events, page_token = [], None
+        while True:
+            try:
+                r = self._execute(self.service.events().list(
+                    calendarId=calendar_id, singleEvents=True,
+                    showDeleted=bool(sync_token), syncToken=sync_token,
+                    pageToken=page_token, maxResults=Meeting.EVENT_PAGE_SIZE,
+                    fields=Fields.EVENT_SYNC))
+            except errors.HttpError as e:
+                if e.resp.status == 410 and sync_token:
+                    logger.log_info("Sync token of calendar {} expired, "
+                                    "syncing it again".format(calendar_id))
+                    sync_token, events, page_token = None, [], None
+                    continue
+                logger.log_error("Failed to sync events: {}".format(e))
+                return False, str(e)
+            events.extend(r.get('items', []))
+            page_token = r.get('nextPageToken')
+            if not page_token:
+                break
+
+        with index.lock:
+            index.apply(events, r.get('nextSyncToken'), full=not sync_token)
+            count = len(index)
+        logger.log_info("Synced {} changes of calendar {}, {} events indexed"
+                        .format(len(events), calendar_id, count))
+        return True, count
+
     @get_auth
     def create_calendar(self, summary, time_zone):
         """
@@ -132,7 +321,7 @@ class MeetingHandler(GoogleServiceHandler):
             - time_zone(str): Time zone of the calendar.
 
         Returns(tupple):
-            (True, None) or (False, err_msg)
+            (True, calendar_id) or (False, err_msg)
 
         """
         logger.log_info("Creating calendar {}".format(summary))
@@ -143,33 +332,37 @@ class MeetingHandler(GoogleServiceHandler):
         }
 
         try:
-            self.service.calendars().insert(body=body).execute()
+            r = self._execute(self.service.calendars().insert(
+                body=body, fields=Fields.CALENDAR_INSERT))
             logger.log_info("Successfully created calendar")
-            return True, None
+            return True, r['id']
         except errors.HttpError as e:
             logger.log_error("Error creating calendar: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def delete_calendar(self, summary):
+    def delete_calendar(self, summary=None, calendar_id=None):
         """
         Delete calendar by calendar name using Google Calendar API
 
         Args:
             - summary(str): Name of the calendar.
+            - calendar_id(str): ID of the calendar, skips the summary lookup.
 
         Returns(tupple):
             (True, None) or (False, err_msg)
 
         """
-        logger.log_info("Deleting calendar {}".format(summary))
-        r, calendar_id = self._get_calendar_id_summary(summary)
-        if not r:
-            logger.log_error("Failed to retrieve calendar ID")
-            return False, calendar_id
+        logger.log_info("Deleting calendar {}".format(calendar_id or summary))
+        if not calendar_id:
+            r, calendar_id = self._get_calendar_id_summary(summary)
+            if not r:
+                logger.log_error("Failed to retrieve calendar ID")
+                return False, calendar_id
 
         try:
-            self.service.calendars().delete(calendarId=calendar_id).execute()
+            self._execute(
+                self.service.calendars().delete(calendarId=calendar_id))
             logger.log_info("Successfully deleted calendar")
             return True, None
         except errors.HttpError as e:
@@ -189,6 +382,147 @@ class MeetingHandler(GoogleServiceHandler):
         """
         return self._get_calendar_id_summary(summary)
 
+    def _event_body(self, summary, attendees, start, end, timezone,
+                    location, recurrence=None, request_id=None):
+        """
+        Build the body of an event. Online events get a new Google Meet
+        conference, requested with a unique ID so every event gets its own,
+        unless the request_id of a retried request is given.
+
+        Returns(dict):
+        """
+        event = {
+            "summary": summary,
+            "start": {
+                "dateTime": start,
+                "timeZone": timezone
+            },
+            "end": {
+                "dateTime": end,
+                "timeZone": timezone
+            },
+            "attendees": [{'email': email} for email in attendees],
+            "reminders": {
+                "useDefault": False,
+                "overrides": [
+                    {"method": "email", "minutes": 30}
+                ]
+            }
+        }
+        if recurrence:
+            event['recurrence'] = list(recurrence)
+
+        if location == MeetingUtils.ONLINE_EVENT:
+            event['conferenceData'] = {
+                'createRequest': {'requestId': request_id or
+                                  uuid.uuid4().hex}}
+        else:
+            event['location'] = location
+        return event
+
+    def _insert_request(self, calendar_id, event, send_updates='all'):
+        """
+        Build the events.insert request of an event body.
+
+        Returns(HttpRequest):
+        """
+        return self.service.events().insert(
+            calendarId=calendar_id,
+            sendUpdates=send_updates,
+            conferenceDataVersion=1,
+            fields=Fields.EVENT_INSERT,
+            body=event)
+
+    @traced
+    def _freebusy(self, calendars, time_min, time_max):
+        """
+        Query the busy time of many calendars, split in as many
+        freebusy.query calls as the API limits require, sent in batches.
+
+        Args:
+            - calendars(list): calendar IDs and attendee emails.
+            - time_min(int): start of the window, seconds since the epoch.
+            - time_max(int): end of the window, seconds since the epoch.
+
+        Returns(tupple):
+            (True, (starts, ends, {id: reason})) or (False, err_msg)
+
+        """
+        span = Meeting.FREEBUSY_MAX_DAYS * slots.DAY
+        windows = [(start, min(start + span, time_max))
+                   for start in range(time_min, time_max, span)]
+        size = Meeting.FREEBUSY_ITEMS
+        queries = [(calendars[i:i + size], window)
+                   for i in range(0, len(calendars), size)
+                   for window in windows]
+        requests = [self.service.freebusy().query(
+            fields=Fields.FREEBUSY,
+            body={'timeMin': slots.format_time(start, 0),
+                  'timeMax': slots.format_time(end, 0),
+                  'timeZone': 'UTC',
+                  'items': [{'id': calendar} for calendar in chunk]})
+            for chunk, (start, end) in queries]
+
+        size = Meeting.BATCH_SIZE
+        results = []
+        for i in range(0, len(requests), size):
+            results.extend(self._execute_batch(requests[i:i + size]))
+
+        starts, ends, failed = [], [], {}
+        for (chunk, _), (response, exception) in zip(queries, results):
+            if exception is not None:
+                failed.update((calendar, str(exception))
+                              for calendar in chunk)
+                continue
+            for calendar, busy in response.get('calendars', {}).items():
+                if busy.get('errors'):
+                    failed[calendar] = busy['errors'][0].get('reason', '')
+                for interval in busy.get('busy', []):
+                    starts.append(interval['start'])
+                    ends.append(interval['end'])
+        if results and all(exception is not None
+                           for _, exception in results):
+            logger.log_error("Failed to query free/busy: {}"
+                             .format(results[0][1]))
+            return False, str(results[0][1])
+        if failed:
+            logger.log_info("Free/busy unavailable for {}"
+                            .format(sorted(failed)))
+        return True, (slots.to_epoch(starts), slots.to_epoch(ends), failed)
+
+    @traced
+    def _search_api(self, calendar_id, time_min, time_max, attendee, text,
+                    limit):
+        """
+        Search events with bounded events.list calls.
+
+        Returns(list):
+            Search results, sorted by start.
+
+        """
+        query = ' '.join(word for word in (text, attendee) if word) or None
+        found, page_token = [], None
+        while len(found) < limit:
+            r = self._execute(self.service.events().list(
+                calendarId=calendar_id, singleEvents=True,
+                orderBy='startTime', q=query, pageToken=page_token,
+                timeMin=None if time_min is None
+                else slots.format_time(time_min, 0),
+                timeMax=None if time_max is None
+                else slots.format_time(time_max, 0),
+                maxResults=min(limit, Meeting.EVENT_PAGE_SIZE),
+                fields=Fields.EVENT_SEARCH))
+            for event in r.get('items', []):
+                result = entry(event)
+                if attendee is None or attendee.lower() in \
+                        (email.lower() for email in result['attendees']):
+                    found.append(result)
+            page_token = r.get('nextPageToken')
+            if not page_token:
+                break
+        return found[:limit]
+
+    @traced
     def _get_event_id_summary(self, calendar_id, summary):
         """
         Get event id of a certain calendar filtering by its summary.
@@ -202,18 +536,25 @@ class MeetingHandler(GoogleServiceHandler):
 
         """
         logger.log_info("Querying event ID of event {}".format(summary))
-        r = self.service.events().list(calendarId=calendar_id,
-                                       orderBy='updated').execute()
-
-        items = r.get('items', [])
-        for item in items:
-            if item.get('summary', '') == summary:
-                logger.log_info("Event found: {}".format(item))
-                logger.log_info("Successfully queried event")
-                return True, item['id']
+        page_token = None
+        while True:
+            # q narrows the listing down, the summary must still match.
+            r = self._execute(self.service.events().list(
+                calendarId=calendar_id, orderBy='updated', q=summary,
+                pageToken=page_token, maxResults=Meeting.EVENT_PAGE_SIZE,
+                fields=Fields.EVENT_LOOKUP))
+            for item in r.get('items', []):
+                if item.get('summary', '') == summary:
+                    logger.log_info("Event found: {}".format(item))
+                    logger.log_info("Successfully queried event")
+                    return True, item['id']
+            page_token = r.get('nextPageToken')
+            if not page_token:
+                break
         logger.log_error("No event found with summary {}".format(summary))
         return False, "No event found with summary {}".format(summary)
 
+    @traced
     def _get_calendar_id_summary(self, summary, timeout=10):
         """
         Get calendar id filtering by its summary.
@@ -230,8 +571,9 @@ class MeetingHandler(GoogleServiceHandler):
         page_token = None
         now = time.time()
         while time.time() - now < timeout:
-            r = self.service.calendarList().list(
-                pageToken=page_token).execute()
+            r = self._execute(self.service.calendarList().list(
+                pageToken=page_token, maxResults=250,
+                fields=Fields.CALENDAR_LIST))
             items = r.get('items', [])
             for item in items:
                 if item.get('summary', '') == summary:
@@ -239,5 +581,7 @@ class MeetingHandler(GoogleServiceHandler):
                     logger.log_info("Successfully queried event")
                     return True, item['id']
             page_token = r.get('nextPageToken')
+            if not page_token:
+                break
         logger.log_error("No calendar found with summary {}".format(summary))
         return False, "No calendar found with summary {}".format(summary)
@@ -0,0 +1,56 @@
+import mimetypes
+import os
+from base64 import urlsafe_b64encode
+
+from email import encoders
+from email.mime.audio import MIMEAudio
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart, MIMEBase
+from email.mime.text import MIMEText
+
+
+def build_attachement(recipient, sender, body, subject, attachement):
+    """
+    Build and encode an email with attachement. Runs in the render
+    processes for large attachements: the file is read there from its
+    path, so the payload never crosses the process boundary and only the
+    encoded message comes back.
+
+    Args:
+        - recipient(str): Recipient's email address.
+        - sender(str): Sender's email address.
+        - body(str): Contents of the email.
+        - subject(str): Subject of the email.
+        - attachement(str): Path to the file.
+
+    Returns(str):
+        base64url encoded RFC822 message, as Gmail sends it.
+
+    """
+    message = MIMEMultipart()
+    message['to'] = recipient
+    message['from'] = sender
+    message['subject'] = subject
+    message.attach(MIMEText(body))
+
+    content_type, encoding = mimetypes.guess_type(attachement)
+    if not content_type or not encoding:
+        content_type = 'application/octet-stream'
+    main_type, sub_type = content_type.split('/', 1)
+
+    with open(attachement, 'rb') as fp:
+        data = fp.read()
+    if main_type == 'text':
+        msg = MIMEText(data, _subtype=sub_type)
+    elif main_type == 'image':
+        msg = MIMEImage(data, _subtype=sub_type)
+    elif main_type == 'audio':
+        msg = MIMEAudio(data, _subtype=sub_type)
+    else:
+        msg = MIMEBase(main_type, sub_type)
+        msg.set_payload(data)
+        encoders.encode_base64(msg)
+    filename = os.path.basename(attachement)
+    msg.add_header('Content-Disposition', 'attachement', filename=filename)
+    message.attach(msg)
+    return urlsafe_b64encode(message.as_bytes()).decode()
@@ -0,0 +1,135 @@
+from collections import Counter
+from datetime import datetime
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+RULE_PREFIXES = ('RRULE:', 'EXRULE:', 'RDATE:', 'EXDATE:')
+
+
+def validate(recurrence):
+    """
+    Check the recurrence lines of an event, as the Calendar API takes them.
+
+    Args:
+        - recurrence(list): e.g. ['RRULE:FREQ=WEEKLY;COUNT=10'].
+
+    Returns(None):
+    """
+    for line in recurrence:
+        if not isinstance(line, str) or not line.startswith(RULE_PREFIXES):
+            raise ValueError("Invalid recurrence {}, expected lines "
+                             "starting with {}".format(
+                                 line, ', '.join(RULE_PREFIXES)))
+
+
+def rule(days, count):
+    """
+    Build the RRULE of an event repeated every few days.
+
+    Args:
+        - days(int): days between occurrences.
+        - count(int): number of occurrences.
+
+    Returns(str):
+    """
+    if days % 7 == 0:
+        frequency, interval = 'WEEKLY', days // 7
+    else:
+        frequency, interval = 'DAILY', days
+    if interval == 1:
+        return 'RRULE:FREQ={};COUNT={}'.format(frequency, count)
+    return 'RRULE:FREQ={};INTERVAL={};COUNT={}'.format(frequency, interval,
+                                                       count)
+
+
+def zone(name):
+    """
+    Get a time zone by its IANA name.
+
+    Args:
+        - name(str): e.g. 'America/New_York'.
+
+    Returns(ZoneInfo):
+    """
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError("Unknown time zone {}".format(name))
+
+
+def collapse(rows, timezone):
+    """
+    Group rows of a bulk event creation into recurring events.
+
+    Google expands a rule in the wall-clock time of the event time zone,
+    so rows collapse when they only differ in their start, share the same
+    duration and local time of day, and start a whole number of local days
+    apart at a constant step. A series crossing a DST change keeps its
+    local time, rows whose local time changes stay separate events.
+
+    Args:
+        - rows(list): (key, start, end) of every row, key holding whatever
+            else must match, start and end RFC3339 strings with offset.
+        - timezone(str): IANA time zone the events are created in.
+
+    Returns(list):
+        (row_indexes, rrule or None) of every event to create, in the order
+        of their first row.
+
+    """
+    tz = zone(timezone)
+    groups = {}
+    for i, (key, start, end) in enumerate(rows):
+        start, end = _parse(start), _parse(end)
+        local = start.astimezone(tz)
+        # The repeated hour of a DST end is never produced by a rule.
+        group = (key, end - start, local.time(), local.fold)
+        groups.setdefault(group, []).append((local.replace(tzinfo=None),
+                                             i))
+
+    events = []
+    for occurrences in groups.values():
+        occurrences.sort()
+        while len(occurrences) > 1:
+            steps = Counter(
+                b[0] - a[0] for a, b in zip(occurrences, occurrences[1:]))
+            steps = [step for step, _ in steps.most_common()
+                     if step.days > 0 and not step.seconds]
+            if not steps:
+                break
+            # Chain the rows by the most common step, leaving the rest for
+            # the next pass.
+            step = steps[0]
+            chains = {}
+            rest = []
+            for start, i in occurrences:
+                if start in chains:
+                    # Rows at the same time cannot share a rule.
+                    rest.append((start, i))
+                    continue
+                chain = chains.pop(start - step, [])
+                chain.append((start, i))
+                chains[start] = chain
+            for chain in chains.values():
+                if len(chain) > 1:
+                    events.append(([i for _, i in chain],
+                                   rule(step.days, len(chain))))
+                else:
+                    rest.extend(chain)
+            occurrences = sorted(rest)
+        events.extend(([i], None) for _, i in occurrences)
+    events.sort(key=lambda event: min(event[0]))
+    return events
+
+
+def _parse(value):
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        raise ValueError("Missing UTC offset in {}".format(value))
+    return parsed
@@ -0,0 +1,98 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from consts.mail import Mail
+from utils.logger import logger
+
+
+class RenderPool:
+    """
+    Process pool rendering and MIME encoding messages, mail merges and
+    large attachements, so CPU heavy encoding runs outside of the GIL of
+    the API workers. Processes are
+    spawned on first use, a forked copy of a threaded server is not safe.
+    """
+
+    def __init__(self, workers=Mail.RENDER_WORKERS):
+        """
+        Args:
+            - workers(int): number of processes.
+
+        """
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Get the executor, starting it on first use.
+
+        Returns(ProcessPoolExecutor):
+        """
+        with self._lock:
+            if self._executor is None:
+                logger.log_info("Starting {} render processes"
+                                .format(self.workers))
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def map(self, fn, items):
+        """
+        Map a function over items in the render processes, in order. If
+        the pool breaks, e.g. a process is killed, the remaining items are
+        mapped in this process and the pool is started again on next use.
+
+        Args:
+            - fn(function): picklable function of one item.
+            - items(list): picklable items.
+
+        Returns(generator):
+            results of every item.
+
+        """
+        done = 0
+        try:
+            for result in self.get().map(fn, items):
+                yield result
+                done += 1
+            return
+        except BrokenProcessPool as e:
+            logger.log_error("Render processes failed, rendering in "
+                             "process: {}".format(e))
+            self.shutdown()
+        for item in items[done:]:
+            yield fn(item)
+
+    def run(self, fn, *args):
+        """
+        Call a function in a render process and wait for its result. If
+        the pool breaks it is called in this process instead.
+
+        Args:
+            - fn(function): picklable function.
+            - args: picklable arguments.
+
+        Returns:
+            the result of the function.
+
+        """
+        try:
+            return self.get().submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            logger.log_error("Render processes failed, rendering in "
+                             "process: {}".format(e))
+            self.shutdown()
+        return fn(*args)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+render_pool = RenderPool()
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+
+from consts.mail import Mail
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+class SenderPool:
+    """
+    Accounts sharing outbound mail, so the per-user Gmail send quotas add
+    up. Every account keeps its own per second quota, see
+    email_helper.send_quota, and a rolling daily count of the messages
+    reserved on it.
+
+    Mail is spread to the accounts with the most daily quota left, so
+    concurrent requests and the shards of a mail merge land on different
+    accounts. A sender that is itself one of the accounts is always sent
+    from that account. Any other sender must be a send-as alias of every
+    account, Gmail rewrites the From of any other address.
+    """
+
+    def __init__(self, accounts=Mail.SENDER_ACCOUNTS,
+                 daily_limit=Mail.DAILY_LIMIT):
+        """
+        Args:
+            - accounts(list): accounts sending mail, as selected by the
+                X-Google-Account header.
+            - daily_limit(int): messages an account sends in 24 hours.
+
+        """
+        self.accounts = list(accounts)
+        self.daily_limit = daily_limit
+        self._addresses = {account.lower(): account
+                           for account in self.accounts}
+        self._reserved = {account: deque() for account in self.accounts}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.accounts)
+
+    def _remaining(self, account, now):
+        reserved = self._reserved[account]
+        while reserved and now - reserved[0][0] >= Mail.DAILY_WINDOW:
+            reserved.popleft()
+        return self.daily_limit - sum(count for _, count in reserved)
+
+    def remaining(self, account):
+        """
+        Get the messages an account can still send today.
+
+        Args:
+            - account(str): account of the pool.
+
+        Returns(int):
+        """
+        with self._lock:
+            return self._remaining(account, time.monotonic())
+
+    def shard(self, sender, count):
+        """
+        Reserve daily quota for the messages of a sender, spread over the
+        accounts with the most quota left.
+
+        Args:
+            - sender(str): sender's email address.
+            - count(int): number of messages.
+
+        Returns(list):
+            (account, messages) of every account used, empty when the
+            accounts cannot send all the messages today.
+
+        """
+        # Imported here, it pulls in the Google clients.
+        from helpers import email_helper
+
+        with self._lock:
+            now = time.monotonic()
+            pinned = self._addresses.get((sender or '').lower())
+            remaining = {account: self._remaining(account, now)
+                         for account in ([pinned] if pinned
+                                         else self.accounts)}
+            if sum(remaining.values()) < count:
+                logger.log_error("Not enough send quota left for {} "
+                                 "messages from {}".format(count, sender))
+                return []
+
+            shards = {}
+            left = count
+            while left:
+                active = sorted((account for account in remaining
+                                 if remaining[account]),
+                                key=lambda account: (
+                                    -remaining[account],
+                                    -email_helper.send_quota.get(account)
+                                    .available()))
+                share = max(1, left // len(active))
+                for account in active:
+                    taken = min(share, remaining[account], left)
+                    shards[account] = shards.get(account, 0) + taken
+                    remaining[account] -= taken
+                    left -= taken
+                    if not left:
+                        break
+
+            for account, taken in shards.items():
+                self._reserved[account].append((now, taken))
+                metrics.sender_messages.inc(taken, account=account)
+        return [(account, shards[account]) for account in self.accounts
+                if account in shards]
+
+    def choose(self, sender):
+        """
+        Reserve daily quota for a single message.
+
+        Args:
+            - sender(str): sender's email address.
+
+        Returns(str):
+            account sending the message, None when the quota is exhausted.
+
+        """
+        shards = self.shard(sender, 1)
+        return shards[0][0] if shards else None
+
+    def release(self, account, count):
+        """
+        Give back the quota of messages that were reserved but not sent.
+
+        Args:
+            - account(str): account the messages were reserved on.
+            - count(int): number of messages.
+
+        """
+        with self._lock:
+            reserved = self._reserved[account]
+            for i in range(len(reserved) - 1, -1, -1):
+                if not count:
+                    break
+                at, taken = reserved[i]
+                returned = min(taken, count)
+                reserved[i] = (at, taken - returned)
+                count -= returned
+
+
+sender_pool = SenderPool()
@@ -0,0 +1,97 @@
+import datetime
+import threading
+import time
+
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+
+from consts.auth import Auth
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.tracing import tracer
+
+
+class DelegatedCredentials:
+    """
+    Service account credentials impersonating users through domain-wide
+    delegation. One access token is minted per subject and kept in memory
+    until shortly before it expires, so no interactive flow nor token file is
+    ever involved.
+    """
+
+    def __init__(self, path, scopes, margin=Auth.TOKEN_EXPIRY_MARGIN):
+        """
+        Args:
+            - path(str): path of the service account key file.
+            - scopes(list): OAuth scopes delegated to the service account.
+            - margin(int): seconds before expiry at which tokens are renewed.
+
+        """
+        self.path = path
+        self.scopes = scopes
+        self.margin = datetime.timedelta(seconds=margin)
+        self._base = None
+        self._credentials = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, credentials):
+        return credentials is not None and credentials.token and\
+            credentials.expiry and\
+            credentials.expiry - self.margin > datetime.datetime.utcnow()
+
+    def _subject_lock(self, subject):
+        with self._lock:
+            if self._base is None:
+                self._base = service_account.Credentials\
+                    .from_service_account_file(self.path, scopes=self.scopes)
+            lock = self._locks.get(subject)
+            if lock is None:
+                lock = self._locks[subject] = threading.Lock()
+            return lock
+
+    def get(self, subject):
+        """
+        Get valid credentials impersonating a subject.
+
+        Args:
+            - subject(str): email address of the impersonated user. None
+                            uses the service account's own identity.
+
+        Returns(google.oauth2.service_account.Credentials):
+        """
+        credentials = self._credentials.get(subject)
+        if self._fresh(credentials):
+            return credentials
+
+        with self._subject_lock(subject):
+            credentials = self._credentials.get(subject)
+            if self._fresh(credentials):
+                return credentials
+            if credentials is None:
+                credentials = self._base.with_subject(subject)\
+                    if subject else self._base
+
+            start = time.perf_counter()
+            try:
+                with tracer.span('credentials.refresh', subject=subject):
+                    credentials.refresh(Request())
+            except Exception:
+                metrics.token_refresh.observe(time.perf_counter() - start,
+                                              status='error')
+                raise
+            metrics.token_refresh.observe(time.perf_counter() - start,
+                                          status='ok')
+            logger.log_info("Access token minted for {}".format(subject))
+            self._credentials[subject] = credentials
+            return credentials
+
+    def forget(self, subject):
+        """
+        Drop the cached token of a subject.
+        """
+        self._credentials.pop(subject, None)
+
+
+delegated_credentials = DelegatedCredentials(Auth.SERVICE_ACCOUNT_FILE,
+                                             Auth.SCOPES)
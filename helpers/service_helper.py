@@ -1,13 +1,19 @@
 import os
+import time
 
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient import errors
 
 from consts.auth import Auth
+from consts.backend import Backend
+from consts.transport import Transport
+from helpers import fake_google
+from helpers.service_account import delegated_credentials
+from helpers.token_store import get_token_store
+from helpers.transport import PooledHttp
 
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.tracing import tracer
 
 
 def get_auth(f):
@@ -21,40 +27,69 @@ def get_auth(f):
 
     Returns(function):
     """
-    def _auth():
+    def _auth(handler):
+        if Backend.MODE == Backend.FAKE:
+            return fake_google.FakeCredentials()
+        if Auth.MODE == Auth.SERVICE_ACCOUNT:
+            return delegated_credentials.get(handler.account or
+                                             Auth.DELEGATED_SUBJECT)
         os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = "1"
-        creds = None
-        if os.path.exists(Auth.CREDENTIALS_FILE):
-            try:
-                creds = Credentials.from_authorized_user_file(
-                    Auth.CREDENTIALS_FILE, Auth.SCOPES)
-            except Exception:
-                creds = None
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-                logger.log_info("Credentials refreshed")
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    Auth.CLIENT_SECRET_FILE, Auth.SCOPES)
-                creds = flow.run_local_server(port=0)
-            with open(Auth.CREDENTIALS_FILE, 'w+') as token:
-                token.write(creds.to_json())
+        credential_file_path = handler.credential_file_path or\
+            Auth.CREDENTIALS_FILE
+        store = get_token_store(credential_file_path, Auth.SCOPES)
+        creds = store.get()
+        if not creds:
+            if not Auth.INTERACTIVE:
+                logger.log_error("No valid credentials in {}"
+                                 .format(credential_file_path))
+                raise RuntimeError("No valid credentials and the "
+                                   "interactive authorization is disabled")
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(
+                Auth.CLIENT_SECRET_FILE, Auth.SCOPES)
+            creds = flow.run_local_server(port=0)
+            store.save(creds)
         return creds
 
     def wrapper(*args, **kwargs):
-        creds = _auth()
-        args[0].credentials = creds
-        return f(*args, **kwargs)
+        with tracer.span(f.__qualname__):
+            with tracer.span('get_auth'):
+                creds = _auth(args[0])
+            args[0].credentials = creds
+            if args[0].http is not None:
+                args[0].http.credentials = creds
+            return f(*args, **kwargs)
 
     return wrapper
 
 
+def _error_reason(error):
+    """
+    Get a short, low cardinality reason for a failed Google API call.
+
+    Args:
+        - error(Exception): error raised while executing the request.
+
+    Returns(str):
+        Google error reason (e.g. 'notFound'), HTTP status or exception name.
+
+    """
+    if isinstance(error, errors.HttpError):
+        details = error.error_details
+        if isinstance(details, list) and details and\
+                isinstance(details[0], dict) and details[0].get('reason'):
+            return details[0]['reason']
+        return str(error.resp.status)
+    return type(error).__name__
+
+
 class GoogleServiceHandler:
     """
     This class handles the creation of Google API service handler.
     """
 
+    account = credential_file_path = http = None
+
     @get_auth
     def __init__(self, service, version, credential_file_path):
         """
@@ -70,13 +105,103 @@ class GoogleServiceHandler:
 
         """
         logger.log_info("Initializing {} Handler...".format(service))
+        if Backend.MODE == Backend.FAKE:
+            start = time.perf_counter()
+            api = fake_google.backend.build(service, version)
+            metrics.handler_init.observe(time.perf_counter() - start,
+                                         service=service)
+            return self.credentials, api
+
         path = os.path.join(os.getcwd(), credential_file_path)
-        if not os.path.exists(path):
+        if Auth.MODE == Auth.OAUTH and not os.path.exists(path):
             logger.log_error("{} configuration file does not exists"
                              .format(path))
             return None, None
 
-        credentials = Credentials.from_authorized_user_file(path)
-        service = build(service, version, credentials=credentials)
+        # Only needed against the real API, and slow to import.
+        from googleapiclient.discovery import build
+
+        start = time.perf_counter()
+        with tracer.span('discovery.build', service=service, version=version):
+            if Transport.POOLED:
+                self.http = PooledHttp(self.credentials)
+                api = build(service, version, http=self.http)
+            else:
+                api = build(service, version, credentials=self.credentials)
+        metrics.handler_init.observe(time.perf_counter() - start,
+                                     service=service)
         logger.log_info("{} Handler initialized".format(service))
-        return credentials, service
+        return self.credentials, api
+
+    def _execute(self, request):
+        """
+        Execute a Google API request recording its latency and outcome.
+        Dropped connections, pool timeouts and retryable responses are
+        retried up to Transport.RETRIES times, with exponential backoff.
+
+        Args:
+            - request(HttpRequest): request built from the service resource.
+
+        Returns(dict):
+            The deserialized response of the request.
+
+        """
+        method = getattr(request, 'methodId', None) or 'unknown'
+        start = time.perf_counter()
+        with tracer.span(method, **{'http.method': request.method}) as span:
+            try:
+                response = request.execute(num_retries=Transport.RETRIES)
+            except Exception as e:
+                reason = _error_reason(e)
+                span.set_attribute('error.reason', reason)
+                metrics.google_calls.inc(method=method, status='error',
+                                         reason=reason)
+                raise
+            finally:
+                metrics.google_latency.observe(time.perf_counter() - start,
+                                               method=method)
+        metrics.google_calls.inc(method=method, status='ok', reason='')
+        return response
+
+    def _execute_batch(self, requests):
+        """
+        Execute many Google API requests in a single batch HTTP call,
+        recording the outcome of each of them.
+
+        Args:
+            - requests(list): requests built from the service resource, at
+                most as many as the API accepts in a batch.
+
+        Returns(list):
+            (response, exception) of every request, in the same order.
+
+        """
+        results = [(None, None)] * len(requests)
+
+        def _callback(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        batch = self.service.new_batch_http_request(callback=_callback)
+        for i, request in enumerate(requests):
+            batch.add(request, request_id=str(i))
+
+        start = time.perf_counter()
+        with tracer.span('batch', **{'http.method': 'POST',
+                                     'batch.size': len(requests)}) as span:
+            try:
+                batch.execute()
+            except Exception as e:
+                span.set_attribute('error.reason', _error_reason(e))
+                results = [(None, e)] * len(requests)
+        elapsed = time.perf_counter() - start
+
+        for request, (response, exception) in zip(requests, results):
+            method = getattr(request, 'methodId', None) or 'unknown'
+            metrics.google_latency.observe(elapsed, method=method)
+            if exception is None:
+                metrics.google_calls.inc(method=method, status='ok',
+                                         reason='')
+            else:
+                metrics.google_calls.inc(method=method, status='error',
+                                         reason=_error_reason(exception))
+        return results
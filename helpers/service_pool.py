@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+from consts.auth import Auth
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+class ServicePool:
+    """
+    LRU pool of built service handlers keyed by handler class and account,
+    so the discovery build of every handler is paid once per account instead
+    of once per request.
+    """
+
+    def __init__(self, max_size=Auth.POOL_SIZE):
+        """
+        Args:
+            - max_size(int): maximum number of handlers kept in memory.
+
+        """
+        self.max_size = max_size
+        self._handlers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, handler_class, account=None):
+        """
+        Get the handler of an account, building it on first use.
+
+        Args:
+            - handler_class(class): EmailHandler, MeetingHandler or
+                                    StorageHandler.
+            - account(str): account identifier, None for the default one.
+
+        Returns(GoogleServiceHandler):
+        """
+        key = (handler_class, account or '')
+        with self._lock:
+            handler = self._handlers.get(key)
+            if handler is not None:
+                self._handlers.move_to_end(key)
+                metrics.cache_requests.inc(cache='service_pool',
+                                           result='hit')
+                return handler
+        metrics.cache_requests.inc(cache='service_pool', result='miss')
+
+        handler = handler_class(Auth.credentials_file(account), account)
+        if not handler.service:
+            # Do not pool broken handlers, the next request retries.
+            return handler
+
+        with self._lock:
+            handler = self._handlers.setdefault(key, handler)
+            self._handlers.move_to_end(key)
+            while len(self._handlers) > self.max_size:
+                (evicted, evicted_account), _ = \
+                    self._handlers.popitem(last=False)
+                metrics.cache_evictions.inc(cache='service_pool')
+                logger.log_info("Evicted {} of account '{}' from the pool"
+                                .format(evicted.__name__, evicted_account))
+        return handler
+
+    def evict(self, account=None):
+        """
+        Drop every handler of an account, e.g. after its credentials were
+        revoked or replaced.
+
+        Args:
+            - account(str): account identifier, None for the default one.
+
+        """
+        with self._lock:
+            for key in [key for key in self._handlers
+                        if key[1] == (account or '')]:
+                del self._handlers[key]
+
+    def clear(self):
+        with self._lock:
+            self._handlers.clear()
+
+    def __len__(self):
+        return len(self._handlers)
+
+
+service_pool = ServicePool()
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+DAY = 24 * 60 * 60
+
+
+def parse_offset(offset):
+    """
+    Parse a fixed UTC offset.
+
+    Args:
+        - offset(str): '+HH:MM', '-HH:MM' or 'Z'.
+
+    Returns(int):
+        seconds east of UTC.
+
+    """
+    if offset in ('Z', 'z'):
+        return 0
+    if len(offset) != 6 or offset[0] not in '+-' or offset[3] != ':':
+        raise ValueError("Invalid UTC offset {}, expected '+HH:MM'"
+                         .format(offset))
+    seconds = parse_clock(offset[1:])
+    if seconds >= DAY:
+        raise ValueError("Invalid UTC offset {}".format(offset))
+    return -seconds if offset[0] == '-' else seconds
+
+
+def parse_clock(value):
+    """
+    Parse a time of the day.
+
+    Args:
+        - value(str): 'HH:MM', '24:00' being the end of the day.
+
+    Returns(int):
+        seconds since midnight.
+
+    """
+    try:
+        hours, minutes = value.split(':')
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        raise ValueError("Invalid time {}, expected 'HH:MM'".format(value))
+    if not (0 <= minutes < 60 and 0 <= hours * 60 + minutes <= 24 * 60):
+        raise ValueError("Invalid time {}, expected 'HH:MM'".format(value))
+    return hours * 3600 + minutes * 60
+
+
+def parse_time(value):
+    """
+    Parse an RFC3339 timestamp with an explicit offset.
+
+    Args:
+        - value(str): e.g. '2024-05-06T09:00:00-03:00'.
+
+    Returns(int):
+        seconds since the epoch.
+
+    """
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        raise ValueError("Missing UTC offset in {}".format(value))
+    return int(parsed.timestamp())
+
+
+def format_time(seconds, offset):
+    """
+    Format a timestamp as RFC3339 in a fixed UTC offset.
+
+    Args:
+        - seconds(int): seconds since the epoch.
+        - offset(int): seconds east of UTC.
+
+    Returns(str):
+    """
+    tz = timezone(timedelta(seconds=offset))
+    return datetime.fromtimestamp(int(seconds), tz).isoformat()
+
+
+def to_epoch(values):
+    """
+    Parse many UTC timestamps at once, as returned by freebusy.query when
+    asked for the 'UTC' time zone.
+
+    Args:
+        - values(list): 'YYYY-MM-DDTHH:MM:SS[.fff]Z' strings.
+
+    Returns(numpy.ndarray):
+        int64 seconds since the epoch.
+
+    """
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    return np.array([value[:19] for value in values],
+                    dtype='datetime64[s]').astype(np.int64)
+
+
+def gaps(starts, ends, time_min, time_max):
+    """
+    Merge intervals in a single vectorized sweep and return the holes left
+    between them within a window.
+
+    Sorted by start, the running maximum of the ends is the end of the
+    merged block each interval belongs to, so a gap opens wherever the
+    next start is past it.
+
+    Args:
+        - starts(numpy.ndarray): start of every interval, in any order.
+        - ends(numpy.ndarray): end of every interval.
+        - time_min(int): start of the window.
+        - time_max(int): end of the window.
+
+    Returns(tupple):
+        (starts, ends) of the gaps, sorted.
+
+    """
+    if len(starts) == 0:
+        return (np.array([time_min], dtype=np.int64),
+                np.array([time_max], dtype=np.int64))
+    order = np.argsort(starts, kind='stable')
+    starts = starts[order]
+    covered = np.maximum.accumulate(ends[order])
+    gap_starts = np.maximum(np.concatenate(([time_min], covered)), time_min)
+    gap_ends = np.minimum(np.concatenate((starts, [time_max])), time_max)
+    keep = gap_ends > gap_starts
+    return gap_starts[keep], gap_ends[keep]
+
+
+def working_hours(time_min, time_max, day_start, day_end, offset, weekdays):
+    """
+    Build the working hours within a window.
+
+    Args:
+        - time_min(int): start of the window.
+        - time_max(int): end of the window.
+        - day_start(int): seconds after local midnight work starts.
+        - day_end(int): seconds after local midnight work ends.
+        - offset(int): seconds east of UTC of the working hours.
+        - weekdays(list): working days, Monday being 0.
+
+    Returns(tupple):
+        (starts, ends) of the working hours, sorted.
+
+    """
+    first = (time_min + offset) // DAY
+    last = (time_max + offset) // DAY
+    days = np.arange(first, last + 1, dtype=np.int64)
+    # 1970-01-01 was a Thursday.
+    days = days[np.isin((days + 3) % 7, weekdays)]
+    starts = np.maximum(days * DAY + day_start - offset, time_min)
+    ends = np.minimum(days * DAY + day_end - offset, time_max)
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+
+def free_slots(starts, ends, time_min, time_max, duration, count,
+               work=None):
+    """
+    Find the first free slots of a given duration.
+
+    Args:
+        - starts(numpy.ndarray): start of every busy interval.
+        - ends(numpy.ndarray): end of every busy interval.
+        - time_min(int): start of the search.
+        - time_max(int): end of the search.
+        - duration(int): seconds of every slot.
+        - count(int): slots to return at most.
+        - work(tupple): (starts, ends) of the working hours, None allows
+            any time.
+
+    Returns(tupple):
+        (starts, ends) of the slots, sorted.
+
+    """
+    if work is not None:
+        # Time outside working hours is just more busy time.
+        off_starts, off_ends = gaps(work[0], work[1], time_min, time_max)
+        starts = np.concatenate((starts, off_starts))
+        ends = np.concatenate((ends, off_ends))
+    gap_starts, gap_ends = gaps(starts, ends, time_min, time_max)
+    fits = (gap_ends - gap_starts) // duration
+    gap_starts, fits = gap_starts[fits > 0], fits[fits > 0]
+    # Only expand the gaps holding the first count slots.
+    total = np.cumsum(fits)
+    needed = int(np.searchsorted(total, count)) + 1
+    gap_starts, fits, total = \
+        gap_starts[:needed], fits[:needed], total[:needed]
+    index = np.arange(int(total[-1]) if len(total) else 0, dtype=np.int64)
+    slot_starts = np.repeat(gap_starts, fits) + \
+        (index - np.repeat(total - fits, fits)) * duration
+    slot_starts = slot_starts[:count]
+    return slot_starts, slot_starts + duration
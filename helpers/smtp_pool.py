@@ -0,0 +1,244 @@
+import re
+import smtplib
+import ssl
+import threading
+import time
+
+from consts.mail import Mail
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+def _xoauth2(user, token):
+    """
+    Build the XOAUTH2 authentication of smtplib.SMTP.auth.
+
+    Args:
+        - user(str): email address of the account.
+        - token(str): OAuth access token of the account.
+
+    Returns(function):
+    """
+    initial = 'user={}\x01auth=Bearer {}\x01\x01'.format(user, token)
+
+    def _respond(challenge=None):
+        # A challenge carries the error details, answered with an empty line
+        # to get the final error.
+        return '' if challenge else initial
+
+    return _respond
+
+
+def _data(message):
+    """
+    Encode a message as the DATA of an SMTP transaction: CRLF line endings,
+    leading periods doubled and the final period.
+    """
+    message = re.sub(rb'\r?\n', b'\r\n', message)
+    message = re.sub(rb'(?m)^\.', b'..', message)
+    if not message.endswith(b'\r\n'):
+        message += b'\r\n'
+    return message + b'.\r\n'
+
+
+class SmtpPool:
+    """
+    Pool of authenticated SMTP connections, kept open between requests so a
+    message costs its transaction only, not the connection, TLS handshake
+    and authentication. Connections are bound to the account they logged in
+    as. When the server supports PIPELINING the envelope of a message is
+    sent in a single round trip.
+    """
+
+    def __init__(self, host=Mail.SMTP_HOST, port=Mail.SMTP_PORT,
+                 starttls=Mail.SMTP_STARTTLS, auth=Mail.SMTP_AUTH,
+                 size=Mail.SMTP_POOL_SIZE,
+                 idle_timeout=Mail.SMTP_IDLE_TIMEOUT,
+                 timeout=Mail.SMTP_TIMEOUT):
+        """
+        Args:
+            - host(str): SMTP server.
+            - port(int): SMTP port.
+            - starttls(bool): upgrade connections with STARTTLS.
+            - auth(str): 'xoauth2', 'login' or 'none'.
+            - size(int): connections open at most.
+            - idle_timeout(float): seconds an idle connection is kept.
+            - timeout(float): seconds to wait for the server.
+
+        """
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.auth = auth
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+
+    def _connect(self, user, secret):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.ehlo()
+            if self.starttls:
+                connection.starttls(context=ssl.create_default_context())
+                connection.ehlo()
+            if self.auth == Mail.XOAUTH2:
+                connection.auth('XOAUTH2', _xoauth2(user, secret))
+            elif self.auth == Mail.LOGIN:
+                connection.login(user, secret)
+        except Exception:
+            connection.close()
+            raise
+        logger.log_info("Opened an SMTP connection to {}:{} as {}"
+                        .format(self.host, self.port, user))
+        return connection
+
+    def _borrow(self, user, secret):
+        """
+        Take an idle connection of the account or open a new one, waiting
+        while all connections are busy.
+
+        Returns(tupple):
+            (connection, reused)
+
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                for entry in [entry for entry in self._idle
+                              if now - entry[2] > self.idle_timeout]:
+                    self._idle.remove(entry)
+                    self._open -= 1
+                    entry[1].close()
+                for entry in reversed(self._idle):
+                    if entry[0] == user:
+                        self._idle.remove(entry)
+                        metrics.cache_requests.inc(cache='smtp_pool',
+                                                   result='hit')
+                        return entry[1], True
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                if self._idle:
+                    # Close the longest idle connection of another account.
+                    self._open -= 1
+                    self._idle.pop(0)[1].close()
+                    continue
+                self._condition.wait()
+        metrics.cache_requests.inc(cache='smtp_pool', result='miss')
+        try:
+            return self._connect(user, secret), False
+        except Exception:
+            self._release(user, None)
+            raise
+
+    def _release(self, user, connection):
+        with self._condition:
+            if connection is None:
+                self._open -= 1
+            else:
+                self._idle.append((user, connection, time.monotonic()))
+            self._condition.notify()
+
+    def _transaction(self, connection, sender, recipients, message):
+        if not connection.has_extn('pipelining'):
+            connection.sendmail(sender, recipients, message)
+            return
+        connection.send('MAIL FROM:<{}>\r\n{}DATA\r\n'.format(
+            sender, ''.join('RCPT TO:<{}>\r\n'.format(recipient)
+                            for recipient in recipients)))
+        code, response = connection.getreply()
+        error = None if code == 250 else \
+            smtplib.SMTPSenderRefused(code, response, sender)
+        refused = {}
+        for recipient in recipients:
+            code, response = connection.getreply()
+            if code not in (250, 251):
+                refused[recipient] = (code, response)
+        if error is None and len(refused) == len(recipients):
+            error = smtplib.SMTPRecipientsRefused(refused)
+        code, response = connection.getreply()
+        if code != 354:
+            raise error or smtplib.SMTPDataError(code, response)
+        if error is not None:
+            # DATA was accepted anyway, end it without a message.
+            connection.send(b'.\r\n')
+            connection.getreply()
+            raise error
+        connection.send(_data(message))
+        code, response = connection.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+
+    def send(self, user, secret, messages):
+        """
+        Send messages over a single pooled connection of an account.
+
+        Args:
+            - user(str): account the connection logs in as.
+            - secret(str): OAuth access token or password of the account.
+            - messages(list): (sender, recipients, message) of every
+                message, message being the RFC822 bytes.
+
+        Returns(list):
+            None or the exception of every message, in the same order.
+
+        """
+        outcomes = []
+        try:
+            connection, reused = self._borrow(user, secret)
+        except (OSError, smtplib.SMTPException) as e:
+            logger.log_error("Error connecting to {}:{}: {}"
+                             .format(self.host, self.port, e))
+            return [e] * len(messages)
+
+        try:
+            for sender, recipients, message in messages:
+                while True:
+                    if connection is None:
+                        connection = self._connect(user, secret)
+                        reused = False
+                    try:
+                        self._transaction(connection, sender, recipients,
+                                          message)
+                        outcomes.append(None)
+                    except (smtplib.SMTPResponseException,
+                            smtplib.SMTPRecipientsRefused, ValueError) as e:
+                        outcomes.append(e)
+                        try:
+                            connection.rset()
+                        except OSError:
+                            pass
+                    except OSError as e:
+                        connection.close()
+                        connection = None
+                        if reused:
+                            # The server dropped the idle connection,
+                            # nothing was sent on it yet.
+                            continue
+                        outcomes.append(e)
+                    reused = False
+                    break
+        except OSError as e:
+            logger.log_error("Error reconnecting to {}:{}: {}"
+                             .format(self.host, self.port, e))
+            outcomes.extend([e] * (len(messages) - len(outcomes)))
+            connection = None
+        finally:
+            self._release(user, connection)
+        return outcomes
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for _, connection, _ in idle:
+            try:
+                connection.quit()
+            except OSError:
+                connection.close()
+
+
+smtp_pool = SmtpPool()
@@ -1,12 +1,26 @@
+import functools
+import hashlib
+import io
 import mimetypes
 import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from googleapiclient import errors
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 
+from consts.backend import Backend
+from consts.drive import Drive
+from consts.fields import Fields
 from consts.roles import Storage
+from helpers import archive, drive_query
+from helpers.dedup_index import dedup_index
 from helpers.service_helper import GoogleServiceHandler, get_auth
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.tracing import propagate, traced
 
 
 class StorageHandler(GoogleServiceHandler):
@@ -16,16 +30,19 @@ class StorageHandler(GoogleServiceHandler):
 
     credentials = service = None
 
-    def __init__(self, crendentials_file_path):
+    def __init__(self, crendentials_file_path, account=None):
         """
         Instanciate the Storage Handler using the provided credential file.
 
         Args:
             - credential_file_path(str): relative path of the credential file.
+            - account(str): account impersonated in service account mode.
 
         Returns(None)
 
         """
+        self.credential_file_path = crendentials_file_path
+        self.account = account
         self.credentials, self.service =\
             super().__init__("drive", "v3", crendentials_file_path)
 
@@ -36,114 +53,102 @@ class StorageHandler(GoogleServiceHandler):
     def share_folder(self, folder_name, email,
                      parent_name=None,
                      role=Storage.READ,
-                     notify=True):
+                     notify=True,
+                     folder_id=None,
+                     parent_id=None):
         """
         Share folder with an email owner with a certain role.
 
         Args:
             - folder_name(str): Name of the folder to share.
             - email(str): Email address to share the folder with.
+            - parent_name(str): Parent folder name.
             - role(str): read/write role.
             - notify(bool): Send notification by email or not.
+            - folder_id(str): ID of the folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
 
         Returns(tupple):
             (True, None) or (False, err_msg)
         """
         logger.log_info("Sharing folder {} with {}. Role {}"
-                        .format(folder_name, email, role))
-        body = {
-            'role': role,
-            'emailAddress': email,
-            'type': 'user'
-        }
-
-        if parent_name:
-            r, parent_id = self._get_folder_id(parent_name)
+                        .format(folder_id or folder_name, email, role))
+        if not folder_id:
+            r, folder_id = self._resolve_folder(folder_name, parent_name,
+                                                parent_id)
             if not r:
-                logger.log_error("Error sharing folder: {}".format(parent_id))
-                return False, parent_id
-        else:
-            parent_id = None
-
-        r, folder_id = self._get_folder_id(folder_name, parent_id=parent_id)
-        if not r:
-            logger.log_error("Error sharing folder: {}".format(parent_id))
-            return False, folder_id
-
-        if role == Storage.OWN:
-            transfer_ownership = True
-            move = True
-        else:
-            transfer_ownership = False
-            move = False
+                logger.log_error("Error sharing folder: {}".format(folder_id))
+                return False, folder_id
 
         try:
-            self.service.permissions().create(
-                body=body,
-                fileId=folder_id[0],
-                fields='id',
-                sendNotificationEmail=notify,
-                transferOwnership=transfer_ownership,
-                moveToNewOwnersRoot=move,
-                supportsAllDrives=True).execute()
+            self._execute(self._permission_request(folder_id, email, role,
+                                                   notify))
             logger.log_info("Successfully shared folder {}"
-                            .format(folder_name))
+                            .format(folder_id))
             return True, None
         except Exception as e:
             logger.log_error("Error sharing folder: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def create_folder(self, folder_name, parent_name=None):
+    def create_folder(self, folder_name, parent_name=None, parent_id=None):
         """
         Creates a folder using Google Drive API.
 
         Args:
             - folder_name(str): The name of the folder to create.
             - parent_name(list): Parent folder name.
+            - parent_id(str): Parent folder ID, skips its name lookup.
 
         Returns(Tupple):
-            (True, None) or (False, err_msg)
+            (True, folder_id) or (False, err_msg)
 
         """
         logger.log_info("Creating a new folder:\nName:{}\nParent IDs:{}"
-                        .format(folder_name, parent_name))
+                        .format(folder_name, parent_id or parent_name))
 
         body = {
             'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
+            'mimeType': Drive.FOLDER_MIME_TYPE
         }
-        if parent_name:
-            r, parent_id = self._get_folder_id(parent_name)
-            if r:
-                body['parents'] = parent_id
-            else:
-                return False, parent_id
+        r, parent_id = self._resolve_parent(parent_name, parent_id)
+        if not r:
+            return False, parent_id
+        if parent_id:
+            body['parents'] = [parent_id]
 
         try:
-            self.service.files().create(body=body, fields='id').execute()
+            r = self._execute(self.service.files().create(
+                body=body, fields=Fields.FILE_CREATE))
             logger.log_info("Folder {} successfully created"
                             .format(folder_name))
-            return True, None
+            return True, r['id']
         except errors.HttpError as e:
             logger.log_error("Error creating folder: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def create_file(self, file_name, parent_name=None):
+    def create_file(self, file_name, parent_name=None, parent_id=None,
+                    dedup=None, md5=None):
         """
         Creates a folder using Google Drive API.
 
         Args:
             - file_name(str): The name of the file to create.
             - parent_name(list): Parent folder name.
+            - parent_id(str): Parent folder ID, skips its name lookup.
+            - dedup(str): Drive.DEDUP_NAME skips the upload when a file
+                with the same name and content is in the parent folder.
+                Drive.DEDUP_ANY also copies a file with the same content
+                and another name, server side. None always uploads.
+            - md5(str): MD5 checksum of the file, computed if not given.
 
         Returns(Tupple):
-            (True, None) or (False, err_msg)
+            (True, file_id) or (False, err_msg)
 
         """
         logger.log_info("Creating a new file:\nName:{}\nParent IDs:{}"
-                        .format(file_name, parent_name))
+                        .format(file_name, parent_id or parent_name))
 
         mime_type, err = mimetypes.guess_type(file_name)
         if err:
@@ -156,113 +161,138 @@ class StorageHandler(GoogleServiceHandler):
         file_metadata = {
             'name': os.path.basename(file_name),
         }
-        if parent_name:
-            r, parent_id = self._get_folder_id(parent_name)
-            if r:
-                file_metadata['parents'] = parent_id
-            else:
-                return False, parent_id
+        r, parent_id = self._resolve_parent(parent_name, parent_id)
+        if not r:
+            return False, parent_id
+        if parent_id:
+            file_metadata['parents'] = [parent_id]
+
+        if dedup:
+            if dedup not in Drive.DEDUP_MODES:
+                return False, "Unknown dedup mode {}".format(dedup)
+            md5 = md5 or _md5(file_name)
+            try:
+                file_id = self._deduplicate(file_metadata['name'],
+                                            parent_id or 'root', md5, dedup,
+                                            os.path.getsize(file_name))
+            except errors.HttpError as e:
+                logger.log_error("Error deduplicating file: {}".format(e))
+                return False, str(e)
+            if file_id:
+                return True, file_id
 
         try:
-            self.service.files().create(
+            r = self._execute(self.service.files().create(
                 body=file_metadata,
-                media_body=media).execute()
+                media_body=media,
+                fields=Fields.FILE_CREATE))
             logger.log_info("File {} successfully created"
                             .format(file_name))
-            return True, None
+            if dedup:
+                metrics.dedup_uploads.inc(result='uploaded')
+                dedup_index.add((self.account, parent_id or 'root'), md5,
+                                file_metadata['name'], r['id'])
+            return True, r['id']
         except errors.HttpError as e:
             logger.log_error("Error creating file: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def delete_folder(self, folder_name, parent_name=None):
+    def delete_folder(self, folder_name=None, parent_name=None,
+                      folder_id=None, parent_id=None):
         """
         Delete a folder using google drive API.
 
         Args:
             - folder_name(str): The name of the folder to delete.
             - parent_name(list): Parent folder name.
+            - folder_id(str): ID of the folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
 
         Returns(Tupple):
             (True, None) or (False, err_msg)
 
         """
-        logger.log_info("Deleting folder {}".format(folder_name))
-        if parent_name:
-            r, parent_name = self._get_folder_id(parent_name)
+        logger.log_info("Deleting folder {}".format(folder_id or folder_name))
+        if not folder_id:
+            r, folder_id = self._resolve_folder(folder_name, parent_name,
+                                                parent_id)
             if not r:
-                return False, parent_name
-
-        r, folder_id = self._get_folder_id(folder_name, parent_id=parent_name)
-        if not r:
-            logger.log_error("Folder {} does not exist".format(folder_name))
-            return False, folder_id
+                logger.log_error("Folder {} does not exist"
+                                 .format(folder_name))
+                return False, folder_id
         try:
-            self.service.files().delete(fileId=folder_id[0]).execute()
-            logger.log_info("Folder {} deleted.".format(folder_name))
+            self._execute(self.service.files().delete(fileId=folder_id))
+            logger.log_info("Folder {} deleted.".format(folder_id))
             return True, None
         except errors.HttpError as e:
             logger.log_error("Error deleting folder: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def delete_file(self, file_name, parent_name=None):
+    def delete_file(self, file_name=None, parent_name=None, file_id=None,
+                    parent_id=None):
         """
         Delete a file using google drive API.
 
         Args:
             - file_name(str): The name of the file to delete.
             - parent_name(list): Parent folder name.
+            - file_id(str): ID of the file, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
 
         Returns(Tupple):
             (True, None) or (False, err_msg)
 
         """
-        logger.log_info("Deleting file {}".format(file_name))
-        if parent_name:
-            r, parent_name = self._get_folder_id(parent_name)
+        logger.log_info("Deleting file {}".format(file_id or file_name))
+        if not file_id:
+            r, parent_id = self._resolve_parent(parent_name, parent_id)
             if not r:
-                return False, parent_name
+                return False, parent_id
 
-        r, file_id = self._get_file_id(file_name, parent_id=parent_name)
-        if not r:
-            logger.log_error("File {} does not exist".format(file_name))
-            return False, file_id
+            r, file_id = self._get_file_id(file_name, parent_id=parent_id)
+            if not r:
+                logger.log_error("File {} does not exist".format(file_name))
+                return False, file_id
         try:
-            self.service.files().delete(fileId=file_id[0]).execute()
-            logger.log_info("Folder {} deleted.".format(file_name))
+            self._execute(self.service.files().delete(fileId=file_id))
+            logger.log_info("File {} deleted.".format(file_id))
             return True, None
         except errors.HttpError as e:
             logger.log_error("Error deleting file: {}".format(e))
             return False, str(e)
 
     @get_auth
-    def exist(self, name, parent_name=None):
+    def exist(self, name=None, parent_name=None, file_id=None,
+              parent_id=None):
         """
         Check whether a test/file exists.
 
         Args:
             - name(str): Name of the file/folder to query.
             - parent_name(list): Parent folder name.
+            - file_id(str): ID of the file/folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
 
         Returns(tupple):
             (res, err_msg)
 
         """
-        logger.log_info("Checking file {} existance".format(name))
-        query = "name='{}' ".format(name)
-        if parent_name:
-            r, parent_id = self._get_folder_id(parent_name)
-            if not r:
-                return None, parent_id
-            query += "and {} in parents".format(parent_id)
+        if file_id:
+            return self._exist_id(file_id)
 
-        fields = "nextPageToken, files(id)"
+        logger.log_info("Checking file {} existance".format(name))
+        r, parent_id = self._resolve_parent(parent_name, parent_id)
+        if not r:
+            return None, parent_id
+        query = drive_query.clause(name, parent_id)
 
         logger.log_info("Querying {}".format(query))
         try:
-            r = self.service.files().list(q=query, fields=fields,
-                                          spaces='drive').execute()
+            r = self._execute(self.service.files().list(
+                q=query, fields=Fields.FILE_LOOKUP, pageSize=1,
+                spaces='drive'))
             items = r.get('files', [])
             if items:
                 return True, None
@@ -271,38 +301,831 @@ class StorageHandler(GoogleServiceHandler):
             logger.log_error("Error querying file: {}".format(e))
             return None, str(e)
 
-    def _get_file_id(self, file_name, parent_id=None):
+    @get_auth
+    def copy_tree(self, folder_name=None, parent_name=None, folder_id=None,
+                  parent_id=None, destination_id=None, name=None):
         """
-        Query the file id of a folder by file name.
+        Copy a folder and everything below it. Drive can not copy folders,
+        so they are recreated while the files are copied, level by level.
 
         Args:
-            - file_name(str): The name of the file we want to get the id
-                                from.
+            - folder_name(str): Name of the folder to copy.
+            - parent_name(str): Parent folder name.
+            - folder_id(str): ID of the folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
+            - destination_id(str): ID of the folder to copy into. Defaults to
+                the parent of the copied folder.
+            - name(str): Name of the copy. Defaults to the copied one.
+
+        Returns(tupple):
+            (True, report) or (False, err_msg). The report holds the
+            'folder_id' of the copy, the number of items 'done' and the
+            'failed' ones with their error. The content of a folder that
+            failed to be copied is skipped.
+
+        """
+        logger.log_info("Copying folder tree {}"
+                        .format(folder_id or folder_name))
+        if not folder_id:
+            r, folder_id = self._resolve_folder(folder_name, parent_name,
+                                                parent_id)
+            if not r:
+                logger.log_error("Error copying folder: {}".format(folder_id))
+                return False, folder_id
+
+        try:
+            root = self._execute(self.service.files().get(
+                fileId=folder_id, fields=Fields.TREE_ROOT,
+                supportsAllDrives=True))
+            body = {'name': name or root['name'],
+                    'mimeType': Drive.FOLDER_MIME_TYPE}
+            if destination_id or root.get('parents'):
+                body['parents'] = [destination_id] if destination_id else\
+                    root['parents']
+            copy = self._execute(self.service.files().create(
+                body=body, fields=Fields.FILE_CREATE))
+
+            # Source ID -> ID of its copy.
+            copies = {folder_id: copy['id']}
+            report = self._tree_report(copy['id'])
+            with ThreadPoolExecutor(
+                    self._workers(Drive.TREE_WORKERS)) as executor:
+                for children in self._walk(
+                        folder_id, executor,
+                        descend=lambda folder: folder['id'] in copies):
+                    calls = []
+                    for child in children:
+                        parent = next(parent_id
+                                      for parent_id in child['parents']
+                                      if parent_id in copies)
+                        body = {'name': child['name'],
+                                'parents': [copies[parent]]}
+                        if child['mimeType'] == Drive.FOLDER_MIME_TYPE:
+                            body['mimeType'] = Drive.FOLDER_MIME_TYPE
+                            request = self.service.files().create(
+                                body=body, fields=Fields.FILE_CREATE)
+                        else:
+                            request = self.service.files().copy(
+                                fileId=child['id'], body=body,
+                                fields=Fields.FILE_CREATE,
+                                supportsAllDrives=True)
+                        calls.append((child['id'], request))
+                    responses = self._run_batches(calls, executor, report)
+                    copies.update((node_id, response['id'])
+                                  for node_id, response in responses.items())
+            logger.log_info("Folder tree {} copied: {}"
+                            .format(folder_id, report))
+            return True, report
+        except Exception as e:
+            logger.log_error("Error copying folder: {}".format(e))
+            return False, str(e)
+
+    @get_auth
+    def delete_tree(self, folder_name=None, parent_name=None,
+                    folder_id=None, parent_id=None):
+        """
+        Delete a folder and everything below it. Drive deletes the items
+        below a folder with it, so the whole tree goes in a single call
+        instead of one per item. Items of other owners are not deleted,
+        they are left without a parent.
+
+        Args:
+            - folder_name(str): Name of the folder to delete.
+            - parent_name(str): Parent folder name.
+            - folder_id(str): ID of the folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
+
+        Returns(tupple):
+            (True, report) or (False, err_msg). The report holds the
+            'folder_id', 'done' 1 once the folder is deleted and the
+            folder in 'failed' with its error otherwise.
+
+        """
+        logger.log_info("Deleting folder tree {}"
+                        .format(folder_id or folder_name))
+        if not folder_id:
+            r, folder_id = self._resolve_folder(folder_name, parent_name,
+                                                parent_id)
+            if not r:
+                logger.log_error("Error deleting folder: {}"
+                                 .format(folder_id))
+                return False, folder_id
+
+        report = self._tree_report(folder_id)
+        try:
+            self._execute(self.service.files().delete(
+                fileId=folder_id, supportsAllDrives=True))
+            report['done'] += 1
+        except errors.HttpError as e:
+            report['failed'][folder_id] = str(e)
+        except Exception as e:
+            logger.log_error("Error deleting folder: {}".format(e))
+            return False, str(e)
+        logger.log_info("Folder tree {} deleted: {}".format(folder_id, report))
+        return True, report
+
+    @get_auth
+    def share_tree(self, folder_name, email, parent_name=None,
+                   role=Storage.READ, notify=True, folder_id=None,
+                   parent_id=None):
+        """
+        Share a folder and every item below it, each with its own
+        permission, so access is kept when items are moved out of it.
+
+        Args:
+            - folder_name(str): Name of the folder to share.
+            - email(str): Email address to share the folder with.
+            - parent_name(str): Parent folder name.
+            - role(str): read/write role.
+            - notify(bool): Send a notification email, for the folder only.
+            - folder_id(str): ID of the folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
+
+        Returns(tupple):
+            (True, report) or (False, err_msg). The report holds the
+            'folder_id', the number of items 'done' and the 'failed' ones
+            with their error.
+
+        """
+        logger.log_info("Sharing folder tree {} with {}. Role {}"
+                        .format(folder_id or folder_name, email, role))
+        if not folder_id:
+            r, folder_id = self._resolve_folder(folder_name, parent_name,
+                                                parent_id)
+            if not r:
+                logger.log_error("Error sharing folder: {}".format(folder_id))
+                return False, folder_id
+
+        report = self._tree_report(folder_id)
+        try:
+            with ThreadPoolExecutor(
+                    self._workers(Drive.TREE_WORKERS)) as executor:
+                calls = [(folder_id, self._permission_request(
+                    folder_id, email, role, notify))]
+                for children in self._walk(folder_id, executor):
+                    calls.extend((child['id'], self._permission_request(
+                        child['id'], email, role, False))
+                        for child in children)
+                    self._run_batches(calls, executor, report)
+                    calls = []
+            logger.log_info("Folder tree {} shared: {}"
+                            .format(folder_id, report))
+            return True, report
+        except Exception as e:
+            logger.log_error("Error sharing folder: {}".format(e))
+            return False, str(e)
+
+    @get_auth
+    def unshare_tree(self, folder_name, email, parent_name=None,
+                     folder_id=None, parent_id=None):
+        """
+        Remove the permissions of an email address from a folder and every
+        item below it. An item is done once all its permissions for the
+        address are removed, or when it has none.
+
+        Args:
+            - folder_name(str): Name of the folder to unshare.
+            - email(str): Email address to remove.
+            - parent_name(str): Parent folder name.
+            - folder_id(str): ID of the folder, skips the name lookup.
+            - parent_id(str): Parent folder ID, skips its name lookup.
+
+        Returns(tupple):
+            (True, report) or (False, err_msg). The report holds the
+            'folder_id', the number of items 'done' and the 'failed' ones
+            with their error.
+
+        """
+        logger.log_info("Unsharing folder tree {} with {}"
+                        .format(folder_id or folder_name, email))
+        if not folder_id:
+            r, folder_id = self._resolve_folder(folder_name, parent_name,
+                                                parent_id)
+            if not r:
+                logger.log_error("Error unsharing folder: {}"
+                                 .format(folder_id))
+                return False, folder_id
+
+        report = self._tree_report(folder_id)
+        email = email.lower()
+        try:
+            with ThreadPoolExecutor(
+                    self._workers(Drive.TREE_WORKERS)) as executor:
+                nodes = [folder_id]
+                for children in self._walk(folder_id, executor):
+                    nodes.extend(child['id'] for child in children)
+                    matches = self._find_permissions(nodes, email, executor,
+                                                     report)
+                    deleted = self._tree_report(folder_id)
+                    self._run_batches(
+                        [(node_id, self.service.permissions().delete(
+                            fileId=node_id, permissionId=permission_id,
+                            supportsAllDrives=True))
+                         for node_id, permission_ids in matches.items()
+                         for permission_id in permission_ids],
+                        executor, deleted)
+                    for node_id in matches:
+                        if node_id in deleted['failed']:
+                            report['failed'][node_id] =\
+                                deleted['failed'][node_id]
+                        else:
+                            report['done'] += 1
+                    nodes = []
+            logger.log_info("Folder tree {} unshared: {}"
+                            .format(folder_id, report))
+            return True, report
+        except Exception as e:
+            logger.log_error("Error unsharing folder: {}".format(e))
+            return False, str(e)
+
+    def _find_permissions(self, nodes, email, executor, report):
+        """
+        List the permissions of tree nodes, following every page, and pick
+        those of an email address.
+
+        Args:
+            - nodes(list): IDs of the nodes.
+            - email(str): lowercase email address.
+            - executor(ThreadPoolExecutor): runs the batches.
+            - report(dict): report of the operation, the nodes whose
+                permissions could not be listed are added to its failed ones.
+
+        Returns(dict):
+            {node_id: [permission_id]} of the nodes listed.
+
+        """
+        matches = {node_id: [] for node_id in nodes}
+        tokens = dict.fromkeys(nodes)
+        while tokens:
+            lookup = self._tree_report(None)
+            responses = self._run_batches(
+                [(node_id, self.service.permissions().list(
+                    fileId=node_id, fields=Fields.PERMISSION_LIST,
+                    pageSize=Drive.PERMISSION_PAGE_SIZE, pageToken=token,
+                    supportsAllDrives=True))
+                 for node_id, token in tokens.items()], executor, lookup)
+            for node_id, error in lookup['failed'].items():
+                report['failed'][node_id] = error
+                del matches[node_id]
+            tokens = {}
+            for node_id, response in responses.items():
+                matches[node_id].extend(
+                    permission['id']
+                    for permission in response.get('permissions', [])
+                    if permission.get('emailAddress', '').lower() == email)
+                if response.get('nextPageToken'):
+                    tokens[node_id] = response['nextPageToken']
+        return matches
+
+    @get_auth
+    def upload_archive(self, f, parent_name=None, parent_id=None):
+        """
+        Upload the content of a zip or tar archive, recreating its folder
+        hierarchy. Members are read one after the other straight from the
+        archive and uploaded concurrently. Every folder is created once.
+        An archive whose content is over the Drive.ARCHIVE_MAX_MEMBER_SIZE
+        or Drive.ARCHIVE_MAX_TOTAL_SIZE limits raises
+        archive.ArchiveTooLarge, a tar archive possibly after some of its
+        members were uploaded.
+
+        Args:
+            - f(file): seekable binary file holding the archive.
+            - parent_name(str): Name of the folder to upload into.
+            - parent_id(str): ID of the folder to upload into, skips the
+                name lookup. Defaults to the root folder.
+
+        Returns(tupple):
+            (True, report) or (False, err_msg). The report holds the
+            'folder_id' uploaded into, the number of files 'done', the
+            'ids' of the files and folders created by path and the 'failed'
+            paths with their error.
+
+        """
+        logger.log_info("Uploading archive into {}"
+                        .format(parent_id or parent_name or 'root'))
+        if not archive.detect(f):
+            logger.log_error("Unsupported archive")
+            return False, "Unsupported archive, expected a zip or tar file"
+        r, parent_id = self._resolve_parent(parent_name, parent_id)
+        if not r:
+            logger.log_error("Error uploading archive: {}".format(parent_id))
+            return False, parent_id
+
+        parent_id = parent_id or 'root'
+        report = {'folder_id': parent_id, 'done': 0, 'ids': {}, 'failed': {}}
+        # Archive path -> folder ID, None if it could not be created.
+        folders = {'': parent_id}
+        lock = threading.Lock()
+        workers = self._workers(Drive.UPLOAD_WORKERS)
+        # Bounds the members read from the archive but not uploaded yet,
+        # each kept in memory up to the resumable upload threshold.
+        slots = threading.BoundedSemaphore(2 * workers)
+        upload = propagate(self._upload_member)
+
+        def _uploaded(path, future):
+            slots.release()
+            with lock:
+                try:
+                    report['ids'][path] = future.result()
+                    report['done'] += 1
+                except Exception as e:
+                    report['failed'][path] = str(e)
+                logger.log_info("Archive member {} processed: {} files done, "
+                                "{} failed".format(path, report['done'],
+                                                   len(report['failed'])))
+
+        try:
+            with ThreadPoolExecutor(workers) as executor:
+                for path, is_dir, open_member in archive.members(
+                        f, Drive.ARCHIVE_MAX_MEMBER_SIZE,
+                        Drive.ARCHIVE_MAX_TOTAL_SIZE):
+                    if is_dir:
+                        self._archive_folder(path, folders, report, lock)
+                        continue
+                    folder_path, _, name = path.rpartition('/')
+                    folder_id = self._archive_folder(folder_path, folders,
+                                                     report, lock)
+                    if folder_id is None:
+                        with lock:
+                            report['failed'][path] =\
+                                "Folder {} was not created".format(
+                                    folder_path)
+                        continue
+                    data = tempfile.SpooledTemporaryFile(
+                        Drive.RESUMABLE_THRESHOLD)
+                    with open_member() as member:
+                        shutil.copyfileobj(member, data)
+                    slots.acquire()
+                    future = executor.submit(upload, name, data, folder_id)
+                    future.add_done_callback(
+                        functools.partial(_uploaded, path))
+        except archive.ArchiveTooLarge as e:
+            logger.log_error("Error uploading archive: {}".format(e))
+            raise
+        except Exception as e:
+            logger.log_error("Error uploading archive: {}".format(e))
+            return False, str(e)
+        logger.log_info("Archive uploaded into {}: {} files, {} failed"
+                        .format(parent_id, report['done'],
+                                len(report['failed'])))
+        return True, report
+
+    def _archive_folder(self, path, folders, report, lock):
+        """
+        Get the ID of an archive folder, creating it and its parents the
+        first time.
+
+        Args:
+            - path(str): path of the folder in the archive.
+            - folders(dict): folder IDs by path, updated in place.
+            - report(dict): report of the upload, updated in place.
+            - lock(Lock): guards the report.
+
+        Returns(str):
+            ID of the folder or None if it could not be created.
+
+        """
+        if path in folders:
+            return folders[path]
+        parent_path, _, name = path.rpartition('/')
+        parent_id = self._archive_folder(parent_path, folders, report, lock)
+        folders[path] = None
+        if parent_id is None:
+            return None
+        try:
+            r = self._execute(self.service.files().create(
+                body={'name': name, 'mimeType': Drive.FOLDER_MIME_TYPE,
+                      'parents': [parent_id]},
+                fields=Fields.FILE_CREATE))
+            folders[path] = r['id']
+            with lock:
+                report['ids'][path] = r['id']
+        except errors.HttpError as e:
+            logger.log_error("Error creating folder {}: {}".format(path, e))
+            with lock:
+                report['failed'][path] = str(e)
+        return folders[path]
+
+    def _upload_member(self, name, data, folder_id):
+        """
+        Upload the content of an archive member, in chunks when it is over
+        the resumable upload threshold. The file is closed once uploaded.
+
+        Args:
+            - name(str): file name.
+            - data(file): seekable binary file with the content.
+            - folder_id(str): ID of the folder to upload into.
+
+        Returns(str):
+            ID of the new file.
+
+        """
+        mime_type = mimetypes.guess_type(name)[0] or\
+            'application/octet-stream'
+        with data:
+            size = data.seek(0, io.SEEK_END)
+            data.seek(0)
+            media = MediaIoBaseUpload(
+                data, mimetype=mime_type,
+                chunksize=Drive.UPLOAD_CHUNK_SIZE,
+                resumable=size > Drive.RESUMABLE_THRESHOLD)
+            r = self._execute(self.service.files().create(
+                body={'name': name, 'parents': [folder_id]},
+                media_body=media,
+                fields=Fields.FILE_CREATE))
+        return r['id']
+
+    @traced
+    def _deduplicate(self, name, parent_id, md5, mode, size):
+        """
+        Find a file of the parent folder with the same content, so the
+        upload can be skipped or replaced by a server side copy.
+
+        Args:
+            - name(str): name of the file to upload.
+            - parent_id(str): ID of the parent folder.
+            - md5(str): MD5 checksum of the content.
+            - mode(str): Drive.DEDUP_NAME or Drive.DEDUP_ANY.
+            - size(int): size of the content, in bytes.
+
+        Returns(str):
+            ID of the file with the content or None if it must be uploaded.
+
+        """
+        folder = (self.account, parent_id)
+        complete, names = dedup_index.lookup(folder, md5)
+        if not complete and not (mode == Drive.DEDUP_NAME and name in names):
+            if mode == Drive.DEDUP_ANY:
+                query = drive_query.clause(parent_id=parent_id, folder=False)
+                dedup_index.load(folder, self._list_all(
+                    query, Fields.DEDUP_LIST))
+            else:
+                query = drive_query.clause(name, parent_id, folder=False)
+                for file in self._list_all(query, Fields.DEDUP_LIST):
+                    if file.get('md5Checksum'):
+                        dedup_index.add(folder, file['md5Checksum'],
+                                        file['name'], file['id'])
+            complete, names = dedup_index.lookup(folder, md5)
+
+        candidates = sorted(names.items(), key=lambda item: item[0] != name)
+        for candidate, file_id in candidates:
+            if mode == Drive.DEDUP_NAME and candidate != name:
+                continue
+            if not self._same_content(file_id, parent_id, md5):
+                dedup_index.discard(folder, md5, candidate)
+                continue
+            if candidate == name:
+                logger.log_info("File {} already uploaded as {}"
+                                .format(name, file_id))
+                metrics.dedup_uploads.inc(result='skipped')
+                metrics.dedup_saved_bytes.inc(size)
+                return file_id
+            r = self._execute(self.service.files().copy(
+                fileId=file_id, body={'name': name, 'parents': [parent_id]},
+                fields=Fields.FILE_CREATE, supportsAllDrives=True))
+            logger.log_info("File {} copied from {} instead of uploaded"
+                            .format(name, file_id))
+            metrics.dedup_uploads.inc(result='copied')
+            metrics.dedup_saved_bytes.inc(size)
+            dedup_index.add(folder, md5, name, r['id'])
+            return r['id']
+        return None
+
+    def _same_content(self, file_id, parent_id, md5):
+        """
+        Check an indexed file still has the content and sits in the folder.
+
+        Returns(bool):
+        """
+        try:
+            r = self._execute(self.service.files().get(
+                fileId=file_id, fields=Fields.DEDUP_CHECK,
+                supportsAllDrives=True))
+        except errors.HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
+        return not r.get('trashed') and r.get('md5Checksum') == md5 and\
+            (parent_id == 'root' or parent_id in r.get('parents', []))
+
+    def _exist_id(self, file_id):
+        """
+        Check whether a file/folder exists, by ID.
+
+        Args:
+            - file_id(str): ID of the file/folder to query.
+
+        Returns(tupple):
+            (res, err_msg)
+
+        """
+        logger.log_info("Checking file {} existance".format(file_id))
+        try:
+            r = self._execute(self.service.files().get(
+                fileId=file_id, fields=Fields.FILE_EXISTS,
+                supportsAllDrives=True))
+            return not r.get('trashed', False), None
+        except errors.HttpError as e:
+            if e.resp.status == 404:
+                return False, None
+            logger.log_error("Error querying file: {}".format(e))
+            return None, str(e)
+
+    def _permission_request(self, file_id, email, role, notify):
+        """
+        Build the request granting an email address a role on a file.
+
+        Returns(HttpRequest):
+        """
+        body = {
+            'role': role,
+            'emailAddress': email,
+            'type': 'user'
+        }
+        if role == Storage.OWN:
+            transfer_ownership = True
+            move = True
+        else:
+            transfer_ownership = False
+            move = False
+        return self.service.permissions().create(
+            body=body,
+            fileId=file_id,
+            fields=Fields.PERMISSION_CREATE,
+            sendNotificationEmail=notify,
+            transferOwnership=transfer_ownership,
+            moveToNewOwnersRoot=move,
+            supportsAllDrives=True)
+
+    def _workers(self, workers):
+        """
+        Threads of a parallel operation. httplib2 connections can not be
+        shared between threads, so only the pooled transport runs in
+        parallel.
+
+        Args:
+            - workers(int): threads wanted.
+
+        Returns(int):
+        """
+        if Backend.MODE == Backend.FAKE or self.http is not None:
+            return workers
+        return 1
+
+    @staticmethod
+    def _tree_report(folder_id):
+        return {'folder_id': folder_id, 'done': 0, 'failed': {}}
+
+    def _list_all(self, query, fields=Fields.TREE_LIST):
+        """
+        List every file matching a query, following pagination.
+
+        Args:
+            - query(str): Drive 'q' parameter.
+            - fields(str): field mask, with nextPageToken.
+
+        Returns(list):
+            The files, by default with their id, name, mimeType and parents.
+
+        """
+        items = []
+        page_token = None
+        while True:
+            r = self._execute(self.service.files().list(
+                q=query, fields=fields, pageSize=Drive.PAGE_SIZE,
+                pageToken=page_token, spaces='drive'))
+            items.extend(r.get('files', []))
+            page_token = r.get('nextPageToken')
+            if not page_token:
+                return items
+
+    def _walk(self, folder_id, executor, descend=None):
+        """
+        Walk a folder tree breadth first. The children of a whole level are
+        listed with OR'ed queries, run in parallel.
+
+        Args:
+            - folder_id(str): ID of the root folder.
+            - executor(ThreadPoolExecutor): runs the queries.
+            - descend(function): descend(folder) -> bool, whether to walk
+                into a folder. Called once the caller handled its level.
+
+        Returns(generator):
+            Children (id, name, mimeType, parents) of every level.
+
+        """
+        seen = {folder_id}
+        level = [folder_id]
+        while level:
+            clauses = [drive_query.clause(parent_id=parent_id, trashed=None)
+                       for parent_id in level]
+            queries = drive_query.chunks(clauses, drive_query.clause())
+            children = []
+            for items in executor.map(propagate(self._list_all), queries):
+                for item in items:
+                    if item['id'] not in seen:
+                        seen.add(item['id'])
+                        children.append(item)
+            yield children
+            level = [child['id'] for child in children
+                     if child['mimeType'] == Drive.FOLDER_MIME_TYPE and
+                     (descend is None or descend(child))]
+
+    def _run_batches(self, calls, executor, report):
+        """
+        Execute the calls of a tree level in parallel batch requests,
+        recording every outcome in the report.
+
+        Args:
+            - calls(list): (node_id, request) pairs.
+            - executor(ThreadPoolExecutor): runs the batches.
+            - report(dict): report of the operation, updated in place.
+
+        Returns(dict):
+            {node_id: response} of the successful calls.
+
+        """
+        size = Drive.BATCH_SIZE
+        batches = [calls[i:i + size] for i in range(0, len(calls), size)]
+        execute = propagate(self._execute_batch)
+        responses = {}
+        results = executor.map(
+            lambda batch: execute([request for _, request in batch]),
+            batches)
+        for i, (batch, outcomes) in enumerate(zip(batches, results)):
+            for (node_id, _), (response, exception) in zip(batch, outcomes):
+                if exception is None:
+                    responses[node_id] = response
+                    report['done'] += 1
+                else:
+                    report['failed'][node_id] = str(exception)
+            logger.log_info("Batch {} of {} run: {} done, {} failed"
+                            .format(i + 1, len(batches), report['done'],
+                                    len(report['failed'])))
+        return responses
+
+    def _resolve_parent(self, parent_name=None, parent_id=None):
+        """
+        Resolve the parent folder of a call, by ID when known or by name.
+
+        Args:
+            - parent_name(str): Parent folder name.
             - parent_id(str): Parent folder ID.
 
         Returns(tupple):
-            (True, [id]) or (False, err_msg)
+            (True, parent_id or None) or (False, err_msg)
 
         """
-        query = "name='{}'".format(file_name) +\
-                " and trashed=false"
-        if parent_id:
-            query += " and {} in parents".format(parent_id)
+        if parent_id or not parent_name:
+            return True, parent_id
+        return self._get_folder_id(parent_name)
 
-        fields = "nextPageToken, files(id)"
-        logger.log_info("Querying file {}".format(query))
+    def _resolve_folder(self, folder_name, parent_name=None, parent_id=None):
+        """
+        Resolve the ID of a folder by its name and parent folder.
+
+        Args:
+            - folder_name(str): Name of the folder.
+            - parent_name(str): Parent folder name.
+            - parent_id(str): Parent folder ID.
+
+        Returns(tupple):
+            (True, folder_id) or (False, err_msg)
+
+        """
+        r, parent_id = self._resolve_parent(parent_name, parent_id)
+        if not r:
+            return False, parent_id
+        return self._get_folder_id(folder_name, parent_id=parent_id)
+
+    @get_auth
+    def get_ids(self, pairs, folders=None):
+        """
+        Resolve the IDs of many files/folders by name, with one OR'ed
+        files().list call per chunk of names instead of one call per name.
+
+        Args:
+            - pairs(list): (name, parent_id) tuples. A None parent_id
+                matches the name under any parent.
+            - folders(bool): True resolves only folders, False only files
+                and None both.
+
+        Returns(tupple):
+            (True, {(name, parent_id): id}) or (False, err_msg).
+            Names not found are left out of the dict.
+
+        """
+        logger.log_info("Resolving the IDs of {} names".format(len(pairs)))
         try:
-            r = self.service.files().list(q=query,  fields=fields,
-                                          spaces='drive').execute()
-            items = r.get('files', [])
-            if not items:
-                logger.log_error("No file found")
-                return False, "No file found"
-            file_id = items[0]['id']
-            return True, [file_id]
+            return True, self._resolve_ids(pairs, folders)
+        except Exception as e:
+            logger.log_error("Error resolving IDs: {}".format(e))
+            return False, str(e)
+
+    @get_auth
+    def index_folders(self, folder_names):
+        """
+        Resolve folders by name and load their files in the dedup index, so
+        the first deduplicated uploads into them do not list them.
+
+        Args:
+            - folder_names(list): names of the folders.
+
+        Returns(tupple):
+            (True, {name: folder_id}) or (False, err_msg). Folders not found
+            are left out of the dict.
+
+        """
+        logger.log_info("Indexing {} folders".format(len(folder_names)))
+        try:
+            found = self._resolve_ids([(name, None) for name in folder_names],
+                                      folders=True)
+            for folder_id in found.values():
+                query = drive_query.clause(parent_id=folder_id, folder=False)
+                dedup_index.load((self.account, folder_id), self._list_all(
+                    query, Fields.DEDUP_LIST))
+        except Exception as e:
+            logger.log_error("Error indexing folders: {}".format(e))
+            return False, str(e)
+        return True, {name: folder_id for (name, _), folder_id in
+                      found.items()}
+
+    @traced
+    def _resolve_ids(self, pairs, folders=None):
+        """
+        Resolve the IDs of many files/folders by name.
+
+        Args:
+            - pairs(list): (name, parent_id) tuples.
+            - folders(bool): True resolves only folders, False only files
+                and None both.
+
+        Returns(dict):
+            {(name, parent_id): id} of the names found.
+
+        """
+        pairs = list(dict.fromkeys(pairs))
+        parents = {}
+        for name, parent_id in pairs:
+            parents.setdefault(name, []).append(parent_id)
+        clauses = [drive_query.clause(name, parent_id, trashed=None)
+                   for name, parent_id in pairs]
+        suffix = drive_query.clause(folder=folders)
+        # A single name is resolved by the first match.
+        page_size = 1 if len(pairs) == 1 else Drive.PAGE_SIZE
+
+        found = {}
+        for query in drive_query.chunks(clauses, suffix):
+            page_token = None
+            while True:
+                r = self._execute(self.service.files().list(
+                    q=query, fields=Fields.FILE_RESOLVE, pageSize=page_size,
+                    pageToken=page_token, spaces='drive'))
+                for item in r.get('files', []):
+                    for parent_id in parents.get(item['name'], []):
+                        key = (item['name'], parent_id)
+                        if key not in found and (
+                                parent_id is None or
+                                parent_id in item.get('parents', [])):
+                            found[key] = item['id']
+                page_token = r.get('nextPageToken')
+                if not page_token or len(found) == len(pairs):
+                    break
+        return found
+
+    def _get_id(self, kind, name, parent_id=None, folders=None):
+        """
+        Query the id of a single file/folder by name.
+
+        Returns(tupple):
+            (True, id) or (False, err_msg)
+
+        """
+        logger.log_info("Querying {} {} in {}".format(kind, name, parent_id))
+        try:
+            found = self._resolve_ids([(name, parent_id)], folders)
         except Exception as e:
-            logger.log_info("Error querying file: {}".format(e))
+            logger.log_info("Error querying {}: {}".format(kind, e))
             return False, str(e)
+        if not found:
+            logger.log_error("No {} found".format(kind))
+            return False, "No {} found".format(kind)
+        return True, found[(name, parent_id)]
+
+    def _get_file_id(self, file_name, parent_id=None):
+        """
+        Query the file id of a folder by file name.
+
+        Args:
+            - file_name(str): The name of the file we want to get the id
+                                from.
+            - parent_id(str): Parent folder ID.
+
+        Returns(tupple):
+            (True, id) or (False, err_msg)
+
+        """
+        return self._get_id('file', file_name, parent_id)
 
     def _get_folder_id(self, folder_name, parent_id=None):
         """
@@ -314,26 +1137,25 @@ class StorageHandler(GoogleServiceHandler):
             - parent_id(str): Parent folder ID.
 
         Returns(tupple):
-            (True, [id]) or (False, err_msg)
+            (True, id) or (False, err_msg)
 
         """
-        query = "name='{}'".format(folder_name) +\
-                " and mimeType='application/vnd.google-apps.folder'" +\
-                " and trashed=false"
-        if parent_id:
-            query += " and {} in parents".format(parent_id)
+        return self._get_id('folder', folder_name, parent_id, folders=True)
 
-        fields = "nextPageToken, files(id)"
-        logger.log_info("Querying folder {}".format(query))
-        try:
-            r = self.service.files().list(q=query,  fields=fields,
-                                          spaces='drive').execute()
-            items = r.get('files', [])
-            if not items:
-                logger.log_error("No folder found")
-                return False, "No folder found"
-            folder_id = items[0]['id']
-            return True, [folder_id]
-        except Exception as e:
-            logger.log_info("Error querying folder: {}".format(e))
-            return False, str(e)
+
+def _md5(path):
+    """
+    MD5 checksum of a file, read in chunks.
+
+    Args:
+        - path(str): file path.
+
+    Returns(str):
+        Hex digest, as Drive reports it in md5Checksum.
+
+    """
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
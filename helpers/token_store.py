@@ -0,0 +1,177 @@
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.tracing import tracer
+
+
+class TokenStore:
+    """
+    OAuth credentials file shared by every worker process of a node.
+
+    Readers take a shared lock, a refresh takes an exclusive one, so only one
+    worker refreshes an expired token while the others wait and pick up the
+    result. The file is replaced atomically, readers never see it
+    half-written.
+    """
+
+    def __init__(self, path, scopes):
+        """
+        Args:
+            - path(str): path of the authorized user credentials file.
+            - scopes(list): OAuth scopes of the credentials.
+
+        """
+        self.path = path
+        self.scopes = scopes
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._version = None
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """
+        Hold an advisory lock on the credentials file, shared between
+        processes.
+
+        Args:
+            - exclusive(bool): exclusive (writer) or shared (reader) lock.
+
+        """
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """
+        Read the credentials file unless the cached copy is up to date.
+        Must be called holding a file lock.
+
+        Returns(Credentials | None):
+        """
+        version = self._file_version()
+        if version is None:
+            self._credentials = self._version = None
+        elif version != self._version:
+            try:
+                with tracer.span('credentials.read'):
+                    self._credentials = Credentials.from_authorized_user_file(
+                        self.path, self.scopes)
+            except (ValueError, OSError) as e:
+                logger.log_error("Error reading credentials {}: {}"
+                                 .format(self.path, e))
+                self._credentials = None
+            self._version = version
+        return self._credentials
+
+    def _write(self, credentials):
+        """
+        Atomically replace the credentials file.
+        Must be called holding the exclusive file lock.
+        """
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with tracer.span('credentials.write'):
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(credentials.to_json())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        self._credentials = credentials
+        self._version = self._file_version()
+
+    def _refresh(self, credentials):
+        start = time.perf_counter()
+        try:
+            with tracer.span('credentials.refresh'):
+                credentials.refresh(Request())
+        except Exception:
+            metrics.token_refresh.observe(time.perf_counter() - start,
+                                          status='error')
+            raise
+        metrics.token_refresh.observe(time.perf_counter() - start,
+                                      status='ok')
+        logger.log_info("Credentials refreshed")
+
+    def get(self):
+        """
+        Get valid credentials, refreshing them if they expired.
+
+        Returns(Credentials | None):
+            None when there are no usable credentials stored.
+
+        """
+        with self._lock:
+            credentials = self._credentials
+            if credentials and credentials.valid and\
+                    self._file_version() == self._version:
+                return credentials
+
+            with self._file_lock(exclusive=False):
+                credentials = self._load()
+            if credentials and credentials.valid:
+                return credentials
+
+            with self._file_lock(exclusive=True):
+                # Another worker may have refreshed while we waited.
+                credentials = self._load()
+                if credentials and credentials.valid:
+                    return credentials
+                if credentials and credentials.expired and\
+                        credentials.refresh_token:
+                    self._refresh(credentials)
+                    self._write(credentials)
+                    return credentials
+        return None
+
+    def save(self, credentials):
+        """
+        Store new credentials, e.g. the result of an authorization flow.
+
+        Args:
+            - credentials(Credentials):
+
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._write(credentials)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_token_store(path, scopes):
+    """
+    Get the process wide TokenStore of a credentials file.
+
+    Args:
+        - path(str): path of the authorized user credentials file.
+        - scopes(list): OAuth scopes of the credentials.
+
+    Returns(TokenStore):
+    """
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = TokenStore(path, scopes)
+        return store
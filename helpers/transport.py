@@ -0,0 +1,123 @@
+import httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from urllib3.exceptions import EmptyPoolError
+
+from consts.transport import Transport
+
+
+class PoolTimeout(ConnectionError):
+    """
+    No pooled connection was freed in time. It is a ConnectionError, so
+    callers retry it like any other dropped connection.
+    """
+
+
+class _TimedPool:
+    """
+    Mixin of the urllib3 connection pools, waiting at most pool_timeout
+    seconds for a free connection instead of forever.
+    """
+
+    pool_timeout = None
+
+    def urlopen(self, *args, **kwargs):
+        kwargs.setdefault('pool_timeout', self.pool_timeout)
+        return super().urlopen(*args, **kwargs)
+
+
+class _PoolAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools give up waiting for a free
+    connection after pool_timeout seconds, requests does not pass one.
+    """
+
+    def __init__(self, pool_timeout, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: type(pool.__name__, (_TimedPool, pool),
+                         {'pool_timeout': self.pool_timeout})
+            for scheme, pool in
+            self.poolmanager.pool_classes_by_scheme.items()}
+
+
+class PooledHttp:
+    """
+    httplib2.Http compatible transport for googleapiclient backed by a
+    requests session. Unlike httplib2, the session is safe to share between
+    threads and keeps a bounded pool of keep-alive connections per host, so
+    calls reuse TLS connections instead of opening a new one.
+    """
+
+    def __init__(self, credentials, pool_size=Transport.POOL_SIZE,
+                 connect_timeout=Transport.CONNECT_TIMEOUT,
+                 read_timeout=Transport.READ_TIMEOUT,
+                 pool_timeout=Transport.POOL_TIMEOUT):
+        """
+        Args:
+            - credentials(google.auth.credentials.Credentials): credentials
+                applied to every request, refreshed when they expire.
+                None sends unauthenticated requests.
+            - pool_size(int): keep-alive connections kept per host.
+            - connect_timeout(float): seconds to wait for a connection.
+            - read_timeout(float): seconds to wait for a response.
+            - pool_timeout(float): seconds to wait for a free pooled
+                connection once all of them are busy.
+
+        """
+        if credentials is not None:
+            self.session = AuthorizedSession(credentials)
+        else:
+            self.session = requests.Session()
+        adapter = _PoolAdapter(pool_timeout, pool_connections=pool_size,
+                               pool_maxsize=pool_size, pool_block=True,
+                               max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = (connect_timeout, read_timeout)
+
+    @property
+    def credentials(self):
+        return getattr(self.session, 'credentials', None)
+
+    @credentials.setter
+    def credentials(self, credentials):
+        if isinstance(self.session, AuthorizedSession):
+            self.session.credentials = credentials
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        """
+        Send a request, with the same signature and result as
+        httplib2.Http.request. Raises PoolTimeout when no pooled connection
+        is freed in time.
+
+        Returns(tupple):
+            (httplib2.Response, bytes)
+
+        """
+        try:
+            response = self.session.request(method, uri, data=body,
+                                            headers=headers,
+                                            timeout=self.timeout,
+                                            allow_redirects=redirections > 0)
+        except EmptyPoolError as e:
+            raise PoolTimeout("No pooled connection to {} freed in time"
+                              .format(uri)) from e
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # The body was already decompressed, as httplib2 does.
+        if 'content-encoding' in info:
+            info['-content-encoding'] = info.pop('content-encoding')
+            info.pop('content-length', None)
+        info['status'] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+    def close(self):
+        self.session.close()
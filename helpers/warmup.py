@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from consts.mail import Mail
+from consts.warmup import Warmup
+from helpers.service_pool import service_pool
+from utils.logger import logger
+
+
+class WarmUp:
+    """
+    Startup warm-up of a worker. Loads and refreshes the credentials of the
+    configured accounts, builds their pooled service handlers and fills the
+    event index of the hot calendars and the dedup index of the hot folders,
+    so the first requests do not pay for them.
+    """
+
+    def __init__(self, accounts=Warmup.ACCOUNTS, calendars=Warmup.CALENDARS,
+                 folders=Warmup.FOLDERS, senders=Mail.SENDER_ACCOUNTS,
+                 workers=Warmup.WORKERS):
+        """
+        Args:
+            - accounts(list): accounts warmed up, '' being the default one.
+            - calendars(list): calendar IDs indexed for every account.
+            - folders(list): folder names indexed for every account.
+            - senders(list): sender pool accounts, only their Gmail handler
+                is built.
+            - workers(int): accounts warmed up in parallel.
+
+        """
+        self.accounts = accounts
+        self.calendars = calendars
+        self.folders = folders
+        self.senders = [sender for sender in senders
+                        if sender not in accounts]
+        self.workers = workers
+        self.ready = False
+        self.failed = {}
+
+    def _step(self, name, f, *args):
+        """
+        Run a warm-up step, recording its error instead of raising it.
+
+        Args:
+            - name(str): step name, reported when it fails.
+            - f(function): step, returning (True, value) or (False, err).
+
+        Returns(object):
+            The value of the step or None when it failed.
+
+        """
+        try:
+            result, value = f(*args)
+        except Exception as e:
+            result, value = False, str(e)
+        if not result:
+            logger.log_error("Warm-up step {} failed: {}".format(name, value))
+            self.failed[name] = value
+            return None
+        return value
+
+    @staticmethod
+    def _handler(handler_class, account):
+        handler = service_pool.get(handler_class, account)
+        if not handler.service:
+            return False, "No valid credentials"
+        return True, handler
+
+    def _account(self, account):
+        # The service helpers are imported lazily by the application too.
+        from helpers.email_helper import EmailHandler
+        from helpers.meeting_helper import MeetingHandler
+        from helpers.storage_helper import StorageHandler
+
+        label = account or 'default'
+        self._step('{}/gmail'.format(label), self._handler, EmailHandler,
+                   account)
+        if account in self.senders:
+            return
+        meeting = self._step('{}/calendar'.format(label), self._handler,
+                             MeetingHandler, account)
+        for calendar_id in self.calendars if meeting else []:
+            self._step('{}/calendar/{}'.format(label, calendar_id),
+                       meeting.sync_events, calendar_id)
+        storage = self._step('{}/drive'.format(label), self._handler,
+                             StorageHandler, account)
+        if not storage or not self.folders:
+            return
+        found = self._step('{}/drive/folders'.format(label),
+                           storage.index_folders, self.folders)
+        for name in self.folders if found is not None else []:
+            if name not in found:
+                self.failed['{}/drive/{}'.format(label, name)] = \
+                    "No folder found"
+
+    def run(self):
+        """
+        Warm every account up. The worker is ready once every step ran,
+        failed ones included, they are retried by the requests needing them.
+
+        Returns(dict):
+            {step: err_msg} of the failed steps.
+
+        """
+        start = time.perf_counter()
+        accounts = [account or None for account in
+                    list(dict.fromkeys(self.accounts + self.senders))]
+        logger.log_info("Warming up {} accounts".format(len(accounts)))
+        with ThreadPoolExecutor(max(1, min(self.workers, len(accounts))))\
+                as executor:
+            list(executor.map(self._account, accounts))
+        self.ready = True
+        logger.log_info("Warm-up done in {:.2f}s, {} steps failed"
+                        .format(time.perf_counter() - start,
+                                len(self.failed)))
+        return self.failed
+
+
+warmup = WarmUp()
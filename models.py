@@ -1,52 +1,242 @@
-from pydantic import BaseModel
-from typing import Optional
+from datetime import datetime
+from pydantic import AwareDatetime, BaseModel, StringConstraints, \
+    model_validator
+from typing import Dict, List, Optional
+from typing_extensions import Annotated
+
+from consts.meeting import Meeting
+
+
+# Bare address, as Calendar and Drive expect them, e.g. ann@example.com.
+EmailAddress = Annotated[str, StringConstraints(
+    strip_whitespace=True, max_length=254,
+    pattern=r'^[^@\s<>,;]+@[^@\s<>,;]+\.[^@\s<>,;]+$')]
 
 
 class Calendar(BaseModel):
-    summary: str
+    summary: Optional[str] = None
+    calendar_id: Optional[str] = None
 
 
 class Email(BaseModel):
     recipient: str
     sender: str
     body: str
-    subcject: str
+    subject: str
     attachement: Optional[str] = ''
     extension: Optional[str] = '.pdf'
 
 
 class Event(BaseModel):
-    summary: str
+    summary: Optional[str] = None
     calendar_id: Optional[str] = 'primary'
+    event_id: Optional[str] = None
+
+
+class EventSearch(BaseModel):
+    calendar_id: Optional[str] = 'primary'
+    time_min: Optional[AwareDatetime] = None
+    time_max: Optional[AwareDatetime] = None
+    attendee: Optional[EmailAddress] = None
+    text: Optional[str] = None
+    limit: Optional[int] = Meeting.SEARCH_LIMIT
+
+
+class EventRow(BaseModel):
+    start: AwareDatetime
+    end: AwareDatetime
+    summary: Optional[str] = None
+    attendees: Optional[List[EmailAddress]] = None
+    location: Optional[str] = None
 
 
 class Folder(BaseModel):
-    folder_name: str
+    folder_name: Optional[str] = None
+    folder_id: Optional[str] = None
     parent_name: Optional[str] = ''
+    parent_id: Optional[str] = None
+
+
+class CopiedFolder(Folder):
+    destination_id: Optional[str] = None
+    name: Optional[str] = None
 
 
 class Item(BaseModel):
-    file_name: str
+    file_name: Optional[str] = None
+    file_id: Optional[str] = None
     parent_name: Optional[str] = ''
+    parent_id: Optional[str] = None
+
+
+class MergeRecipient(BaseModel):
+    recipient: str
+    variables: Optional[dict] = {}
+
+
+class MailMerge(BaseModel):
+    sender: str
+    subject: str
+    body: str
+    html: Optional[bool] = False
+    recipients: List[MergeRecipient]
 
 
 class NewCalendar(Calendar):
+    summary: str
     time_zone: str
 
 
 class NewEvent(BaseModel):
-    attendees: list
-    start: str
-    end: str
+    summary: str
+    calendar_id: Optional[str] = 'primary'
+    attendees: List[EmailAddress]
+    start: datetime
+    end: datetime
     timezone: str
     location: Optional[str] = 'online'
+    recurrence: Optional[List[str]] = None
+
+    @model_validator(mode='after')
+    def _zoned(self):
+        # Google reads times without offset in the event time zone.
+        if not self.timezone and None in (self.start.tzinfo,
+                                          self.end.tzinfo):
+            raise ValueError("start and end need a UTC offset when no "
+                             "timezone is given")
+        return self
+
+
+class NewEvents(BaseModel):
+    summary: str
+    calendar_id: Optional[str] = 'primary'
+    attendees: Optional[List[EmailAddress]] = []
+    timezone: str
+    location: Optional[str] = 'online'
+    send_updates: Optional[str] = 'all'
+    rows: List[EventRow]
+
+
+class NewFolder(Folder):
+    folder_name: str
 
 
 class NewItem(Item):
+    file_name: str
     content: str
+    dedup: Optional[str] = None
 
 
 class SharedFolder(Folder):
-    email: str
+    email: EmailAddress
     role: Optional[str] = 'reader'
     notify: Optional[bool] = True
+
+
+class SlotSearch(BaseModel):
+    attendees: Optional[List[EmailAddress]] = []
+    calendar_ids: Optional[List[str]] = []
+    time_min: AwareDatetime
+    time_max: AwareDatetime
+    duration: int
+    count: Optional[int] = Meeting.SLOT_COUNT
+    work_start: Optional[str] = Meeting.WORK_START
+    work_end: Optional[str] = Meeting.WORK_END
+    utc_offset: Optional[str] = '+00:00'
+    weekdays: Optional[List[int]] = Meeting.WORK_DAYS
+
+
+class UnsharedFolder(Folder):
+    email: EmailAddress
+
+
+# Responses
+
+
+class CalendarId(BaseModel):
+    calendar_id: str
+
+
+class CreatedEvent(BaseModel):
+    event_id: str
+    rows: List[int]
+    recurrence: Optional[str] = None
+
+
+class CreatedEvents(BaseModel):
+    events: List[CreatedEvent]
+    failed: Dict[str, str]
+
+
+class EmailSent(BaseModel):
+    statusCode: int = 200
+    error: str = ''
+
+
+class EventId(BaseModel):
+    event_id: str
+
+
+class Exists(BaseModel):
+    result: bool
+
+
+class FileId(BaseModel):
+    file_id: str
+
+
+class FolderId(BaseModel):
+    folder_id: str
+
+
+class FoundEvent(BaseModel):
+    event_id: str
+    summary: str
+    start: str
+    end: str
+    location: str
+    attendees: List[str]
+
+
+class FoundEvents(BaseModel):
+    events: List[FoundEvent]
+    source: str
+
+
+class FreeSlot(BaseModel):
+    start: str
+    end: str
+
+
+class FreeSlots(BaseModel):
+    slots: List[FreeSlot]
+    errors: Dict[str, str]
+
+
+class MergeResult(BaseModel):
+    recipient: str
+    status: str
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class MergeReport(BaseModel):
+    sent: int
+    failed: int
+    invalid: int
+    results: List[MergeResult]
+
+
+class Readiness(BaseModel):
+    ready: bool
+    failed: Dict[str, str]
+
+
+class TreeReport(BaseModel):
+    folder_id: Optional[str] = None
+    done: int
+    failed: Dict[str, str]
+
+
+class ArchiveReport(TreeReport):
+    ids: Dict[str, str]
@@ -0,0 +1,180 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+
+from consts.backend import Backend
+from consts.drive import Drive
+from helpers import fake_google
+from helpers.event_index import event_index
+from helpers.sender_pool import SenderPool
+from benchmarks.harness import AsgiClient
+from utils.idempotency import idempotency_store
+
+
+class TestApiModels(unittest.TestCase):
+    """
+    This class implements all the unit tests for the request and response
+    models of the API, run against the fake Google backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+        import api
+        cls.client = AsgiClient(api.app)
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        event_index.clear()
+        idempotency_store.clear()
+
+    def _request(self, path, body):
+        status, headers, content = asyncio.run(
+            self.client.request('POST', path, body))
+        return status, headers, json.loads(content)
+
+    def test_encoded_once(self):
+        """
+        Create an event and a folder. Assert the responses are JSON objects,
+        not JSON encoded strings.
+        """
+        status, headers, body = self._request('/meeting/create_event', {
+            'summary': 'Sync', 'attendees': ['ann@example.com'],
+            'start': '2024-05-06T09:00:00Z',
+            'end': '2024-05-06T10:00:00Z', 'timezone': 'UTC'})
+        assert status == 200, body
+        assert headers[b'content-type'] == b'application/json'
+        assert list(body) == ['event_id'] and body['event_id']
+        event = fake_google.backend.events['primary'][body['event_id']]
+        assert event['start']['dateTime'] == '2024-05-06T09:00:00+00:00'
+
+        status, _, body = self._request('/storage/folder/exists',
+                                        {'folder_name': 'missing'})
+        assert status == 200 and body == {'result': False}
+
+    def test_validation(self):
+        """
+        Send an invalid attendee, event times without offset nor time
+        zone, row times without offset and an unparseable search window.
+        Assert they are rejected before reaching Google.
+        """
+        row = {'start': '2024-05-06T09:00:00Z', 'end': '2024-05-06T10:00:00Z'}
+        for path, body in [
+                ('/meeting/create_event', {
+                    'summary': 'Sync', 'attendees': ['Ann <ann@example.com>'],
+                    'start': '2024-05-06T09:00:00Z',
+                    'end': '2024-05-06T10:00:00Z', 'timezone': 'UTC'}),
+                ('/meeting/create_event', {
+                    'summary': 'Sync', 'attendees': ['ann@example.com'],
+                    'start': '2024-05-06T09:00:00',
+                    'end': '2024-05-06T10:00:00Z', 'timezone': ''}),
+                ('/meeting/create_events', {
+                    'summary': 'Sync', 'timezone': 'UTC',
+                    'rows': [row, dict(row, start='2024-05-06T09:00:00')]}),
+                ('/meeting/find_slots', {
+                    'attendees': ['ann@example.com'], 'duration': 30,
+                    'time_min': 'tomorrow',
+                    'time_max': '2024-05-07T00:00:00Z'})]:
+            status, _, body = self._request(path, body)
+            assert status == 422, body
+        assert fake_google.backend.call_count == 0
+
+    def test_local_times(self):
+        """
+        Create an event with times without offset. Assert they are sent as
+        is, to be read in the event time zone.
+        """
+        status, _, body = self._request('/meeting/create_event', {
+            'summary': 'Sync', 'attendees': ['ann@example.com'],
+            'start': '2024-05-06T09:00:00', 'end': '2024-05-06T10:00:00',
+            'timezone': 'America/New_York'})
+        assert status == 200, body
+        event = fake_google.backend.events['primary'][body['event_id']]
+        assert event['start'] == {'dateTime': '2024-05-06T09:00:00',
+                                  'timeZone': 'America/New_York'}
+
+    def test_create_item(self):
+        """
+        Create an item twice, with line broken base64 content decoded in
+        several chunks. Assert the content and its checksum are kept and
+        the second upload is deduplicated.
+        """
+        data = bytes(range(256)) * 4
+        content = base64.encodebytes(data).decode()
+        with mock.patch.object(Drive, 'DECODE_CHUNK_SIZE', 64):
+            ids = [self._request('/storage/create_item', {
+                'file_name': 'chunked.bin', 'content': content,
+                'dedup': 'name'}) for _ in range(2)]
+        assert [status for status, _, _ in ids] == [200] * 2
+        file_id = ids[0][2]['file_id']
+        assert ids[1][2]['file_id'] == file_id
+        assert fake_google.backend.files[file_id]['md5Checksum'] == \
+            hashlib.md5(data).hexdigest()
+
+    def test_search_window(self):
+        """
+        Search events with offsets in the window. Assert it is parsed into
+        the same instants.
+        """
+        self._request('/meeting/create_event', {
+            'summary': 'Sync', 'attendees': ['ann@example.com'],
+            'start': '2024-05-06T12:00:00Z',
+            'end': '2024-05-06T13:00:00Z', 'timezone': 'UTC'})
+        status, _, body = self._request('/meeting/search_events', {
+            'time_min': '2024-05-06T08:30:00-03:00',
+            'time_max': '2024-05-06T11:00:00-03:00',
+            'attendee': 'ann@example.com'})
+        assert status == 200, body
+        assert [event['summary'] for event in body['events']] == ['Sync']
+
+    def test_concurrent(self):
+        """
+        Create folders concurrently while every Google call is slow. Assert
+        the calls overlap instead of blocking the event loop in turn.
+        """
+        async def create(count):
+            return await asyncio.gather(*(self.client.request(
+                'POST', '/storage/create_folder',
+                {'folder_name': 'folder-{}'.format(i)})
+                for i in range(count)))
+
+        fake_google.backend.configure(latency=0.2)
+        try:
+            start = time.perf_counter()
+            responses = asyncio.run(create(4))
+            elapsed = time.perf_counter() - start
+        finally:
+            fake_google.backend.configure(latency=0)
+        assert [status for status, _, _ in responses] == [200] * 4
+        assert elapsed < 0.6
+
+    def test_unknown_sender(self):
+        """
+        Shard messages over the sender pool when one of its accounts is
+        unknown. Assert the request fails and no quota stays reserved.
+        """
+        import api
+
+        def _handler(handler_class, account):
+            raise HTTPException(status_code=404,
+                                detail="Unknown account {}".format(account))
+
+        pool = SenderPool(['a@example.com', 'b@example.com'], daily_limit=5)
+        with mock.patch.object(api, 'sender_pool', pool), \
+                mock.patch.object(api, '_handler', _handler):
+            with self.assertRaises(HTTPException) as context:
+                api._senders('noreply@example.com', 4, None)
+        assert context.exception.status_code == 404
+        assert [pool.remaining(account) for account in pool.accounts] == \
+            [5, 5]
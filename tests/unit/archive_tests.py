@@ -0,0 +1,179 @@
+import asyncio
+import io
+import tarfile
+import unittest
+import zipfile
+
+import api
+from benchmarks.harness import AsgiClient
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.drive import Drive
+from helpers import archive, fake_google
+from helpers.storage_helper import StorageHandler
+
+
+FILES = {
+    'project/readme.txt': b'readme',
+    'project/src/main.py': b'print(1)',
+    'project/src/lib/util.py': b'x = 1',
+    'project/docs/guide.pdf': b'%PDF',
+    'top.txt': b'top',
+}
+
+
+def _zip():
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, 'w') as z:
+        z.writestr('project/empty/', b'')
+        for path, data in FILES.items():
+            z.writestr(path, data)
+        z.writestr('../evil.txt', b'evil')
+    f.seek(0)
+    return f
+
+
+def _tar():
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode='w:gz') as t:
+        for path, data in FILES.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    f.seek(0)
+    return f
+
+
+class TestArchive(unittest.TestCase):
+    """
+    This class implements all the unit tests for the archive reading helpers
+    and the archive upload of the StorageHandler.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.handler = StorageHandler(Auth.CREDENTIALS_FILE)
+
+    def _paths(self, folder_id, path=''):
+        paths = {}
+        for file in list(fake_google.backend.files.values()):
+            if folder_id in file['parents']:
+                child = (path + '/' if path else '') + file['name']
+                paths[child] = file
+                paths.update(self._paths(file['id'], child))
+        return paths
+
+    def test_members(self):
+        """
+        Read zip and tar archives. Assert the members and their content,
+        without unsafe paths.
+        """
+        for f in (_zip(), _tar()):
+            files = {path: open_member().read() for path, is_dir, open_member
+                     in archive.members(f) if not is_dir}
+            assert files == FILES
+        assert archive.detect(io.BytesIO(b'not an archive')) is None
+
+    def test_spool(self):
+        """
+        Spool a stream past the memory limit. Assert it rolls to disk with
+        the whole content.
+        """
+        async def chunks():
+            for _ in range(4):
+                yield b'x' * 10
+
+        f = asyncio.run(archive.spool(chunks(), 25))
+        assert not isinstance(f, io.BytesIO)
+        assert f.read() == b'x' * 40
+        with self.assertRaises(archive.ArchiveTooLarge):
+            asyncio.run(archive.spool(chunks(), 25, limit=35))
+
+    def test_limits(self):
+        """
+        Read archives over the member and total size limits. Assert they
+        are rejected before a zip member is read, and a tar stream is
+        stopped at the member over the limit.
+        """
+        largest = max(len(data) for data in FILES.values())
+        total = sum(len(data) for data in FILES.values())
+        for f in (_zip(), _tar()):
+            assert len(list(archive.members(f, largest, total + 4))) > 0
+            for limits in ((largest - 1, None), (None, total - 1)):
+                f.seek(0)
+                with self.assertRaises(archive.ArchiveTooLarge):
+                    list(archive.members(f, *limits))
+
+        bomb = io.BytesIO()
+        with zipfile.ZipFile(bomb, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('small.txt', b'small')
+            z.writestr('bomb.txt', b'\0' * (1024 * 1024))
+        members = archive.members(bomb, 1024)
+        with self.assertRaises(archive.ArchiveTooLarge):
+            next(members)
+
+    def test_upload_archive(self):
+        """
+        Upload zip and tar archives into a folder. Assert the hierarchy is
+        recreated with every folder created once.
+        """
+        for f in (_zip(), _tar()):
+            fake_google.backend.reset()
+            _, parent_id = self.handler.create_folder('uploads')
+            calls = fake_google.backend.call_count
+            result, report = self.handler.upload_archive(
+                f, parent_name='uploads')
+            assert result, report
+            assert report['done'] == len(FILES) and not report['failed']
+
+            paths = self._paths(parent_id)
+            files = {path: file for path, file in paths.items()
+                     if file['mimeType'] != fake_google.FOLDER_MIME_TYPE}
+            assert set(files) == set(FILES)
+            assert all(report['ids'][path] == file['id']
+                       for path, file in paths.items())
+            folders = len(paths) - len(files)
+            # Parent lookup, one create per folder and per file.
+            assert fake_google.backend.call_count - calls ==\
+                1 + folders + len(FILES)
+
+    def test_unsupported(self):
+        """
+        Upload something else than an archive. Assert it is rejected.
+        """
+        result, error = self.handler.upload_archive(io.BytesIO(b'text'))
+        assert not result and 'Unsupported' in error
+
+    def test_upload_limits(self):
+        """
+        Post archives over the body and content limits to the route.
+        Assert they are rejected with a 413 and nothing is uploaded.
+        """
+        client = AsgiClient(api.app)
+        body = _zip().getvalue()
+        for limit, value in (('ARCHIVE_MAX_SIZE', len(body) - 1),
+                             ('ARCHIVE_MAX_TOTAL_SIZE', 10)):
+            fake_google.backend.reset()
+            previous = getattr(Drive, limit)
+            setattr(Drive, limit, value)
+            try:
+                status, _, response = asyncio.run(client.request(
+                    'POST', '/storage/upload_archive', body))
+            finally:
+                setattr(Drive, limit, previous)
+            assert status == 413, response
+            assert b'limit' in response
+            assert list(fake_google.backend.files) == ['root']
@@ -0,0 +1,39 @@
+import time
+import unittest
+
+from utils.cache import LRUCache
+from utils.metrics import metrics
+
+
+class TestLRUCache(unittest.TestCase):
+    """
+    This class implements all the unit tests for the LRUCache class.
+    """
+
+    def test_eviction(self):
+        """
+        Fill the cache past its size. Assert the least recently used entry
+        is evicted.
+        """
+        cache = LRUCache('test_eviction', 2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1 and cache.get('c') == 3
+        assert len(cache) == 2
+        assert metrics.cache_evictions.value(cache='test_eviction') == 1
+        assert metrics.cache_requests.value(cache='test_eviction',
+                                            result='hit') == 3
+
+    def test_ttl(self):
+        """
+        Get an entry after its time to live. Assert it expired.
+        """
+        cache = LRUCache('test_ttl', 10, ttl=0.05)
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        time.sleep(0.06)
+        assert cache.get('a', 'expired') == 'expired'
+        assert len(cache) == 0
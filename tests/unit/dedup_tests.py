@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.drive import Drive
+from consts.utils import StorageUtils
+from helpers import fake_google
+from helpers.dedup_index import dedup_index
+from helpers.storage_helper import StorageHandler
+from utils.metrics import metrics
+
+
+class TestDedup(unittest.TestCase):
+    """
+    This class implements all the unit tests for the deduplicated uploads
+    of the StorageHandler.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        dedup_index.clear()
+        self.handler = StorageHandler(Auth.CREDENTIALS_FILE)
+        _, self.folder_id = self.handler.create_folder(
+            StorageUtils.TEST_FOLDER_NAME)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _file(self, name, content=None):
+        path = os.path.join(self.directory, name)
+        if content is None:
+            shutil.copy(StorageUtils.TEST_FILE_PDF, path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(content)
+        return path
+
+    def _upload(self, path, dedup):
+        result, file_id = self.handler.create_file(
+            path, parent_id=self.folder_id, dedup=dedup)
+        assert result, file_id
+        return file_id
+
+    def _files(self):
+        return [file for file in fake_google.backend.files.values()
+                if self.folder_id in file['parents']]
+
+    def test_same_name(self):
+        """
+        Upload the same file twice, then with another content. Assert only
+        the new content is uploaded.
+        """
+        path = self._file('test.pdf')
+        file_id = self._upload(path, Drive.DEDUP_NAME)
+        skipped = metrics.dedup_uploads.value(result='skipped')
+        calls = fake_google.backend.call_count
+        assert self._upload(path, Drive.DEDUP_NAME) == file_id
+        # A single metadata check, answered by the local index.
+        assert fake_google.backend.call_count - calls == 1
+        assert metrics.dedup_uploads.value(result='skipped') == skipped + 1
+
+        self._file('test.pdf', b'new content')
+        assert self._upload(path, Drive.DEDUP_NAME) != file_id
+        assert len(self._files()) == 2
+
+    def test_any_name(self):
+        """
+        Upload the same content with another name. Assert it is copied
+        server side instead of uploaded.
+        """
+        file_id = self._upload(self._file('a.pdf'), Drive.DEDUP_ANY)
+        copied = metrics.dedup_uploads.value(result='copied')
+        copy_id = self._upload(self._file('b.pdf'), Drive.DEDUP_ANY)
+        assert copy_id != file_id
+        assert metrics.dedup_uploads.value(result='copied') == copied + 1
+        files = {file['name']: file for file in self._files()}
+        assert files['b.pdf']['md5Checksum'] == files['a.pdf']['md5Checksum']
+
+        # Without dedup or by name only, the content is uploaded again.
+        self._upload(self._file('c.pdf'), Drive.DEDUP_NAME)
+        self._upload(self._file('d.pdf'), None)
+        assert len(self._files()) == 4
+
+    def test_stale_index(self):
+        """
+        Delete an indexed file behind the index. Assert the file is uploaded
+        again instead of reusing the deleted one.
+        """
+        path = self._file('test.pdf')
+        file_id = self._upload(path, Drive.DEDUP_NAME)
+        fake_google.backend.files_delete(file_id)
+        new_id = self._upload(path, Drive.DEDUP_NAME)
+        assert new_id != file_id
+        assert [file['id'] for file in self._files()] == [new_id]
+
+    def test_unknown_mode(self):
+        """
+        Upload with an unknown dedup mode. Assert it fails.
+        """
+        result, error = self.handler.create_file(
+            self._file('test.pdf'), parent_id=self.folder_id, dedup='all')
+        assert not result and 'dedup' in error
@@ -0,0 +1,105 @@
+import unittest
+from unittest import mock
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.drive import Drive
+from helpers import drive_query, fake_google
+from helpers.storage_helper import StorageHandler
+
+
+class TestDriveQuery(unittest.TestCase):
+    """
+    This class implements all the unit tests for the Drive query builder
+    and the multi-name resolution of the StorageHandler.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.handler = StorageHandler(Auth.CREDENTIALS_FILE)
+
+    def test_quote(self):
+        """
+        Build clauses of names with quotes and backslashes. Assert they are
+        escaped and match the original names.
+        """
+        assert drive_query.quote("it's") == "'it\\'s'"
+        assert drive_query.quote('a\\b') == "'a\\\\b'"
+        query = drive_query.clause("it's a\\b", 'parent')
+        assert query == "name = 'it\\'s a\\\\b' and 'parent' in parents" +\
+            " and trashed = false"
+        assert fake_google.compile_query(query)(
+            {'name': "it's a\\b", 'parents': ['parent'], 'trashed': False})
+
+    def test_chunks(self):
+        """
+        Split many clauses. Assert every query fits and all are kept.
+        """
+        clauses = [drive_query.clause('name-{}'.format(i))
+                   for i in range(100)]
+        queries = list(drive_query.chunks(clauses, 'trashed = false', 500))
+        assert len(queries) > 1
+        assert all(len(query) <= 500 for query in queries)
+        assert sum(query.count('name =') for query in queries) == 100
+
+    def test_get_ids(self):
+        """
+        Resolve many names, some under a parent, with pagination. Assert
+        the IDs are found in a single query.
+        """
+        result, parent_id = self.handler.create_folder("Tom's")
+        assert result, parent_id
+        expected = {("Tom's", None): parent_id}
+        for i in range(5):
+            name = "file's {}.txt".format(i)
+            expected[(name, parent_id)] = fake_google.backend.files_create(
+                body={'name': name, 'parents': [parent_id]})['id']
+        fake_google.backend.files_create(body={'name': "file's 0.txt"})
+
+        calls = fake_google.backend.call_count
+        with mock.patch.object(Drive, 'PAGE_SIZE', 2):
+            result, ids = self.handler.get_ids(
+                list(expected) + [('missing', None)])
+        assert result, ids
+        assert ids == expected
+        # One query for the 6 matches, followed over its 3 pages.
+        assert fake_google.backend.call_count - calls == 3
+
+    def test_parent(self):
+        """
+        Look up and delete a file under a parent folder. Assert the parent
+        clause is accepted.
+        """
+        result, parent_id = self.handler.create_folder('parent')
+        assert result, parent_id
+        self.handler.create_folder('child', parent_id=parent_id)
+        assert self.handler.exist('child', 'parent') == (True, None)
+        result, error = self.handler.delete_folder('child', 'parent')
+        assert result, error
+        assert self.handler.exist('child', 'parent') == (False, None)
+
+    def test_trashed(self):
+        """
+        Look up a folder by name and by ID once it is trashed. Assert both
+        lookups report it missing.
+        """
+        result, folder_id = self.handler.create_folder('trashed')
+        assert result, folder_id
+        assert self.handler.exist('trashed') == (True, None)
+        assert self.handler.exist(file_id=folder_id) == (True, None)
+        fake_google.backend.files[folder_id]['trashed'] = True
+        assert self.handler.exist('trashed') == (False, None)
+        assert self.handler.exist(file_id=folder_id) == (False, None)
@@ -0,0 +1,176 @@
+import time
+import unittest
+
+from consts.auth import Auth
+from consts.backend import Backend
+from helpers import fake_google, slots
+from helpers.event_index import CalendarIndex, event_index
+from helpers.meeting_helper import MeetingHandler
+
+
+def _event(event_id, start, end, attendees=(), **kwargs):
+    return dict({'id': event_id, 'status': 'confirmed',
+                 'start': {'dateTime': start}, 'end': {'dateTime': end},
+                 'attendees': [{'email': email} for email in attendees]},
+                **kwargs)
+
+
+class TestCalendarIndex(unittest.TestCase):
+    """
+    This class implements all the unit tests for the interval index of the
+    events of a calendar.
+    """
+
+    def setUp(self):
+        """
+        Index a long event, two events a day apart and an all-day event.
+        """
+        self.index = CalendarIndex()
+        self.index.apply([
+            _event('long', '2024-01-01T00:00:00Z', '2024-03-01T00:00:00Z',
+                   summary='Offsite'),
+            _event('a', '2024-02-01T10:00:00Z', '2024-02-01T11:00:00Z',
+                   ['Ann@example.com'], summary='Weekly sync'),
+            _event('b', '2024-02-02T10:00:00Z', '2024-02-02T11:00:00Z',
+                   ['bob@example.com'], summary='Planning',
+                   description='Weekly planning'),
+            {'id': 'day', 'status': 'confirmed', 'summary': 'Holiday',
+             'start': {'date': '2024-02-02'}, 'end': {'date': '2024-02-03'}},
+        ], 'token', full=True)
+
+    def _ids(self, **kwargs):
+        return [event['event_id'] for event in self.index.search(**kwargs)]
+
+    def test_window(self):
+        """
+        Search time windows. Assert overlapping events are found, including
+        the long event starting weeks before the window.
+        """
+        t = slots.parse_time
+        assert self._ids(time_min=t('2024-02-01T10:30:00Z'),
+                         time_max=t('2024-02-02T00:00:00Z')) == ['long', 'a']
+        assert self._ids(time_min=t('2024-02-01T11:00:00Z'),
+                         time_max=t('2024-02-02T10:00:00Z')) == \
+            ['long', 'day']
+        assert self._ids(time_min=t('2024-03-01T00:00:00Z')) == []
+        assert self._ids(limit=2) == ['long', 'a']
+
+    def test_filters(self):
+        """
+        Search by attendee and text. Assert attendees match regardless of
+        case and every word must be found.
+        """
+        assert self._ids(attendee='ann@example.com') == ['a']
+        assert self._ids(text='weekly') == ['a', 'b']
+        assert self._ids(text='weekly planning') == ['b']
+        assert self._ids(attendee='bob@example.com', text='sync') == []
+
+    def test_apply(self):
+        """
+        Apply an incremental listing. Assert cancelled events are removed
+        and changed events updated.
+        """
+        self.index.apply([
+            {'id': 'long', 'status': 'cancelled'},
+            _event('a', '2024-02-05T10:00:00Z', '2024-02-05T11:00:00Z',
+                   summary='Weekly sync')], 'token-2')
+        assert self._ids() == ['day', 'b', 'a']
+        assert self.index.sync_token == 'token-2'
+
+
+class TestSearchEvents(unittest.TestCase):
+    """
+    This class implements all the unit tests for the event search of the
+    MeetingHandler, run against the fake backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        """
+        Create a weekly meeting of 10 instances and a one-off meeting.
+        """
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        event_index.clear()
+        self.handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+        fake_google.backend.events_insert('primary', {
+            'summary': 'Weekly', 'recurrence': ['RRULE:FREQ=WEEKLY;COUNT=10'],
+            'start': {'dateTime': '2024-01-01T10:00:00-03:00'},
+            'end': {'dateTime': '2024-01-01T11:00:00-03:00'},
+            'attendees': [{'email': 'ann@example.com'}]})
+        self.one_off = fake_google.backend.events_insert('primary', {
+            'summary': 'Review',
+            'start': {'dateTime': '2024-01-10T15:00:00-03:00'},
+            'end': {'dateTime': '2024-01-10T16:00:00-03:00'}})['id']
+        self.window = (slots.parse_time('2024-01-08T00:00:00Z'),
+                       slots.parse_time('2024-01-15T00:00:00Z'))
+
+    def _index(self):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            index = event_index.get((None, 'primary'))
+            if index is not None and index.ready:
+                return index
+            time.sleep(0.01)
+        self.fail("The event index was not built")
+
+    def test_cold(self):
+        """
+        Search a calendar that is not indexed. Assert the API answers and
+        the index is built in the background.
+        """
+        result, found = self.handler.search_events('primary', *self.window)
+        assert result, found
+        assert found['source'] == 'api'
+        assert [event['summary'] for event in found['events']] == \
+            ['Weekly', 'Review']
+        assert found['events'][0]['event_id'].endswith('_20240108T130000Z')
+        assert len(self._index()) == 11
+
+    def test_incremental(self):
+        """
+        Change the calendar after it is indexed. Assert the next search
+        syncs only the changes and answers from the index.
+        """
+        result, count = self.handler.sync_events('primary')
+        assert result and count == 11
+        fake_google.backend.events_delete('primary', self.one_off)
+        fake_google.backend.events_insert('primary', {
+            'summary': 'Retro',
+            'start': {'dateTime': '2024-01-12T15:00:00-03:00'},
+            'end': {'dateTime': '2024-01-12T16:00:00-03:00'}})
+
+        event_index.get((None, 'primary')).synced_at = None
+        calls = fake_google.backend.call_count
+        result, found = self.handler.search_events('primary', *self.window)
+        assert result, found
+        assert fake_google.backend.call_count - calls == 1
+        assert found['source'] == 'index'
+        assert [event['summary'] for event in found['events']] == \
+            ['Weekly', 'Retro']
+        result, found = self.handler.search_events(
+            'primary', attendee='ann@example.com', text='weekly')
+        assert len(found['events']) == 10
+
+    def test_expired_token(self):
+        """
+        Sync with a sync token the API no longer accepts. Assert the
+        calendar is fully synced again.
+        """
+        self.handler.sync_events('primary')
+        index = event_index.get((None, 'primary'))
+        index.sync_token = '1000'
+        result, count = self.handler.sync_events('primary')
+        assert result and count == 11
+        assert index.sync_token != '1000'
@@ -0,0 +1,179 @@
+import unittest
+
+from googleapiclient import errors
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.utils import EmailUtils, MeetingUtils, StorageUtils
+from helpers import fake_google
+from helpers.email_helper import EmailHandler
+from helpers.meeting_helper import MeetingHandler
+from helpers.storage_helper import StorageHandler
+
+
+class TestFakeGoogleBackend(unittest.TestCase):
+    """
+    This class implements all the unit tests for the fake Google backend.
+    The helpers are run against the fake, so no credentials are needed.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        """
+        Start every test from an empty fake account.
+        """
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+
+    def test_send_email(self):
+        """
+        Send emails through the EmailHandler. Assert they are recorded.
+        """
+        handler = EmailHandler(Auth.CREDENTIALS_FILE)
+        result, error = handler.send_email(
+            EmailUtils.TEST_EMAIL, EmailUtils.TEST_EMAIL,
+            EmailUtils.TEST_BODY, EmailUtils.TEST_SUBJECT)
+        assert result, "Failed to send email: {}".format(error)
+
+        result, error = handler.send_email_attachement(
+            EmailUtils.TEST_EMAIL, EmailUtils.TEST_EMAIL,
+            EmailUtils.TEST_BODY, EmailUtils.TEST_SUBJECT,
+            EmailUtils.TEST_FILE_PDF)
+        assert result, "Failed to send email: {}".format(error)
+        assert fake_google.backend.sent_count == 2
+
+    def test_events(self):
+        """
+        Create and delete an event and a calendar. Assert the result.
+        """
+        handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+        result, error = handler.create_event(
+            MeetingUtils.TEST_CALENDAR_ID, MeetingUtils.TEST_SUMMARY,
+            MeetingUtils.TEST_ATTENDEES, '2030-01-01T10:00:00-03:00',
+            '2030-01-01T11:00:00-03:00', MeetingUtils.TEST_TIMEZONE,
+            MeetingUtils.TEST_LOCATION)
+        assert result, "Error creating event: {}".format(error)
+
+        event, = fake_google.backend.events['primary'].values()
+        assert event['hangoutLink'].startswith('https://meet.google.com/')
+
+        result, error = handler.delete_event(MeetingUtils.TEST_CALENDAR_ID,
+                                             MeetingUtils.TEST_SUMMARY)
+        assert result, "Error deleting event: {}".format(error)
+        result, error = handler.delete_event(MeetingUtils.TEST_CALENDAR_ID,
+                                             MeetingUtils.TEST_SUMMARY)
+        assert not result
+
+        result, error = handler.create_calendar('Team',
+                                                MeetingUtils.TEST_TIMEZONE)
+        assert result, "Error creating calendar: {}".format(error)
+        result, calendar_id = handler.get_calendar_id('Team')
+        assert result and calendar_id.endswith('@group.calendar.google.com')
+        result, error = handler.delete_calendar('Team')
+        assert result, "Error deleting calendar: {}".format(error)
+
+    def test_storage(self):
+        """
+        Create, share, query and delete folders and files. Assert the result.
+        """
+        handler = StorageHandler(Auth.CREDENTIALS_FILE)
+        result, error = handler.create_folder(StorageUtils.TEST_FOLDER_NAME)
+        assert result, "Failed to create new folder: {}".format(error)
+        result, error = handler.create_file(StorageUtils.TEST_FILE_PDF,
+                                            StorageUtils.TEST_FOLDER_NAME)
+        assert result, "Failed to create new file: {}".format(error)
+
+        result, error = handler.exist(StorageUtils.TEST_FOLDER_NAME)
+        assert result and not error
+        result, error = handler.share_folder(StorageUtils.TEST_FOLDER_NAME,
+                                             EmailUtils.TEST_EMAIL)
+        assert result, "Failed to share folder: {}".format(error)
+
+        result, error = handler.delete_folder(StorageUtils.TEST_FOLDER_NAME)
+        assert result, "Failed to delete folder: {}".format(error)
+        assert list(fake_google.backend.files) == ['root']
+
+    def test_query(self):
+        """
+        Compile Drive queries. Assert they match the expected files.
+        """
+        file = {'name': "it's", 'mimeType': fake_google.FOLDER_MIME_TYPE,
+                'trashed': False, 'parents': ['abc']}
+        match = fake_google.compile_query
+        assert match("name='it\\'s' and trashed=false")(file)
+        assert match("'abc' in parents and not name contains 'x'")(file)
+        assert match("(name='a' or name='it\\'s') and 'abc' in parents")(file)
+        assert not match("name='a' or trashed=true")(file)
+        with self.assertRaises(ValueError):
+            match("name='a' and [abc] in parents")
+
+    def test_error_rate(self):
+        """
+        Inject a 100% error rate. Assert calls fail with a 503.
+        """
+        fake_google.backend.configure(error_rate=1)
+        service = fake_google.backend.build('drive', 'v3')
+        with self.assertRaises(errors.HttpError) as context:
+            service.files().list(q="name='a'").execute()
+        assert context.exception.resp.status == 503
+
+    def test_fields(self):
+        """
+        Request a partial response. Assert only the masked fields are sent.
+        """
+        service = fake_google.backend.build('drive', 'v3')
+        service.files().create(body={'name': 'a'}).execute()
+        response = service.files().list(
+            q="name='a'", fields='nextPageToken, files(id)').execute()
+        assert list(response) == ['files']
+        assert list(response['files'][0]) == ['id']
+
+    def test_ids(self):
+        """
+        Create resources and address them by the returned IDs. Assert no
+        name lookup is needed.
+        """
+        handler = StorageHandler(Auth.CREDENTIALS_FILE)
+        result, folder_id = handler.create_folder(
+            StorageUtils.TEST_FOLDER_NAME)
+        assert result, "Failed to create new folder: {}".format(folder_id)
+        result, file_id = handler.create_file(StorageUtils.TEST_FILE_PDF,
+                                              parent_id=folder_id)
+        assert result, "Failed to create new file: {}".format(file_id)
+        assert fake_google.backend.files[file_id]['parents'] == [folder_id]
+
+        calls = fake_google.backend.call_count
+        assert handler.exist(file_id=file_id) == (True, None)
+        result, error = handler.share_folder(None, EmailUtils.TEST_EMAIL,
+                                             folder_id=folder_id)
+        assert result, "Failed to share folder: {}".format(error)
+        result, error = handler.delete_folder(folder_id=folder_id)
+        assert result, "Failed to delete folder: {}".format(error)
+        assert fake_google.backend.call_count == calls + 3
+        assert handler.exist(file_id=file_id) == (False, None)
+
+        handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+        result, calendar_id = handler.create_calendar(
+            'Team', MeetingUtils.TEST_TIMEZONE)
+        assert result, "Error creating calendar: {}".format(calendar_id)
+        result, event_id = handler.create_event(
+            calendar_id, MeetingUtils.TEST_SUMMARY,
+            MeetingUtils.TEST_ATTENDEES, '2030-01-01T10:00:00-03:00',
+            '2030-01-01T11:00:00-03:00', MeetingUtils.TEST_TIMEZONE,
+            MeetingUtils.TEST_LOCATION)
+        assert result, "Error creating event: {}".format(event_id)
+        result, error = handler.delete_event(calendar_id, event_id=event_id)
+        assert result, "Error deleting event: {}".format(error)
+        result, error = handler.delete_calendar(calendar_id=calendar_id)
+        assert result, "Error deleting calendar: {}".format(error)
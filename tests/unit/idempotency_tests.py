@@ -0,0 +1,174 @@
+import asyncio
+import json
+import unittest
+
+from api import IdempotentRequests
+from consts.auth import Auth
+from consts.backend import Backend
+from helpers import fake_google
+from helpers.meeting_helper import MeetingHandler
+from utils.idempotency import idempotency_store, request_id
+
+
+class _App:
+    """
+    ASGI application counting its calls, answering with the request body
+    and the status code of its path, e.g. /500.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = None
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        if self.gate is not None:
+            await self.gate.wait()
+        status = int(scope['path'].strip('/') or 200)
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body',
+                    'body': json.dumps({'calls': self.calls,
+                                        'body': body.decode()}).encode()})
+
+
+async def _request(app, body, key='key-1', path='/200', account=None):
+    headers = [(b'content-type', b'application/json')]
+    if key is not None:
+        headers.append((b'idempotency-key', key.encode()))
+    if account is not None:
+        headers.append((b'x-google-account', account.encode()))
+    chunks = [body[:2].encode(), body[2:].encode()]
+    messages = []
+
+    async def receive():
+        if chunks:
+            return {'type': 'http.request', 'body': chunks.pop(0),
+                    'more_body': bool(chunks)}
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({'type': 'http', 'method': 'POST', 'path': path,
+               'headers': headers}, receive, send)
+    return (messages[0]['status'], dict(messages[0]['headers']),
+            json.loads(messages[1]['body']))
+
+
+class TestIdempotentRequests(unittest.TestCase):
+    """
+    This class implements all the unit tests for the Idempotency-Key
+    middleware.
+    """
+
+    def setUp(self):
+        idempotency_store.clear()
+        self.app = _App()
+        self.middleware = IdempotentRequests(self.app)
+
+    def _request(self, *args, **kwargs):
+        return asyncio.run(_request(self.middleware, *args, **kwargs))
+
+    def test_replay(self):
+        """
+        Retry a request with the same key. Assert it is answered from the
+        store without running the request again.
+        """
+        status, _, first = self._request('{"a": 1}')
+        status, headers, replay = self._request('{"a": 1}')
+        assert status == 200 and replay == first
+        assert headers[b'idempotent-replayed'] == b'true'
+        assert self.app.calls == 1
+
+    def test_scope(self):
+        """
+        Send the same body without a key, with another key and from another
+        account. Assert every request runs.
+        """
+        self._request('{}')
+        self._request('{}', key=None)
+        self._request('{}', key=None)
+        self._request('{}', key='key-2')
+        self._request('{}', account='other@example.com')
+        assert self.app.calls == 5
+
+    def test_mismatch(self):
+        """
+        Reuse a key with a different body. Assert the request is rejected.
+        """
+        self._request('{"a": 1}')
+        status, _, body = self._request('{"a": 2}')
+        assert status == 422, body
+        assert self.app.calls == 1
+
+    def test_errors(self):
+        """
+        Retry a request that failed with a server error, and one with an
+        invalid key. Assert the server error runs again.
+        """
+        self._request('{}', path='/500')
+        status, _, _ = self._request('{}', path='/500')
+        assert status == 500 and self.app.calls == 2
+        status, _, _ = self._request('{}', key='')
+        assert status == 400 and self.app.calls == 2
+
+    def test_concurrent(self):
+        """
+        Retry a request while it still runs. Assert the retry gets a 409 and
+        the request completes once.
+        """
+        async def run():
+            self.app.gate = asyncio.Event()
+            first = asyncio.ensure_future(_request(self.middleware, '{}'))
+            await asyncio.sleep(0)
+            retry = await _request(self.middleware, '{}')
+            self.app.gate.set()
+            return await first, retry
+
+        first, retry = asyncio.run(run())
+        assert first[0] == 200 and retry[0] == 409
+        assert self.app.calls == 1
+        assert self._request('{}')[2] == first[2]
+
+
+class TestRequestId(unittest.TestCase):
+    """
+    This class implements all the unit tests for the Google request IDs
+    derived from idempotency keys.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def test_conference(self):
+        """
+        Build online events with and without a request ID. Assert only the
+        derived one is stable.
+        """
+        assert request_id('', 'key-1') == request_id('', 'key-1')
+        assert request_id('', 'key-1') != \
+            request_id('a@example.com', 'key-1')
+        fake_google.backend.reset()
+        handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+
+        def _request_id(request=None):
+            event = handler._event_body('Sync', [], '2024-01-01T10:00:00Z',
+                                        '2024-01-01T11:00:00Z', 'UTC',
+                                        'online', request_id=request)
+            return event['conferenceData']['createRequest']['requestId']
+
+        assert _request_id('abc') == 'abc'
+        assert _request_id() != _request_id()
@@ -0,0 +1,188 @@
+import base64
+import unittest
+from email import message_from_bytes
+from unittest import mock
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.mail import Mail
+from helpers import email_helper, fake_google, mail_merge
+from helpers.email_helper import EmailHandler
+from helpers.render_pool import render_pool
+from utils.rate_limit import RateLimits
+
+
+def _decode(raw):
+    return message_from_bytes(base64.urlsafe_b64decode(raw.encode()))
+
+
+class TestTemplate(unittest.TestCase):
+    """
+    This class implements all the unit tests for the mail merge templates.
+    """
+
+    def test_render(self):
+        """
+        Render a template with escaped braces. Assert every placeholder is
+        replaced.
+        """
+        template = mail_merge.Template('Hi {name}, {{not}} {count} left')
+        assert template.fields == {'name', 'count'}
+        assert template.render({'name': 'Ann', 'count': 3}) == \
+            'Hi Ann, {not} 3 left'
+        with self.assertRaises(KeyError) as context:
+            template.render({'name': 'Ann'})
+        assert context.exception.args[0] == 'Missing variable count'
+
+    def test_invalid(self):
+        """
+        Compile templates with attribute access, format specs and unclosed
+        braces. Assert they are rejected.
+        """
+        for text in ('{user.name}', '{0}', '{name:>10}', '{name!r}',
+                     'Hi {name'):
+            with self.assertRaises(ValueError):
+                mail_merge.Template(text)
+
+    def test_render_messages(self):
+        """
+        Render messages, one missing a variable and one with a line break in
+        its subject. Assert only the first is encoded.
+        """
+        messages = mail_merge.render(
+            'me@example.com', mail_merge.Template('Hello {name}'),
+            mail_merge.Template('Dear {name}, this is for {recipient}'),
+            [('ann@example.com', {'name': 'Ann'}),
+             ('bob@example.com', {}),
+             ('eve@example.com', {'name': 'Eve\nBcc: x@example.com'})])
+        raw, err = messages[0]
+        assert err is None
+        message = _decode(raw)
+        assert message['subject'] == 'Hello Ann'
+        assert message.get_payload() == \
+            'Dear Ann, this is for ann@example.com'
+        assert messages[1] == (None, 'Missing variable name')
+        assert messages[2][0] is None
+
+
+class TestSendMerge(unittest.TestCase):
+    """
+    This class implements all the unit tests for the mail merge of the
+    EmailHandler, run against the fake backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend, without the Gmail quota.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+        cls.quota = mock.patch.object(
+            email_helper, 'send_quota',
+            RateLimits('gmail_send', 1e9, Mail.BATCH_SIZE * Mail.SEND_UNITS))
+        cls.quota.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.quota.stop()
+        render_pool.shutdown()
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.handler = EmailHandler(Auth.CREDENTIALS_FILE)
+        self.subject = mail_merge.Template('Hello {name}')
+        self.body = mail_merge.Template('Dear {name}')
+
+    def _recipients(self, count):
+        return [('user-{}@example.com'.format(i),
+                 {'name': 'User {}'.format(i)}) for i in range(count)]
+
+    def test_batches(self):
+        """
+        Send a merge of 120 recipients, one missing its variables. Assert
+        the valid messages are sent in 3 batch requests and every
+        recipient gets a status.
+        """
+        recipients = self._recipients(120)
+        recipients[7] = ('bad@example.com', {})
+        result, report = self.handler.send_merge(
+            'me@example.com', self.subject, self.body, recipients)
+        assert result, report
+        assert (report['sent'], report['failed'], report['invalid']) == \
+            (119, 0, 1)
+        assert fake_google.backend.call_count == 3
+        assert report['results'][7] == {
+            'recipient': 'bad@example.com', 'status': 'invalid',
+            'error': 'Missing variable name'}
+        assert report['results'][8]['recipient'] == 'user-8@example.com'
+        assert report['results'][8]['message_id']
+        assert _decode(fake_google.backend.messages[0]['raw'])['subject'] \
+            == 'Hello User 0'
+
+    def test_quota(self):
+        """
+        Send a merge with the default Gmail quota. Assert batches are cut
+        to the messages the quota allows per second.
+        """
+        with mock.patch.object(email_helper, 'send_quota',
+                               RateLimits('gmail_send', 1e9, 250)):
+            result, report = self.handler.send_merge(
+                'me@example.com', self.subject, self.body,
+                self._recipients(6))
+        assert result and report['sent'] == 6
+        assert fake_google.backend.call_count == 3
+
+    def test_send_quota(self):
+        """
+        Send a single email. Assert it waits for the send quota of the
+        account, as the merge batches do.
+        """
+        with mock.patch.object(email_helper, 'send_quota') as quota:
+            result, error = self.handler.send_email(
+                'ann@example.com', 'me@example.com', 'Body', 'Subject')
+        assert result, error
+        quota.get.assert_called_once_with(self.handler.account)
+        quota.get.return_value.acquire.assert_called_once_with(
+            Mail.SEND_UNITS)
+
+    def test_retry(self):
+        """
+        Rate limit the first message of a batch. Assert it is retried in
+        a second batch and sent.
+        """
+        execute_batch = self.handler._execute_batch
+        failures = []
+
+        def _execute_batch(requests):
+            outcomes = execute_batch(requests)
+            if not failures:
+                failures.append(outcomes[0])
+                outcomes[0] = (None, fake_google.http_error(
+                    429, 'rateLimitExceeded', 'Rate Limit Exceeded'))
+            return outcomes
+
+        with mock.patch.object(self.handler, '_execute_batch',
+                               _execute_batch), \
+                mock.patch.object(Mail, 'RETRY_DELAY', 0):
+            result, report = self.handler.send_merge(
+                'me@example.com', self.subject, self.body,
+                self._recipients(3))
+        assert result and report['sent'] == 3
+        assert len(failures) == 1
+        assert fake_google.backend.call_count == 2
+
+    def test_process_pool(self):
+        """
+        Send a merge large enough to be rendered in the render processes.
+        Assert every message is sent in order.
+        """
+        with mock.patch.object(Mail, 'RENDER_PROCESS_THRESHOLD', 10):
+            result, report = self.handler.send_merge(
+                'me@example.com', self.subject, self.body,
+                self._recipients(250))
+        assert result and report['sent'] == 250
+        assert [result['recipient'] for result in report['results']] == \
+            [recipient for recipient, _ in self._recipients(250)]
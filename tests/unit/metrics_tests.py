@@ -0,0 +1,52 @@
+import unittest
+
+from utils.metrics import Counter, Histogram, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    This class implements all the unit tests for the metrics registry.
+    """
+
+    def test_counter(self):
+        """
+        Increment a labelled counter and assert its exposition.
+        """
+        counter = Counter('calls_total', 'Calls.', ('method', 'status'))
+        counter.inc(method='drive.files.list', status='ok')
+        counter.inc(2, method='drive.files.list', status='ok')
+
+        assert counter.value(method='drive.files.list', status='ok') == 3
+        assert counter.collect() == [
+            'calls_total{method="drive.files.list",status="ok"} 3']
+
+    def test_histogram(self):
+        """
+        Observe values on a histogram and assert the cumulative buckets.
+        """
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',),
+                              buckets=(0.1, 1.0))
+        histogram.observe(0.05, route='/x')
+        histogram.observe(0.5, route='/x')
+        histogram.observe(5, route='/x')
+
+        lines = histogram.collect()
+        assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/x",le="1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{route="/x"} 3' in lines
+        assert histogram.count(route='/x') == 3
+
+    def test_render(self):
+        """
+        Render a registry and assert the help and type headers.
+        """
+        registry = Metrics()
+        registry.http_requests.inc(method='POST', route='/email/send_email',
+                                   status='200')
+        text = registry.render()
+
+        assert '# TYPE http_requests_total counter' in text
+        assert '# TYPE http_request_duration_seconds histogram' in text
+        assert 'http_requests_total{method="POST",' \
+            'route="/email/send_email",status="200"} 1' in text
@@ -0,0 +1,80 @@
+import base64
+import os
+import tempfile
+import unittest
+from email import message_from_bytes
+from unittest import mock
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.mail import Mail
+from helpers import fake_google, mime_builder
+from helpers.email_helper import EmailHandler
+from helpers.render_pool import render_pool
+
+
+def _decode(raw):
+    return message_from_bytes(base64.urlsafe_b64decode(raw.encode()))
+
+
+class TestMimeBuilder(unittest.TestCase):
+    """
+    This class implements all the unit tests for the building of emails
+    with attachement, in process and in the render processes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        render_pool.shutdown()
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        """
+        Write a binary attachement.
+        """
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.data = os.urandom(64 * 1024)
+        f = tempfile.NamedTemporaryFile(suffix='.bin', delete=False)
+        f.write(self.data)
+        f.close()
+        self.path = f.name
+        self.addCleanup(os.remove, self.path)
+
+    def _check(self, raw):
+        message = _decode(raw)
+        assert message['subject'] == 'Report'
+        text, attachement = message.get_payload()
+        assert text.get_payload() == 'See attached'
+        assert attachement.get_filename() == os.path.basename(self.path)
+        assert attachement.get_payload(decode=True) == self.data
+
+    def test_build(self):
+        """
+        Build an email with a binary attachement. Assert the attachement is
+        decoded back unchanged.
+        """
+        self._check(mime_builder.build_attachement(
+            'ann@example.com', 'me@example.com', 'See attached', 'Report',
+            self.path))
+
+    def test_send_process(self):
+        """
+        Send an email with an attachement above the process threshold.
+        Assert it is built in the render processes and sent.
+        """
+        with mock.patch.object(Mail, 'MIME_PROCESS_THRESHOLD', 1024):
+            result, err = EmailHandler(Auth.CREDENTIALS_FILE)\
+                .send_email_attachement('ann@example.com', 'me@example.com',
+                                        'See attached', 'Report', self.path)
+        assert result, err
+        assert render_pool._executor is not None
+        self._check(fake_google.backend.messages[0]['raw'])
@@ -0,0 +1,161 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from consts.auth import Auth
+from consts.backend import Backend
+from helpers import fake_google, recurrence
+from helpers.meeting_helper import MeetingHandler
+
+
+def _weekly(weeks, hour=10, day=6, step=7):
+    first = datetime(2024, 5, day, hour,
+                     tzinfo=timezone(timedelta(hours=-3)))
+    return [((first + timedelta(days=i * step)).isoformat(),
+             (first + timedelta(days=i * step, minutes=30)).isoformat())
+            for i in range(weeks)]
+
+
+class TestRecurrence(unittest.TestCase):
+    """
+    This class implements all the unit tests for the collapsing of bulk
+    event rows into recurring events.
+    """
+
+    def test_rule(self):
+        """
+        Build rules of several steps. Assert weekly steps use FREQ=WEEKLY.
+        """
+        assert recurrence.rule(7, 4) == 'RRULE:FREQ=WEEKLY;COUNT=4'
+        assert recurrence.rule(14, 2) == \
+            'RRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=2'
+        assert recurrence.rule(3, 5) == 'RRULE:FREQ=DAILY;INTERVAL=3;COUNT=5'
+
+    def test_collapse(self):
+        """
+        Collapse weekly rows, out of order, next to rows with other
+        attendees, times and an irregular step. Assert only the regular
+        runs share an event.
+        """
+        rows = [('a', start, end) for start, end in _weekly(4)][::-1]
+        rows.append(('b', *_weekly(1)[0]))
+        rows.append(('a', *_weekly(1, hour=15)[0]))
+        rows.extend(('a', start, end)
+                    for start, end in _weekly(3, day=1, step=1))
+        rows.append(('a', '2024-05-09T10:00:00-03:00',
+                     '2024-05-09T10:30:00-03:00'))
+        events = recurrence.collapse(rows, 'America/Sao_Paulo')
+        assert events == [
+            ([3, 2, 1, 0], 'RRULE:FREQ=WEEKLY;COUNT=4'),
+            ([4], None),
+            ([5], None),
+            ([6, 7, 8], 'RRULE:FREQ=DAILY;COUNT=3'),
+            ([9], None)]
+
+    def test_dst(self):
+        """
+        Collapse weekly rows crossing the start of DST in New York, once at
+        a constant local time and once at a constant UTC time. Assert only
+        rows at the same local time share a rule.
+        """
+        local = [('2024-03-04T10:00:00-05:00', '2024-03-04T11:00:00-05:00'),
+                 ('2024-03-11T10:00:00-04:00', '2024-03-11T11:00:00-04:00'),
+                 ('2024-03-18T10:00:00-04:00', '2024-03-18T11:00:00-04:00')]
+        assert recurrence.collapse([('a', *row) for row in local],
+                                   'America/New_York') == \
+            [([0, 1, 2], 'RRULE:FREQ=WEEKLY;COUNT=3')]
+        utc = [('2024-03-{:02d}T15:00:00Z'.format(day),
+                '2024-03-{:02d}T16:00:00Z'.format(day)) for day in (4, 11, 18)]
+        assert recurrence.collapse([('a', *row) for row in utc],
+                                   'America/New_York') == \
+            [([0], None), ([1, 2], 'RRULE:FREQ=WEEKLY;COUNT=2')]
+        assert recurrence.collapse([('a', *row) for row in utc], 'UTC') == \
+            [([0, 1, 2], 'RRULE:FREQ=WEEKLY;COUNT=3')]
+        with self.assertRaises(ValueError):
+            recurrence.collapse([('a', *utc[0])], 'Mars/Olympus_Mons')
+
+    def test_validate(self):
+        """
+        Validate recurrence lines. Assert anything but rule lines is
+        rejected.
+        """
+        recurrence.validate(['RRULE:FREQ=DAILY;COUNT=2',
+                             'EXDATE:20240507T130000Z'])
+        with self.assertRaises(ValueError):
+            recurrence.validate(['FREQ=DAILY'])
+
+
+class TestCreateEvents(unittest.TestCase):
+    """
+    This class implements all the unit tests for the bulk event creation of
+    the MeetingHandler, run against the fake backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+
+    def test_create_events(self):
+        """
+        Create a semester of weekly meetings and two one-off meetings.
+        Assert three events are created in a single batch, each with its
+        own Meet conference.
+        """
+        attendees = ['a@example.com', 'b@example.com']
+        rows = [{'summary': 'Weekly', 'attendees': attendees,
+                 'location': 'online', 'start': start, 'end': end}
+                for start, end in _weekly(15, day=1)]
+        rows.extend({'summary': summary, 'attendees': attendees[:1],
+                     'location': 'online', 'start': start, 'end': end}
+                    for summary, (start, end) in zip(
+                        ('Review', 'Retro'), _weekly(2, hour=16, step=3)))
+
+        calls = fake_google.backend.call_count
+        result, report = self.handler.create_events('primary', rows, 'UTC')
+        assert result, report
+        assert fake_google.backend.call_count - calls == 1
+        assert report['failed'] == {}
+        assert [(event['rows'], event['recurrence'])
+                for event in report['events']] == [
+            (list(range(15)), 'RRULE:FREQ=WEEKLY;COUNT=15'),
+            ([15], None), ([16], None)]
+        assert fake_google.backend.notified_count == 4
+
+        events = fake_google.backend.events['primary']
+        weekly = events[report['events'][0]['event_id']]
+        assert weekly['recurrence'] == ['RRULE:FREQ=WEEKLY;COUNT=15']
+        assert len({event['conferenceData']['createRequest']['requestId']
+                    for event in events.values()}) == 3
+
+    def test_dst(self):
+        """
+        Create weekly meetings at 15:00 UTC in New York across the start of
+        DST. Assert every instance Google expands starts at its row time.
+        """
+        rows = [{'summary': 'Weekly', 'attendees': [], 'location': 'online',
+                 'start': '2024-03-{:02d}T15:00:00Z'.format(day),
+                 'end': '2024-03-{:02d}T16:00:00Z'.format(day)}
+                for day in (4, 11, 18, 25)]
+        result, report = self.handler.create_events('primary', rows,
+                                                    'America/New_York')
+        assert result, report
+        assert len(report['events']) == 2
+        instances = fake_google.backend.events_list(
+            'primary', singleEvents=True)['items']
+        starts = sorted(datetime.fromisoformat(
+            instance['start']['dateTime']).astimezone(timezone.utc)
+            for instance in instances)
+        assert starts == [datetime(2024, 3, day, 15, tzinfo=timezone.utc)
+                          for day in (4, 11, 18, 25)]
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from consts.mail import Mail
+from helpers import sender_pool
+from helpers.sender_pool import SenderPool
+
+
+ACCOUNTS = ['a@example.com', 'b@example.com', 'c@example.com']
+
+
+class TestSenderPool(unittest.TestCase):
+    """
+    This class implements all the unit tests for the scheduling of
+    outbound mail over the accounts of the sender pool.
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(sender_pool.time, 'monotonic',
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = SenderPool(ACCOUNTS, daily_limit=5)
+
+    def test_shard(self):
+        """
+        Shard messages of an alias sender. Assert they are spread evenly
+        and the next message goes to the least used account.
+        """
+        assert self.pool.shard('noreply@example.com', 7) == \
+            [('a@example.com', 3), ('b@example.com', 2),
+             ('c@example.com', 2)]
+        assert self.pool.choose('noreply@example.com') == 'b@example.com'
+        assert [self.pool.remaining(account) for account in ACCOUNTS] == \
+            [2, 2, 3]
+
+    def test_pinned(self):
+        """
+        Send as one of the accounts of the pool. Assert every message is
+        sent from it, regardless of case.
+        """
+        assert self.pool.shard('B@example.com', 4) == [('b@example.com', 4)]
+        assert self.pool.shard('b@example.com', 2) == []
+        assert self.pool.choose('b@example.com') == 'b@example.com'
+        assert self.pool.choose('b@example.com') is None
+
+    def test_quota(self):
+        """
+        Exhaust the daily quota, give some back and let the window pass.
+        Assert the quota is only available again when released or expired.
+        """
+        assert self.pool.shard('noreply@example.com', 16) == []
+        assert len(self.pool.shard('noreply@example.com', 15)) == 3
+        assert self.pool.choose('noreply@example.com') is None
+        self.pool.release('c@example.com', 2)
+        assert self.pool.remaining('c@example.com') == 2
+        self.now += Mail.DAILY_WINDOW
+        assert [self.pool.remaining(account) for account in ACCOUNTS] == \
+            [5, 5, 5]
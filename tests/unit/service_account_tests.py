@@ -0,0 +1,83 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.oauth2 import service_account
+
+from consts.auth import Auth
+from helpers.service_account import DelegatedCredentials
+
+
+class TestDelegatedCredentials(unittest.TestCase):
+    """
+    This class implements all the unit tests for the DelegatedCredentials
+    class. Token minting is stubbed, so no network access is needed.
+    """
+
+    def setUp(self):
+        """
+        Write a service account key file in a temporary directory.
+        """
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = key.private_bytes(serialization.Encoding.PEM,
+                                serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'service_account.json')
+        with open(self.path, 'w') as f:
+            json.dump({'type': 'service_account',
+                       'project_id': 'project',
+                       'private_key_id': 'key-id',
+                       'private_key': pem,
+                       'client_email': 'sa@project.iam.gserviceaccount.com',
+                       'client_id': '1',
+                       'token_uri': 'https://oauth2.googleapis.com/token'},
+                      f)
+        self.minted = []
+        self.lifetime = datetime.timedelta(hours=1)
+
+        def _refresh(credentials, request):
+            self.minted.append(credentials._subject)
+            credentials.token = 'token-{}'.format(len(self.minted))
+            credentials.expiry = datetime.datetime.utcnow() + self.lifetime
+
+        patcher = mock.patch.object(service_account.Credentials, 'refresh',
+                                    _refresh)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.credentials = DelegatedCredentials(self.path, Auth.SCOPES,
+                                                margin=300)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cached_per_subject(self):
+        """
+        Get the credentials of two subjects twice. Assert one token is minted
+        per subject.
+        """
+        first = self.credentials.get('a@example.com')
+        assert self.credentials.get('a@example.com') is first
+        second = self.credentials.get('b@example.com')
+
+        assert first.token != second.token
+        assert self.minted == ['a@example.com', 'b@example.com']
+
+    def test_renewed_before_expiry(self):
+        """
+        Get credentials whose token expires within the margin. Assert a new
+        token is minted.
+        """
+        self.lifetime = datetime.timedelta(seconds=60)
+        self.credentials.get('a@example.com')
+        self.lifetime = datetime.timedelta(hours=1)
+        credentials = self.credentials.get('a@example.com')
+
+        assert self.minted == ['a@example.com', 'a@example.com']
+        assert credentials.token == 'token-2'
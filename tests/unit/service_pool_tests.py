@@ -0,0 +1,73 @@
+import unittest
+
+from consts.auth import Auth
+from consts.backend import Backend
+from helpers import fake_google
+from helpers.email_helper import EmailHandler
+from helpers.service_pool import ServicePool
+from helpers.storage_helper import StorageHandler
+
+
+class TestServicePool(unittest.TestCase):
+    """
+    This class implements all the unit tests for the ServicePool class.
+    The handlers are built against the fake Google backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        self.pool = ServicePool(max_size=2)
+
+    def test_reuse(self):
+        """
+        Get the same handler twice. Assert it is built only once.
+        """
+        handler = self.pool.get(EmailHandler)
+        assert self.pool.get(EmailHandler) is handler
+        assert self.pool.get(EmailHandler, 'other@example.com') is not handler
+        assert self.pool.get(StorageHandler) is not handler
+
+    def test_eviction(self):
+        """
+        Get more handlers than the pool size. Assert the least recently used
+        one is evicted.
+        """
+        first = self.pool.get(EmailHandler, 'first@example.com')
+        second = self.pool.get(EmailHandler, 'second@example.com')
+        self.pool.get(EmailHandler, 'first@example.com')
+        self.pool.get(EmailHandler, 'third@example.com')
+
+        assert len(self.pool) == 2
+        assert self.pool.get(EmailHandler, 'first@example.com') is first
+        assert self.pool.get(EmailHandler, 'second@example.com') is not second
+
+    def test_evict_account(self):
+        """
+        Evict an account. Assert its handlers are built again.
+        """
+        handler = self.pool.get(EmailHandler, 'first@example.com')
+        self.pool.evict('first@example.com')
+        assert self.pool.get(EmailHandler, 'first@example.com') is not handler
+
+    def test_credentials_file(self):
+        """
+        Resolve the credentials file of accounts. Assert invalid account
+        identifiers are rejected.
+        """
+        assert Auth.credentials_file() == Auth.CREDENTIALS_FILE
+        assert Auth.credentials_file('a@example.com').endswith(
+            'a@example.com.json')
+        with self.assertRaises(ValueError):
+            Auth.credentials_file('../credentials')
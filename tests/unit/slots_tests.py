@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+
+from consts.auth import Auth
+from consts.backend import Backend
+from helpers import fake_google, slots
+from helpers.meeting_helper import MeetingHandler
+
+
+# Monday 2024-05-06 00:00:00 UTC.
+MONDAY = 1714953600
+HOUR = 3600
+
+
+class TestSlots(unittest.TestCase):
+    """
+    This class implements all the unit tests for the interval operations of
+    the slot search.
+    """
+
+    def test_gaps(self):
+        """
+        Merge overlapping, nested and touching intervals out of order.
+        Assert only the holes between them are returned.
+        """
+        starts = np.array([5, 1, 2, 8, 12], dtype=np.int64)
+        ends = np.array([7, 4, 3, 12, 13], dtype=np.int64)
+        gap_starts, gap_ends = slots.gaps(starts, ends, 0, 20)
+        assert list(zip(gap_starts, gap_ends)) == [(0, 1), (4, 5), (7, 8),
+                                                   (13, 20)]
+        gap_starts, gap_ends = slots.gaps(starts[:0], ends[:0], 0, 20)
+        assert list(zip(gap_starts, gap_ends)) == [(0, 20)]
+
+    def test_working_hours(self):
+        """
+        Build 9 to 18 working hours at -03:00 over a week. Assert the weekend
+        is skipped and the hours are shifted to UTC.
+        """
+        starts, ends = slots.working_hours(
+            MONDAY, MONDAY + 7 * slots.DAY, 9 * HOUR, 18 * HOUR,
+            slots.parse_offset('-03:00'), [0, 1, 2, 3, 4])
+        assert len(starts) == 5
+        assert slots.format_time(starts[0], 0) == '2024-05-06T12:00:00+00:00'
+        assert slots.format_time(ends[-1], 0) == '2024-05-10T21:00:00+00:00'
+
+    def test_free_slots(self):
+        """
+        Find hour long slots around busy time within working hours. Assert
+        slots fill each gap before moving to the next and stop at count.
+        """
+        work = slots.working_hours(MONDAY, MONDAY + 2 * slots.DAY, 9 * HOUR,
+                                   13 * HOUR, 0, [0, 1, 2, 3, 4])
+        starts = np.array([MONDAY + 9 * HOUR + 1800, MONDAY + 11 * HOUR],
+                          dtype=np.int64)
+        ends = np.array([MONDAY + 10 * HOUR, MONDAY + 13 * HOUR],
+                        dtype=np.int64)
+        slot_starts, slot_ends = slots.free_slots(
+            starts, ends, MONDAY, MONDAY + 2 * slots.DAY, HOUR, 3, work)
+        assert [(start - MONDAY) / HOUR for start in slot_starts] == \
+            [10, 24 + 9, 24 + 10]
+        assert list(slot_ends - slot_starts) == [HOUR] * 3
+
+
+class TestFindSlots(unittest.TestCase):
+    """
+    This class implements all the unit tests for the slot search of the
+    MeetingHandler, run against the fake backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.handler = MeetingHandler(Auth.CREDENTIALS_FILE)
+
+    def test_find_slots(self):
+        """
+        Busy 120 attendees on Monday morning, one of them all day. Assert the
+        attendees are split in 50 item queries sent in a single batch, and
+        the first slots are on Tuesday.
+        """
+        attendees = ['user-{}@example.com'.format(i) for i in range(120)]
+        for start, end, invited in (('09:00', '12:00', attendees),
+                                    ('12:00', '18:00', attendees[-1:])):
+            fake_google.backend.events_insert('primary', {
+                'start': {'dateTime': '2024-05-06T{}:00-03:00'.format(start)},
+                'end': {'dateTime': '2024-05-06T{}:00-03:00'.format(end)},
+                'attendees': [{'email': email} for email in invited]})
+
+        calls = fake_google.backend.call_count
+        result, found = self.handler.find_slots(
+            attendees, MONDAY, MONDAY + 7 * slots.DAY, 2 * HOUR, count=2,
+            work_start=9 * HOUR, work_end=18 * HOUR,
+            offset=slots.parse_offset('-03:00'))
+        assert result, found
+        assert fake_google.backend.call_count - calls == 1
+        assert found['errors'] == {}
+        assert found['slots'] == [
+            {'start': '2024-05-07T09:00:00-03:00',
+             'end': '2024-05-07T11:00:00-03:00'},
+            {'start': '2024-05-07T11:00:00-03:00',
+             'end': '2024-05-07T13:00:00-03:00'}]
@@ -0,0 +1,181 @@
+import smtplib
+import socket
+import unittest
+from base64 import urlsafe_b64encode
+from email import message_from_bytes
+from unittest import mock
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.mail import Mail
+from helpers import email_helper, fake_google, mail_merge
+from helpers.email_helper import EmailHandler
+from helpers.fake_smtp import FakeSmtpServer
+from helpers.smtp_pool import SmtpPool
+
+
+def _message(recipient, text):
+    return b'To: ' + recipient.encode() + b'\n\n' + text + b'\n'
+
+
+class TestSmtpPool(unittest.TestCase):
+    """
+    This class implements all the unit tests for the pooled SMTP
+    connections, run against a local SMTP stand-in.
+    """
+
+    def setUp(self):
+        self.server = FakeSmtpServer(tokens={'token'})
+        host, port = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.pool = SmtpPool(host, port, starttls=False, size=2)
+        self.addCleanup(self.pool.close)
+
+    def test_pipelining(self):
+        """
+        Send messages in two calls. Assert a single connection logs in once
+        and the messages arrive with their periods unescaped.
+        """
+        outcomes = self.pool.send('ann@example.com', 'token', [
+            ('ann@example.com', ['bob@example.com'],
+             _message('bob@example.com', b'.hidden line')),
+            ('ann@example.com', ['eve@example.com'],
+             _message('eve@example.com', b'Hi'))])
+        assert outcomes == [None, None]
+        assert self.pool.send('ann@example.com', 'token', [
+            ('ann@example.com', ['bob@example.com'],
+             _message('bob@example.com', b'Again'))]) == [None]
+        assert self.server.connections == 1
+        assert self.server.logins == ['ann@example.com']
+        sender, recipients, data = self.server.messages[0]
+        assert (sender, recipients) == ('ann@example.com',
+                                        ['bob@example.com'])
+        assert data == b'To: bob@example.com\r\n\r\n.hidden line\r\n'
+
+    def test_refused(self):
+        """
+        Send a message to a rejected recipient between two valid ones, with
+        and without pipelining. Assert only that message fails.
+        """
+        self.server.rejected.add('nobody@example.com')
+        for pipelining in (True, False):
+            self.server.pipelining = pipelining
+            self.pool.close()
+            outcomes = self.pool.send('ann@example.com', 'token', [
+                ('ann@example.com', [recipient], _message(recipient, b'Hi'))
+                for recipient in ('bob@example.com', 'nobody@example.com',
+                                  'eve@example.com')])
+            assert outcomes[0] is None and outcomes[2] is None
+            assert isinstance(outcomes[1], smtplib.SMTPRecipientsRefused)
+        assert len(self.server.messages) == 4
+
+    def test_dropped(self):
+        """
+        Send over an idle connection the server dropped. Assert the pool
+        reconnects and the message is sent once.
+        """
+        self.pool.send('ann@example.com', 'token', [])
+        self.pool._idle[0][1].sock.shutdown(socket.SHUT_RDWR)
+        assert self.pool.send('ann@example.com', 'token', [
+            ('ann@example.com', ['bob@example.com'],
+             _message('bob@example.com', b'Hi'))]) == [None]
+        assert self.server.connections == 2
+        assert len(self.server.messages) == 1
+
+    def test_login(self):
+        """
+        Log in with a token the server rejects. Assert every message fails.
+        """
+        outcomes = self.pool.send('ann@example.com', 'expired', [
+            ('ann@example.com', ['bob@example.com'], b'Hi')] * 2)
+        assert all(isinstance(outcome, smtplib.SMTPAuthenticationError)
+                   for outcome in outcomes)
+        assert self.pool._open == 0
+
+
+class TestSmtpDelivery(unittest.TestCase):
+    """
+    This class implements all the unit tests for the SMTP delivery of the
+    EmailHandler.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend and the SMTP delivery.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+        cls.delivery = mock.patch.object(Mail, 'DELIVERY', Mail.SMTP)
+        cls.delivery.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.delivery.stop()
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        fake_google.backend.reset()
+        self.server = FakeSmtpServer()
+        host, port = self.server.start()
+        self.addCleanup(self.server.stop)
+        pool = SmtpPool(host, port, starttls=False)
+        self.addCleanup(pool.close)
+        patcher = mock.patch.object(email_helper, 'smtp_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.handler = EmailHandler(Auth.CREDENTIALS_FILE, 'me@example.com')
+
+    def test_send_email(self):
+        """
+        Send an email. Assert it is delivered over SMTP, not the Gmail API.
+        """
+        result, err = self.handler.send_email(
+            'Bob <bob@example.com>', 'me@example.com', 'Hi', 'Hello')
+        assert result, err
+        assert fake_google.backend.call_count == 0
+        sender, recipients, data = self.server.messages[0]
+        assert (sender, recipients) == ('me@example.com', ['bob@example.com'])
+        message = message_from_bytes(data)
+        assert message['subject'] == 'Hello'
+        assert message['message-id'].endswith('@example.com>')
+        assert self.server.logins == ['me@example.com']
+
+    def test_send_merge(self):
+        """
+        Send a merge with a rejected and a deferred recipient. Assert the
+        deferred one is retried and only the rejected one fails.
+        """
+        self.server.rejected.add('user-1@example.com')
+        self.server.deferred.add('user-2@example.com')
+        send = email_helper.smtp_pool.send
+
+        def _send(user, secret, messages):
+            outcomes = send(user, secret, messages)
+            self.server.deferred.clear()
+            return outcomes
+
+        with mock.patch.object(email_helper.smtp_pool, 'send', _send), \
+                mock.patch.object(Mail, 'RETRY_DELAY', 0):
+            result, report = self.handler.send_merge(
+                'me@example.com', mail_merge.Template('Hello {recipient}'),
+                mail_merge.Template('Hi'),
+                [('user-{}@example.com'.format(i), {}) for i in range(4)])
+        assert result, report
+        assert (report['sent'], report['failed']) == (3, 1)
+        assert report['results'][1]['status'] == 'failed'
+        assert report['results'][2]['message_id']
+        assert len(self.server.messages) == 3
+        assert self.server.connections == 1
+
+    def test_default_account(self):
+        """
+        Send from the default account without SMTP_USER. Assert it fails
+        without connecting.
+        """
+        handler = EmailHandler(Auth.CREDENTIALS_FILE)
+        result, err = handler._send_message(
+            'me@example.com', 'bob@example.com',
+            urlsafe_b64encode(b'Subject: Hi\n\nHi').decode())
+        assert not result and 'SMTP_USER' in err
+        assert self.server.connections == 0
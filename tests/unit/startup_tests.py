@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from utils.logger import Logger
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+class TestStartup(unittest.TestCase):
+    """
+    This class implements all the unit tests for the side effects and the
+    imports of the application startup.
+    """
+
+    def test_import(self):
+        """
+        Import the application in a fresh interpreter. Assert no file is
+        written and the heavy modules are left for their first use.
+        """
+        heavy = ['googleapiclient', 'google_auth_oauthlib', 'google.auth',
+                 'email.mime', 'numpy', 'helpers.email_helper',
+                 'helpers.meeting_helper', 'helpers.storage_helper']
+        with tempfile.TemporaryDirectory() as cwd:
+            output = subprocess.check_output(
+                [sys.executable, '-c',
+                 'import json, sys, api; print(json.dumps([module for module'
+                 ' in {} if module in sys.modules]))'.format(heavy)],
+                cwd=cwd, env=dict(os.environ, PYTHONPATH=ROOT))
+            assert os.listdir(cwd) == []
+        assert json.loads(output) == []
+
+    def test_logger(self):
+        """
+        Create a logger and write to it. Assert the log file is only
+        created by the first write.
+        """
+        with tempfile.TemporaryDirectory() as path:
+            logger = Logger(path)
+            assert os.listdir(path) == []
+            logger.log_info("Started")
+            logger.log_error("Failed")
+            logger.log_file.flush()
+            with open(os.path.join(path, 'log.txt')) as f:
+                lines = f.read().splitlines()
+        assert lines[0].endswith('INFO]: Started')
+        assert lines[1].endswith('ERROR]: Failed')
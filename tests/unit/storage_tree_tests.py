@@ -0,0 +1,149 @@
+import unittest
+from unittest import mock
+
+from consts.auth import Auth
+from consts.backend import Backend
+from consts.drive import Drive
+from consts.utils import EmailUtils
+from helpers import fake_google
+from helpers.storage_helper import StorageHandler
+
+
+class TestStorageTree(unittest.TestCase):
+    """
+    This class implements all the unit tests for the recursive folder
+    operations of the StorageHandler, run against the fake backend.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Switch the helpers to the fake backend.
+        """
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        """
+        Create a tree of 3 levels: root/a, root/b, root/a/c holding 40 files
+        each, 163 items in total.
+        """
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        self.batch_size = mock.patch.object(Drive, 'BATCH_SIZE', 25)
+        self.batch_size.start()
+        self.handler = StorageHandler(Auth.CREDENTIALS_FILE)
+
+        _, self.root = self.handler.create_folder('root-folder')
+        self.folders = {'root-folder': self.root}
+        for name, parent in (('a', 'root-folder'), ('b', 'root-folder'),
+                             ('c', 'a')):
+            _, self.folders[name] = self.handler.create_folder(
+                name, parent_id=self.folders[parent])
+        for name in ('root-folder', 'a', 'b', 'c'):
+            for i in range(40):
+                fake_google.backend.files_create(body={
+                    'name': '{}-{}.txt'.format(name, i),
+                    'parents': [self.folders[name]]})
+
+    def tearDown(self):
+        self.batch_size.stop()
+
+    def _tree(self, folder_id, path=''):
+        paths = set()
+        for file in list(fake_google.backend.files.values()):
+            if folder_id in file['parents']:
+                child = '{}/{}'.format(path, file['name'])
+                paths.add(child)
+                paths.update(self._tree(file['id'], child))
+        return paths
+
+    def test_copy_tree(self):
+        """
+        Copy the tree. Assert it is copied in a few batched calls.
+        """
+        calls = fake_google.backend.call_count
+        result, report = self.handler.copy_tree(folder_id=self.root,
+                                                name='copy')
+        assert result, report
+        assert report['done'] == 163 and not report['failed']
+        assert self._tree(report['folder_id']) == self._tree(self.root)
+        # 2 calls for the root, 3 listings and 8 batches of 25 items.
+        assert fake_google.backend.call_count - calls == 13
+
+    def test_share_tree(self):
+        """
+        Share and unshare the tree. Assert every item gets and loses its
+        permission.
+        """
+        result, report = self.handler.share_tree(
+            None, EmailUtils.TEST_EMAIL, folder_id=self.root)
+        assert result, report
+        assert report['done'] == 164 and not report['failed']
+        shared = [file for file in fake_google.backend.files.values()
+                  if file['permissions']]
+        assert len(shared) == 164
+
+        result, report = self.handler.unshare_tree(
+            'root-folder', EmailUtils.TEST_EMAIL.upper())
+        assert result, report
+        assert report['done'] == 164 and not report['failed']
+        assert not any(file['permissions']
+                       for file in fake_google.backend.files.values())
+
+    def test_unshare_pages(self):
+        """
+        Unshare a tree whose folder has more permissions than a page, the
+        address holding two of them on the second page. Assert both are
+        removed and every item is counted once.
+        """
+        folder = fake_google.backend.files[self.folders['b']]
+        for i in range(Drive.PERMISSION_PAGE_SIZE + 10):
+            folder['permissions'].append(
+                {'id': 'p{}'.format(i), 'type': 'user', 'role': 'reader',
+                 'emailAddress': 'user{}@example.com'.format(i)})
+        for permission_id in ('mine-1', 'mine-2'):
+            folder['permissions'].append(
+                {'id': permission_id, 'type': 'user', 'role': 'reader',
+                 'emailAddress': EmailUtils.TEST_EMAIL})
+
+        result, report = self.handler.unshare_tree(
+            None, EmailUtils.TEST_EMAIL, folder_id=self.root)
+        assert result, report
+        assert report['done'] == 164 and not report['failed']
+        assert len(folder['permissions']) == Drive.PERMISSION_PAGE_SIZE + 10
+        assert not any(permission['emailAddress'] == EmailUtils.TEST_EMAIL
+                       for permission in folder['permissions'])
+
+    def test_delete_tree(self):
+        """
+        Delete the tree. Assert it is gone after a single call.
+        """
+        calls = fake_google.backend.call_count
+        result, report = self.handler.delete_tree(folder_id=self.root)
+        assert result, report
+        assert report == {'folder_id': self.root, 'done': 1, 'failed': {}}
+        assert fake_google.backend.call_count - calls == 1
+        assert [file['id'] for file in fake_google.backend.files.values()
+                if file['id'] != 'root'] == []
+
+    def test_delete_tree_failed(self):
+        """
+        Delete the tree without the permission to. Assert the folder is
+        reported failed and the tree kept.
+        """
+        def _files_delete(fileId, **kwargs):
+            raise fake_google.http_error(
+                403, 'insufficientFilePermissions', 'Forbidden')
+
+        with mock.patch.object(fake_google.backend, 'files_delete',
+                               _files_delete):
+            handler = StorageHandler(Auth.CREDENTIALS_FILE)
+            result, report = handler.delete_tree(folder_id=self.root)
+        assert result, report
+        assert report['done'] == 0 and list(report['failed']) == [self.root]
+        assert len(self._tree(self.root)) == 163
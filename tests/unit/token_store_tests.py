@@ -0,0 +1,103 @@
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from google.oauth2.credentials import Credentials
+
+from consts.auth import Auth
+from helpers.token_store import TokenStore
+
+
+def _refresh(credentials, request):
+    """
+    Stand-in of Credentials.refresh recording every call in a file.
+    """
+    with open(os.environ['TOKEN_STORE_TEST_LOG'], 'a') as f:
+        f.write('{}\n'.format(os.getpid()))
+    credentials.token = 'refreshed-token'
+    credentials.expiry = datetime.datetime.utcnow() +\
+        datetime.timedelta(hours=1)
+
+
+def _worker(path, queue):
+    with mock.patch.object(Credentials, 'refresh', _refresh):
+        credentials = TokenStore(path, Auth.SCOPES).get()
+    queue.put(credentials.token if credentials else None)
+
+
+class TestTokenStore(unittest.TestCase):
+    """
+    This class implements all the unit tests for the TokenStore class.
+    """
+
+    def setUp(self):
+        """
+        Write an expired credentials file in a temporary directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'credentials.json')
+        self.log = os.path.join(self.directory, 'refresh.log')
+        os.environ['TOKEN_STORE_TEST_LOG'] = self.log
+        with open(self.path, 'w') as f:
+            json.dump({'token': 'expired-token',
+                       'refresh_token': 'refresh-token',
+                       'client_id': 'client-id',
+                       'client_secret': 'client-secret',
+                       'token_uri': 'https://oauth2.googleapis.com/token',
+                       'scopes': Auth.SCOPES,
+                       'expiry': '2000-01-01T00:00:00Z'}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _refreshes(self):
+        if not os.path.exists(self.log):
+            return 0
+        with open(self.log) as f:
+            return len(f.readlines())
+
+    def test_refresh(self):
+        """
+        Get expired credentials. Assert they are refreshed and persisted.
+        """
+        with mock.patch.object(Credentials, 'refresh', _refresh):
+            credentials = TokenStore(self.path, Auth.SCOPES).get()
+        assert credentials.token == 'refreshed-token'
+        with open(self.path) as f:
+            assert json.load(f)['token'] == 'refreshed-token'
+        assert not [name for name in os.listdir(self.directory)
+                    if name.endswith('.tmp')]
+
+        with mock.patch.object(Credentials, 'refresh', _refresh):
+            TokenStore(self.path, Auth.SCOPES).get()
+        assert self._refreshes() == 1
+
+    def test_concurrent_refresh(self):
+        """
+        Get expired credentials from several processes at once. Assert only
+        one of them refreshes and all of them get the new token.
+        """
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        workers = [context.Process(target=_worker, args=(self.path, queue))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        tokens = [queue.get(timeout=30) for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        assert tokens == ['refreshed-token'] * 4
+        assert self._refreshes() == 1
+
+    def test_missing_file(self):
+        """
+        Get credentials from a missing file. Assert none are returned.
+        """
+        os.remove(self.path)
+        assert TokenStore(self.path, Auth.SCOPES).get() is None
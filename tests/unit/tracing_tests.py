@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+from utils.tracing import JsonFileExporter, Tracer, parse_traceparent
+
+
+class TestTracer(unittest.TestCase):
+    """
+    This class implements all the unit tests for the Tracer class.
+    """
+
+    def setUp(self):
+        """
+        Instanciate a Tracer exporting to a temporary JSON file.
+        """
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.tracer = Tracer(1, JsonFileExporter(self.path))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _exported(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_parse_traceparent(self):
+        """
+        Parse valid and invalid traceparent headers. Assert the result.
+        """
+        header = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+        assert parse_traceparent(header) == (
+            '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7', True)
+        assert parse_traceparent('00-abc-def-01') is None
+        assert parse_traceparent(None) is None
+
+    def test_nested_spans(self):
+        """
+        Open nested spans. Assert they share the trace and are chained.
+        """
+        with self.tracer.span('root') as root:
+            with self.tracer.span('child', key='value') as child:
+                pass
+
+        spans = {span['name']: span for span in self._exported()}
+        assert child.trace_id == root.trace_id
+        assert spans['child']['parent_id'] == root.span_id
+        assert spans['child']['attributes'] == {'key': 'value'}
+        assert spans['root']['parent_id'] is None
+
+    def test_remote_parent(self):
+        """
+        Start a span from an incoming traceparent. Assert the trace is
+        continued even though the local sample rate is zero.
+        """
+        self.tracer.sample_rate = 0
+        header = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+        with self.tracer.span('root', traceparent=header):
+            pass
+
+        span, = self._exported()
+        assert span['trace_id'] == '4bf92f3577b34da6a3ce929d0e0e4736'
+        assert span['parent_id'] == '00f067aa0ba902b7'
+
+    def test_not_sampled(self):
+        """
+        Open a span with a zero sample rate. Assert nothing is exported.
+        """
+        self.tracer.sample_rate = 0
+        with self.tracer.span('root'):
+            with self.tracer.span('child'):
+                pass
+
+        assert self._exported() == []
+
+    def test_error(self):
+        """
+        Raise inside a span. Assert the error is recorded.
+        """
+        with self.assertRaises(ValueError):
+            with self.tracer.span('root'):
+                raise ValueError('boom')
+
+        span, = self._exported()
+        assert span['error'] == 'ValueError: boom'
@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.oauth2.credentials import Credentials
+from googleapiclient import errors
+from googleapiclient.discovery import build
+
+from helpers.service_helper import GoogleServiceHandler
+from helpers.transport import PooledHttp, PoolTimeout
+
+
+class _DriveStub(BaseHTTPRequestHandler):
+    """
+    Local stand-in of the Drive files endpoint, with keep-alive.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def do_GET(self):
+        _DriveStub.connections.add(self.client_address)
+        if 'slow' in self.path:
+            time.sleep(0.5)
+        if 'missing' in self.path:
+            status, body = 404, {'error': {
+                'code': 404, 'message': 'File not found',
+                'errors': [{'reason': 'notFound'}]}}
+        else:
+            status, body = 200, {
+                'files': [{'id': '1'}],
+                'auth': self.headers.get('Authorization')}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPooledHttp(unittest.TestCase):
+    """
+    This class implements all the unit tests for the PooledHttp transport.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Start the local Drive stand-in.
+        """
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _DriveStub)
+        cls.thread = threading.Thread(target=cls.server.serve_forever,
+                                      daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """
+        Build a Drive service using the pooled transport.
+        """
+        _DriveStub.connections.clear()
+        self.http = PooledHttp(Credentials(token='token'), pool_size=4)
+        self.service = build(
+            'drive', 'v3', http=self.http,
+            client_options={'api_endpoint': 'http://127.0.0.1:{}/'.format(
+                self.server.server_address[1])})
+
+    def tearDown(self):
+        self.http.close()
+
+    def test_execute(self):
+        """
+        Execute requests. Assert responses are parsed, credentials applied
+        and a single connection reused.
+        """
+        for _ in range(5):
+            response = self.service.files().list(q="name='a'").execute()
+            assert response['files'] == [{'id': '1'}]
+            assert response['auth'] == 'Bearer token'
+        assert len(_DriveStub.connections) == 1
+
+    def test_http_error(self):
+        """
+        Request a missing file. Assert the usual HttpError is raised.
+        """
+        with self.assertRaises(errors.HttpError) as context:
+            self.service.files().get(fileId='missing').execute()
+        assert context.exception.resp.status == 404
+
+    def test_threads(self):
+        """
+        Execute requests from several threads sharing the transport. Assert
+        all succeed within the pool size.
+        """
+        def _list(_):
+            return self.service.files().list().execute()['files']
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(_list, range(64)))
+        assert results == [[{'id': '1'}]] * 64
+        assert len(_DriveStub.connections) <= 4
+
+    def test_pool_timeout(self):
+        """
+        Request while the only pooled connection is held by a slow request.
+        Assert the wait ends with a retryable PoolTimeout after the pool
+        timeout.
+        """
+        http = PooledHttp(None, pool_size=1, pool_timeout=0.1)
+        uri = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        slow = threading.Thread(target=http.request, args=(uri + 'slow',))
+        slow.start()
+        time.sleep(0.1)
+        start = time.perf_counter()
+        with self.assertRaises(PoolTimeout) as context:
+            http.request(uri)
+        assert time.perf_counter() - start < 0.4
+        assert isinstance(context.exception, ConnectionError)
+        slow.join()
+        resp, _ = http.request(uri)
+        assert resp.status == 200
+        http.close()
+
+    def test_pool_timeout_retried(self):
+        """
+        Execute a request through the handlers while the only pooled
+        connection is held by a slow request. Assert the PoolTimeout is
+        retried until the connection is freed.
+        """
+        http = PooledHttp(None, pool_size=1, pool_timeout=0.1)
+        uri = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        service = build('drive', 'v3', http=http,
+                        client_options={'api_endpoint': uri})
+        # Without running the authorization of __init__.
+        handler = GoogleServiceHandler.__new__(GoogleServiceHandler)
+        slow = threading.Thread(target=http.request, args=(uri + 'slow',))
+        slow.start()
+        time.sleep(0.1)
+        request = service.files().list()
+        request._sleep = lambda seconds: time.sleep(0.2)
+        assert handler._execute(request)['files'] == [{'id': '1'}]
+        slow.join()
+        http.close()
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import io
+import json
+import unittest
+from unittest import mock
+
+from googleapiclient.http import MediaIoBaseUpload
+
+from consts.backend import Backend
+from helpers import fake_google
+from helpers.dedup_index import dedup_index
+from helpers.event_index import event_index
+from helpers.meeting_helper import MeetingHandler
+from helpers.service_pool import service_pool
+from helpers.storage_helper import StorageHandler
+from helpers.warmup import WarmUp
+from benchmarks.harness import AsgiClient
+
+
+class TestWarmUp(unittest.TestCase):
+    """
+    This class implements all the unit tests for the startup warm-up and
+    the readiness probe.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mode = Backend.MODE
+        Backend.MODE = Backend.FAKE
+
+    @classmethod
+    def tearDownClass(cls):
+        Backend.MODE = cls.mode
+
+    def setUp(self):
+        """
+        Create an event and a folder holding a file.
+        """
+        fake_google.backend.reset()
+        fake_google.backend.configure(latency=0, jitter=0, error_rate=0)
+        service_pool.clear()
+        event_index.clear()
+        dedup_index.clear()
+        fake_google.backend.events_insert('primary', {
+            'summary': 'Sync',
+            'start': {'dateTime': '2024-01-10T15:00:00Z'},
+            'end': {'dateTime': '2024-01-10T16:00:00Z'}})
+        self.folder_id = fake_google.backend.files_create(body={
+            'name': 'hot', 'mimeType': fake_google.FOLDER_MIME_TYPE})['id']
+        self.file_id = fake_google.backend.files_create(
+            body={'name': 'a.txt', 'parents': [self.folder_id]},
+            media_body=MediaIoBaseUpload(io.BytesIO(b'data'),
+                                         'text/plain'))['id']
+
+    def test_run(self):
+        """
+        Warm the default account up. Assert its handlers are pooled and the
+        first search and dedup lookup do not call Google.
+        """
+        warmup = WarmUp(accounts=[''], calendars=['primary'],
+                        folders=['hot'], senders=['sender@example.com'])
+        assert warmup.run() == {} and warmup.ready
+        assert len(service_pool) == 4
+
+        calls = fake_google.backend.call_count
+        handler = service_pool.get(MeetingHandler)
+        result, found = handler.search_events('primary')
+        assert result and found['source'] == 'index'
+        assert [event['summary'] for event in found['events']] == ['Sync']
+        assert dedup_index.lookup((None, self.folder_id),
+                                  hashlib.md5(b'data').hexdigest()) == \
+            (True, {'a.txt': self.file_id})
+        assert fake_google.backend.call_count == calls
+
+    def test_failed(self):
+        """
+        Warm up a missing calendar and folder. Assert they are reported and
+        the worker is ready anyway.
+        """
+        warmup = WarmUp(accounts=[''], calendars=['missing'],
+                        folders=['hot', 'cold'], senders=[])
+        failed = warmup.run()
+        assert set(failed) == {'default/calendar/missing',
+                               'default/drive/cold'}, failed
+        assert warmup.ready
+        assert isinstance(service_pool.get(StorageHandler, None),
+                          StorageHandler)
+
+    def test_ready(self):
+        """
+        Probe a worker before and after its warm-up. Assert it only answers
+        ready after.
+        """
+        import api
+        warmup = WarmUp(accounts=[''], calendars=[], folders=[], senders=[])
+        client = AsgiClient(api.app)
+        with mock.patch.object(api, 'warmup', warmup):
+            status, _, body = asyncio.run(client.request('GET', '/ready'))
+            assert status == 503 and not json.loads(body)['ready']
+            warmup.run()
+            status, _, body = asyncio.run(client.request('GET', '/ready'))
+            assert status == 200
+            assert json.loads(body) == {'ready': True, 'failed': {}}
+
+    def test_credentials(self):
+        """
+        Warm up an account without credentials. Assert its handlers are
+        reported and not pooled.
+        """
+        with mock.patch.object(StorageHandler, 'service', None), \
+                mock.patch('helpers.storage_helper.StorageHandler.__init__',
+                           lambda handler, path, account=None: None):
+            warmup = WarmUp(accounts=[''], calendars=[], folders=['hot'],
+                            senders=[])
+            assert set(warmup.run()) == {'default/drive'}
+        assert len(service_pool) == 2
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import metrics
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an optional time to live, recording its hits,
+    misses and evictions under its name.
+    """
+
+    def __init__(self, name, max_size, ttl=None):
+        """
+        Args:
+            - name(str): cache name, used as the metrics label.
+            - max_size(int): maximum number of entries kept.
+            - ttl(float): seconds an entry is kept, None keeps it until it
+                is evicted.
+
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get the value of a key, if it is cached and did not expire.
+
+        Args:
+            - key(hashable):
+            - default(object): returned on a miss.
+
+        Returns(object):
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and\
+                    entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = _MISSING
+            if entry is not _MISSING:
+                self._entries.move_to_end(key)
+        if entry is _MISSING:
+            metrics.cache_requests.inc(cache=self.name, result='miss')
+            return default
+        metrics.cache_requests.inc(cache=self.name, result='hit')
+        return entry[0]
+
+    def set(self, key, value):
+        """
+        Cache the value of a key, evicting the least recently used entries
+        above the size limit.
+
+        Args:
+            - key(hashable):
+            - value(object):
+
+        """
+        expiry = time.monotonic() + self.ttl if self.ttl is not None\
+            else None
+        with self._lock:
+            self._entries[key] = (value, expiry)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.cache_evictions.inc(evicted, cache=self.name)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
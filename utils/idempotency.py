@@ -0,0 +1,91 @@
+import threading
+import uuid
+
+from consts.idempotency import Idempotency
+from utils.cache import LRUCache
+
+
+def request_id(*parts):
+    """
+    Derive a stable Google request ID, e.g. of a conference creation, so a
+    retried request asks Google for the same thing again.
+
+    Args:
+        - parts(str): account, idempotency key, index...
+
+    Returns(str):
+    """
+    return uuid.uuid5(Idempotency.NAMESPACE,
+                      ':'.join(str(part) for part in parts)).hex
+
+
+class IdempotencyStore:
+    """
+    Responses of completed requests by idempotency key, kept for a while so
+    retries are answered without running the request again. A key is
+    claimed while its request runs, so a concurrent retry does not run it
+    twice either.
+    """
+
+    def __init__(self, max_size=Idempotency.MAX_SIZE, ttl=Idempotency.TTL):
+        """
+        Args:
+            - max_size(int): maximum number of responses kept.
+            - ttl(float): seconds a response is kept.
+
+        """
+        self._responses = LRUCache('idempotency', max_size, ttl)
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        Claim a key to run its request, unless it ran or is running.
+
+        Args:
+            - key(hashable): idempotency key, scoped to the account and
+                route.
+
+        Returns(tupple):
+            (True, None) when claimed, (False, None) while the request is
+            running, (False, (fingerprint, response)) once it completed.
+
+        """
+        with self._lock:
+            if key in self._running:
+                return False, None
+            entry = self._responses.get(key)
+            if entry is not None:
+                return False, entry
+            self._running.add(key)
+            return True, None
+
+    def complete(self, key, fingerprint, response):
+        """
+        Keep the response of a claimed key.
+
+        Args:
+            - key(hashable): claimed key.
+            - fingerprint(str): hash of the request body.
+            - response(tupple): (status, headers, body) of the response.
+
+        """
+        with self._lock:
+            self._responses.set(key, (fingerprint, response))
+            self._running.discard(key)
+
+    def release(self, key):
+        """
+        Release a claimed key without keeping its response, so a retry runs
+        the request again.
+        """
+        with self._lock:
+            self._running.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+            self._running.clear()
+
+
+idempotency_store = IdempotencyStore()
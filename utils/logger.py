@@ -1,19 +1,30 @@
 from datetime import datetime
 import os
+import threading
 
 
 class Logger:
 
     def __init__(self, log_path):
         """
-        Inits Logger singleton to be used globally.
+        Inits Logger singleton to be used globally. The log file is opened
+        on the first write, importing the logger has no side effects.
 
         Args:
             - log_path(str): log file full path.
 
         """
-        log_path = os.path.join(log_path, "log.txt")
-        self.log_file = open(log_path, "a+")
+        self.log_path = os.path.join(log_path, "log.txt")
+        self._log_file = None
+        self._lock = threading.Lock()
+
+    @property
+    def log_file(self):
+        if self._log_file is None:
+            with self._lock:
+                if self._log_file is None:
+                    self._log_file = open(self.log_path, "a+")
+        return self._log_file
 
     def log_info(self, info):
         now = datetime.now()
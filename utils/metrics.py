@@ -0,0 +1,240 @@
+import threading
+from bisect import bisect_left
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    """
+    Render a label set using the Prometheus text exposition format.
+
+    Args:
+        - labelnames(tuple): label names.
+        - values(tuple): label values, in the same order as labelnames.
+        - extra(tuple): optional (name, value) pair appended at the end.
+
+    Returns(str):
+        '{name="value",...}' or '' if there are no labels.
+
+    """
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    rendered = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')\
+            .replace('\n', '\\n')
+        rendered.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(rendered) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter with an optional set of labels.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Args:
+            - name(str): metric name.
+            - documentation(str): help text of the metric.
+            - labelnames(tuple): names of the labels of the metric.
+
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return ['{}{} {}'.format(self.name,
+                                 _format_labels(self.labelnames, key),
+                                 _format_value(value))
+                for key, value in values]
+
+
+class Histogram:
+    """
+    Cumulative histogram with an optional set of labels.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            - name(str): metric name.
+            - documentation(str): help text of the metric.
+            - labelnames(tuple): names of the labels of the metric.
+            - buckets(tuple): sorted upper bounds of the buckets.
+
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = \
+                    [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        series = self._values.get(key)
+        return series[1] if series else 0
+
+    def collect(self):
+        with self._lock:
+            values = sorted((key, [list(series[0]), series[1], series[2]])
+                            for key, series in self._values.items())
+        lines = []
+        for key, (buckets, count, total) in values:
+            cumulative = 0
+            bounds = self.buckets + (float('inf'),)
+            for bound, observed in zip(bounds, buckets):
+                cumulative += observed
+                lines.append('{}_bucket{} {}'.format(
+                    self.name,
+                    _format_labels(self.labelnames, key,
+                                   ('le', _format_value(bound))),
+                    cumulative))
+            labels = _format_labels(self.labelnames, key)
+            lines.append('{}_count{} {}'.format(self.name, labels, count))
+            lines.append('{}_sum{} {}'.format(self.name, labels,
+                                              _format_value(total)))
+        return lines
+
+
+class Metrics:
+    """
+    Process wide registry of the service metrics.
+    """
+
+    def __init__(self):
+        """
+        Inits Metrics singleton to be used globally.
+        """
+        self._metrics = []
+
+        self.http_requests = self.counter(
+            'http_requests_total',
+            'HTTP requests handled, by route and status code.',
+            ('method', 'route', 'status'))
+        self.http_latency = self.histogram(
+            'http_request_duration_seconds',
+            'HTTP request latency, by route.',
+            ('method', 'route'))
+        self.google_calls = self.counter(
+            'google_api_calls_total',
+            'Google API calls, by API method and outcome.',
+            ('method', 'status', 'reason'))
+        self.google_latency = self.histogram(
+            'google_api_call_duration_seconds',
+            'Google API call latency, by API method.',
+            ('method',))
+        self.handler_init = self.histogram(
+            'google_handler_init_duration_seconds',
+            'Google service handler construction time, by service.',
+            ('service',))
+        self.token_refresh = self.histogram(
+            'google_token_refresh_duration_seconds',
+            'OAuth token refresh time, by outcome.',
+            ('status',))
+        self.cache_requests = self.counter(
+            'cache_requests_total',
+            'Cache lookups, by cache and result (hit or miss).',
+            ('cache', 'result'))
+        self.cache_evictions = self.counter(
+            'cache_evictions_total',
+            'Entries evicted from a cache to honor its size limit.',
+            ('cache',))
+        self.dedup_uploads = self.counter(
+            'drive_dedup_uploads_total',
+            'Deduplicated uploads, by outcome (uploaded, skipped or copied).',
+            ('result',))
+        self.dedup_saved_bytes = self.counter(
+            'drive_dedup_saved_bytes_total',
+            'Upload bytes saved by deduplication.')
+        self.merge_messages = self.counter(
+            'gmail_merge_messages_total',
+            'Mail merge messages, by outcome (sent, failed or invalid).',
+            ('status',))
+        self.sender_messages = self.counter(
+            'gmail_sender_messages_total',
+            'Messages scheduled on the accounts of the sender pool.',
+            ('account',))
+        self.smtp_messages = self.counter(
+            'smtp_messages_total',
+            'Messages sent over SMTP, by outcome (ok or error).',
+            ('status',))
+        self.rate_limit_wait = self.histogram(
+            'rate_limit_wait_seconds',
+            'Time spent waiting for a rate limiter, by limiter.',
+            ('limiter',))
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render every registered metric.
+
+        Returns(str):
+            Metrics in the Prometheus text exposition format.
+
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append('# HELP {} {}'.format(metric.name,
+                                               metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from utils.metrics import metrics
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve tokens up front and sleep off
+    any debt outside the lock, so concurrent callers are served in order
+    and the long-run rate never exceeds the configured one.
+    """
+
+    def __init__(self, name, rate, capacity=None):
+        """
+        Args:
+            - name(str): limiter name, used as the metrics label.
+            - rate(float): tokens added per second.
+            - capacity(float): tokens the bucket holds at most, one
+                second worth of tokens by default.
+
+        """
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def available(self):
+        """
+        Get the tokens in the bucket, negative while callers are waiting.
+
+        Returns(float):
+        """
+        with self._lock:
+            return min(self.capacity, self._tokens +
+                       (time.monotonic() - self._updated) * self.rate)
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, waiting until they are available.
+
+        Args:
+            - tokens(float): tokens to take, may exceed the capacity.
+
+        Returns(float):
+            seconds waited.
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        metrics.rate_limit_wait.observe(wait, limiter=self.name)
+        return wait
+
+
+class RateLimits:
+    """
+    Token buckets of the same rate, one per key, e.g. per account.
+    """
+
+    def __init__(self, name, rate, capacity=None):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(
+                    self.name, self.rate, self.capacity)
+            return bucket
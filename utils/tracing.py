@@ -0,0 +1,316 @@
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from consts.tracing import Tracing
+from utils.logger import logger
+
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    A timed operation belonging to a trace.
+    """
+
+    def __init__(self, name, trace_id, parent_id=None, sampled=False,
+                 attributes=None):
+        """
+        Args:
+            - name(str): name of the operation.
+            - trace_id(str): 32 hex chars trace ID.
+            - parent_id(str): 16 hex chars ID of the parent span, if any.
+            - sampled(bool): whether the span is exported or not.
+            - attributes(dict): initial span attributes.
+
+        """
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = '{:016x}'.format(random.getrandbits(64))
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def traceparent(self):
+        """
+        Returns(str):
+            W3C traceparent header value identifying this span.
+
+        """
+        return '00-{}-{}-{}'.format(self.trace_id, self.span_id,
+                                    '01' if self.sampled else '00')
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'end': self.end,
+            'duration_ms': (self.end - self.start) / 1e6,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def parse_traceparent(header):
+    """
+    Parse a W3C traceparent header.
+
+    Args:
+        - header(str): traceparent header value.
+
+    Returns(tupple | None):
+        (trace_id, parent_id, sampled) or None if the header is invalid.
+
+    """
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class JsonFileExporter:
+    """
+    Append finished spans to a file, one JSON document per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict()) + '\n' for span in spans)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(lines)
+
+    def shutdown(self):
+        pass
+
+
+class CollectorExporter:
+    """
+    Post finished spans to an OTLP/HTTP JSON collector endpoint.
+    Spans are queued and sent in batches by a background thread so the
+    request path never waits on the collector.
+    """
+
+    def __init__(self, url, batch_size=Tracing.BATCH_SIZE,
+                 flush_interval=Tracing.FLUSH_INTERVAL):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        if self._thread is None:
+            # Started on the first export, not when the module is imported.
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run,
+                                                    daemon=True)
+                    self._thread.start()
+        for span in spans:
+            self._queue.put(span)
+
+    def shutdown(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(self.flush_interval)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                span = self._queue.get(
+                    timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                span = False
+            if span:
+                batch.append(span)
+            if not span or len(batch) >= self.batch_size:
+                if batch:
+                    self._post(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+            if span is None:
+                return
+
+    def _post(self, spans):
+        import urllib.request
+
+        body = json.dumps(self._to_otlp(spans)).encode()
+        request = urllib.request.Request(
+            self.url, data=body, method='POST',
+            headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=self.flush_interval)\
+                .close()
+        except Exception as e:
+            logger.log_error("Error exporting {} spans: {}"
+                             .format(len(spans), e))
+
+    @staticmethod
+    def _to_otlp(spans):
+        def _attributes(attributes):
+            return [{'key': key, 'value': {'stringValue': str(value)}}
+                    for key, value in attributes.items()]
+
+        return {'resourceSpans': [{
+            'resource': {'attributes': _attributes(
+                {'service.name': Tracing.SERVICE_NAME})},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [{
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(span.start),
+                    'endTimeUnixNano': str(span.end),
+                    'attributes': _attributes(span.attributes),
+                    'status': ({'code': 2, 'message': span.error}
+                               if span.error else {'code': 1}),
+                } for span in spans]
+            }]
+        }]}
+
+
+class Tracer:
+    """
+    Create spans, keep track of the active one and export the sampled ones.
+    """
+
+    def __init__(self, sample_rate, exporter):
+        """
+        Inits Tracer singleton to be used globally.
+
+        Args:
+            - sample_rate(float): ratio of root traces to record.
+            - exporter(object): object with export(spans) and shutdown().
+
+        """
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name, traceparent=None, **attributes):
+        """
+        Run the enclosed block inside a new span, child of the active one.
+
+        Args:
+            - name(str): name of the operation.
+            - traceparent(str): incoming W3C traceparent header. Only used
+                                when there is no active span.
+            - attributes(dict): span attributes.
+
+        Returns(Span):
+            The started span.
+
+        """
+        parent = _current_span.get()
+        if parent:
+            span = Span(name, parent.trace_id, parent.span_id, parent.sampled,
+                        attributes)
+        else:
+            remote = parse_traceparent(traceparent)
+            if remote:
+                trace_id, parent_id, sampled = remote
+            else:
+                trace_id = '{:032x}'.format(random.getrandbits(128))
+                parent_id = None
+                sampled = random.random() < self.sample_rate
+            span = Span(name, trace_id, parent_id, sampled, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = '{}: {}'.format(type(e).__name__, e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end = time.time_ns()
+            if span.sampled and self.exporter:
+                self.exporter.export([span])
+
+    def current_span(self):
+        return _current_span.get()
+
+
+def traced(f):
+    """
+    Run the decorated function inside a span named after it.
+
+    Args:
+        - f(function):
+
+    Returns(function):
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        with tracer.span(f.__qualname__):
+            return f(*args, **kwargs)
+
+    return wrapper
+
+
+def propagate(f):
+    """
+    Bind the decorated function to the current trace context, so the spans
+    it starts from worker threads nest under the current span.
+
+    Args:
+        - f(function):
+
+    Returns(function):
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time.
+        return context.copy().run(f, *args, **kwargs)
+
+    return wrapper
+
+
+def _build_exporter():
+    if Tracing.EXPORTER == 'collector':
+        return CollectorExporter(Tracing.COLLECTOR_URL)
+    if Tracing.EXPORTER == 'json':
+        return JsonFileExporter(os.path.join(os.getcwd(), Tracing.JSON_FILE))
+    return None
+
+
+tracer = Tracer(Tracing.SAMPLE_RATE, _build_exporter())